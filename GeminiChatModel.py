@@ -1,41 +1,45 @@
 import re
-from google import genai
+import clients
+import metrics
+from app_logging import get_logger
 from google.genai import types
 from config import GEMINI_API_KEY, GENERATION_MODEL, EMBEDDING_MODEL, TOP_K
 from vector_store import get_or_create_collection
-import os
+from chat_sessions import extractive_summary
 
-print("[leaderboard_chat] Configuring Gemini client…")
-client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))  # reads GEMINI_API_KEY from env
+client = clients.genai_client('GEMINI_API_KEY')  # shared, built on first use
+log = get_logger("leaderboard_chat")
 
 def get_embedding(text: str) -> list[float]:
     """Generate embedding for query text."""
-    print("[leaderboard_chat] Generating embedding…")
-    resp = client.models.embed_content(
-        model=EMBEDDING_MODEL,
-        contents=text,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-    )
+    log.info("Generating embedding…")
+    with metrics.timed("embed", EMBEDDING_MODEL):
+        resp = client.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=text,
+            config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
+        )
     return resp.embeddings[0].values 
 
 def query_gemini(prompt: str, context: str, system_prompt: str) -> str:
     """Generate answer using Gemini with context and system prompt."""
-    print("[leaderboard_chat] Generating answer with Gemini…")
+    log.info("Generating answer with Gemini…")
     
     cfg = types.GenerateContentConfig(system_instruction=system_prompt)
     combined = f"Context (Student Leaderboard Data):\n{context}\n\nQuestion:\n{prompt}"
     
-    resp = client.models.generate_content(
-        model=GENERATION_MODEL,
-        config=cfg,
-        contents=combined
-    )
-    print("[leaderboard_chat] Answer received")
+    with metrics.timed("llm_generate", GENERATION_MODEL):
+        resp = client.models.generate_content(
+            model=GENERATION_MODEL,
+            config=cfg,
+            contents=combined
+        )
+    log.info("Answer received")
     return resp.text
 
 def search_leaderboard(query: str, collection_name: str = "student_leaderboard") -> list:
     """Search the leaderboard collection for relevant documents."""
-    print(f"[leaderboard_chat] Searching collection '{collection_name}'…")
+    log.info(f"Searching collection '{collection_name}'…")
     
     try:
         # Get the ChromaDB collection
@@ -45,17 +49,18 @@ def search_leaderboard(query: str, collection_name: str = "student_leaderboard")
         query_embedding = get_embedding(query)
         
         # Search for similar documents
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=TOP_K,
-            include=['documents', 'metadatas', 'distances']
-        )
+        with metrics.timed("chroma_query", collection_name):
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=TOP_K,
+                include=['documents', 'metadatas', 'distances']
+            )
         
-        print(f"[leaderboard_chat] Found {len(results['documents'][0])} relevant documents")
+        log.info(f"Found {len(results['documents'][0])} relevant documents")
         return results
     
     except Exception as e:
-        print(f"Error searching leaderboard: {e}")
+        log.warning(f"Error searching leaderboard: {e}")
         return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
 def format_context(search_results: dict) -> str:
@@ -81,8 +86,41 @@ def format_context(search_results: dict) -> str:
     
     return "\n" + "="*50 + "\n".join(context_parts)
 
-def leaderboard_chat(user_query: str, system_prompt: str = None) -> str:
-    """Main function to handle leaderboard chat queries."""
+def format_records(records: list) -> str:
+    """Format cached student records (from earlier turns) as context for the LLM."""
+    context_parts = []
+    for i, record in enumerate(records):
+        context_part = f"Student Record {i+1}:\n"
+        for key, value in record.items():
+            context_part += f"  - {key}: {value}\n"
+        context_parts.append(context_part)
+    return "\n" + "="*50 + "\n".join(context_parts)
+
+def summarize_conversation(summary: str, turns: list) -> str:
+    """Fold older turns into the rolling summary with one short Gemini call."""
+    log.info(f"Summarizing {len(turns)} older turns…")
+    transcript = "\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+    try:
+        with metrics.timed("llm_generate", GENERATION_MODEL):
+            resp = client.models.generate_content(
+                model=GENERATION_MODEL,
+                config=types.GenerateContentConfig(
+                    system_instruction="Summarize this conversation about a student leaderboard in under 120 words. "
+                                       "Keep student names, ids, subjects and numbers that were discussed."
+                ),
+                contents=f"Earlier summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+            )
+        return resp.text.strip()
+    except Exception as e:
+        log.warning(f"Summary call failed, using extractive summary: {e}")
+        return extractive_summary(summary, turns)
+
+def leaderboard_chat(user_query: str, system_prompt: str = None, session=None) -> str:
+    """
+    Main function to handle leaderboard chat queries. With a ChatSession, the
+    conversation so far goes into the prompt, and follow-ups about students
+    already discussed reuse their cached records instead of a new search.
+    """
     
     # Default system prompt if none provided
     if system_prompt is None:
@@ -98,26 +136,37 @@ def leaderboard_chat(user_query: str, system_prompt: str = None) -> str:
         is not available in the context, clearly state that. Be friendly and encouraging when 
         discussing student performance."""
     
-    print(f"[leaderboard_chat] Processing query: '{user_query}'")
+    log.info(f"Processing query: '{user_query}'")
     
-    # Search for relevant documents
-    search_results = search_leaderboard(user_query)
+    hits = []
+    if session is not None and session.is_followup(user_query) and session.focused_records():
+        log.info("Follow-up: reusing cached student records")
+        context = format_records(session.focused_records())
+    else:
+        # Search for relevant documents
+        search_results = search_leaderboard(user_query)
+        
+        # Format context from search results
+        context = format_context(search_results)
+        hits = [m for m in search_results['metadatas'][0] if m]
     
-    # Format context from search results
-    context = format_context(search_results)
+    prompt = user_query
+    if session is not None and (session.summary or session.turns):
+        prompt = f"{session.history_text()}\n\nCurrent question: {user_query}"
     
     # Generate response using Gemini
-    response = query_gemini(user_query, context, system_prompt)
+    response = query_gemini(prompt, context, system_prompt)
+    
+    if session is not None:
+        # Students the answer talks about become the referents for "he/she/they" next turn
+        named = [m['student_id'] for m in hits if m.get('student_name') and m['student_name'] in (response or '')]
+        session.remember(hits, focus=named)
+        session.add_turn(user_query, response or '', summarize_conversation)
     
     return response
 
-async def interactive_chat(chat_prompt):
+async def interactive_chat(chat_prompt, session=None):
     """Interactive chat interface for leaderboard queries."""
-    print("🎓 Student Leaderboard Chat Assistant")
-    print("="*50)
-    print("Ask me anything about student rankings, scores, or feedback!")
-    print("Type 'quit' or 'exit' to end the conversation.\n")
-    
     # Custom system prompt for interactive mode
     system_prompt = """You are a friendly educational assistant helping users explore student leaderboard data.
     
@@ -143,16 +192,13 @@ async def interactive_chat(chat_prompt):
             #     print("Please enter a question about the student leaderboard.")
             #     continue
             
-            print("\n🔍 Searching leaderboard data...")
-            response = leaderboard_chat(chat_prompt, system_prompt)
-            
-            print(f"\n📊 Answer: {response}\n")
-            print("-" * 50)
+            log.info("Searching leaderboard data…")
+            response = leaderboard_chat(chat_prompt, system_prompt, session)
+            log.debug(f"Answer: {response}")
             return response
             
         except Exception as e:
-            print(f"❌ An error occurred: {e}")
-            print("Please try rephrasing your question.\n")
+            log.error(f"Leaderboard chat failed: {e}")
             return {"error": str(e), "message": "An error occurred while processing your request. Please try again."}
 
 # Example usage function
@@ -1,35 +1,19 @@
-import os
-from chromadb import PersistentClient
-from chromadb.config import Settings
-from chromadb.errors import NotFoundError
-from config import CHROMA_DB_DIR, EMBEDDING_MODEL
-from google import genai
+from config import EMBEDDING_MODEL
 from google.genai import types
-from google.cloud import firestore
 from itertools import islice
+import clients
+import metrics
+from app_logging import get_logger
+import hashlib
 import json
+import threading
+import time
 
-# Set up Firestore credentials
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "sahayak-d88d3-2e1f13a7b2bc.json"
-
-# 1) Ensure the directory exists
-os.makedirs(CHROMA_DB_DIR, exist_ok=True)
-print(f"[vector_store] Ensured dir exists: {CHROMA_DB_DIR}")
-
-# 2) Initialize PersistentClient
-print("[vector_store] Initializing PersistentClient…")
-client = PersistentClient(
-    CHROMA_DB_DIR,
-    settings=Settings(anonymized_telemetry=False)
-)
-
-# 3) Initialize Firestore client
-print("[firestore] Initializing Firestore client…")
-db = firestore.Client()
-
-# 4) Initialize Genai client
-print("[vector_store] Initializing GenAI client…")
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# Shared with vector_store.py / main.py and built on first use (see clients.py)
+client = clients.chroma
+db = clients.firestore_db
+genai_client = clients.genai_client('GOOGLE_API_KEY')
+log = get_logger("leaderboard_vectors")
 
 def get_embeddings_batch(texts: list[str], batch_size: int = 100) -> list[list[float]]:
     """Generate embeddings for a batch of texts using Google's Generative AI."""
@@ -39,17 +23,18 @@ def get_embeddings_batch(texts: list[str], batch_size: int = 100) -> list[list[f
         batch = texts[i:i + batch_size]
         batch_num = (i // batch_size) + 1
         
-        print(f"[vector_store] Embedding batch #{batch_num} (size={len(batch)})")
+        log.debug(f"Embedding batch #{batch_num} (size={len(batch)})")
         
         try:
-            resp = genai_client.models.embed_content(
-                model=EMBEDDING_MODEL,
-                contents=batch,
-                config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
-            )
+            with metrics.timed("embed", EMBEDDING_MODEL):
+                resp = genai_client.models.embed_content(
+                    model=EMBEDDING_MODEL,
+                    contents=batch,
+                    config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
+                )
             all_embeddings.extend(emb.values for emb in resp.embeddings)
         except Exception as e:
-            print(f"Error generating embeddings for batch {batch_num}: {e}")
+            log.error(f"Error generating embeddings for batch {batch_num}: {e}")
             # Add empty embeddings for failed batch to maintain index alignment
             all_embeddings.extend([[] for _ in batch])
     
@@ -58,7 +43,7 @@ def get_embeddings_batch(texts: list[str], batch_size: int = 100) -> list[list[f
 
 def fetch_firestore_collection(collection_name: str):
     """Fetch all documents from a Firestore collection."""
-    print(f"[firestore] Fetching documents from '{collection_name}' collection…")
+    log.info(f"Fetching documents from '{collection_name}' collection…")
     
     try:
         collection_ref = db.collection(collection_name)
@@ -70,13 +55,17 @@ def fetch_firestore_collection(collection_name: str):
             doc_data['id'] = doc.id  # Include document ID
             documents.append(doc_data)
         
-        print(f"[firestore] Retrieved {len(documents)} documents")
+        log.info(f"Retrieved {len(documents)} documents")
         return documents
     
     except Exception as e:
-        print(f"Error fetching Firestore collection: {e}")
+        log.error(f"Error fetching Firestore collection: {e}")
         return []
 
+# Fields that change when *other* students' marks change; kept in metadata only,
+# so a re-rank doesn't force re-embedding thousands of unchanged students
+VOLATILE_TEXT_FIELDS = {'rank'}
+
 def prepare_document_for_chroma(doc_data: dict):
     """Convert Firestore document to format suitable for ChromaDB."""
     # Create a text representation of the document for embedding
@@ -88,7 +77,8 @@ def prepare_document_for_chroma(doc_data: dict):
             continue
         
         # Add to text content for embedding
-        text_content += f"{key}: {value}\n"
+        if key not in VOLATILE_TEXT_FIELDS:
+            text_content += f"{key}: {value}\n"
         
         # Add to metadata (ChromaDB metadata values should be strings, numbers, or booleans)
         if isinstance(value, (str, int, float, bool)):
@@ -96,92 +86,184 @@ def prepare_document_for_chroma(doc_data: dict):
         else:
             metadata[key] = str(value)
     
+    text_content = text_content.strip()
+    # Embedded text's fingerprint: unchanged hash means the stored embedding is still valid
+    metadata['content_hash'] = hashlib.sha256(text_content.encode("utf-8")).hexdigest()
     return {
         'id': doc_data['id'],
-        'text': text_content.strip(),
+        'text': text_content,
         'metadata': metadata
     }
 
+def _get_or_create_collection(collection_name: str):
+    from chromadb.errors import NotFoundError  # chromadb is slow to import; only needed once used
+    try:
+        collection = client.get_collection(name=collection_name)
+        log.info(f"Found existing collection '{collection_name}'")
+    except NotFoundError:
+        collection = client.create_collection(name=collection_name)
+        log.info(f"Created new collection '{collection_name}'")
+    return collection
+
+def _stored_metadata(collection, ids: list = None, page_size: int = 5000) -> dict:
+    """{id: metadata} already in Chroma, for the given ids or (ids=None) the whole collection."""
+    stored = {}
+    if ids is not None:
+        for i in range(0, len(ids), page_size):
+            res = collection.get(ids=ids[i:i + page_size], include=['metadatas'])
+            stored.update(zip(res['ids'], res['metadatas']))
+        return stored
+    offset = 0
+    while True:
+        res = collection.get(limit=page_size, offset=offset, include=['metadatas'])
+        stored.update(zip(res['ids'], res['metadatas']))
+        if len(res['ids']) < page_size:
+            return stored
+        offset += page_size
+
+def sync_to_chroma(documents: list, collection_name: str = "student_leaderboard",
+                   deleted_ids=(), prune: bool = False, batch_size: int = 100) -> dict:
+    """
+    Brings Chroma in line with the given Firestore docs:
+    - new or re-worded students (content_hash differs) are embedded and upserted,
+    - students whose metadata alone changed (e.g. rank) get a metadata-only update,
+    - deleted_ids are removed; with prune=True, documents is the whole collection
+      and anything in Chroma that isn't in it is removed too.
+    Returns counts of each.
+    """
+    collection = _get_or_create_collection(collection_name)
+    prepared = {doc['id']: prepare_document_for_chroma(doc) for doc in documents}
+    stored = _stored_metadata(collection, None if prune else list(prepared))
+
+    to_embed, to_update = [], []
+    for doc_id, doc in prepared.items():
+        old = stored.get(doc_id)
+        if old is None or old.get('content_hash') != doc['metadata']['content_hash']:
+            to_embed.append(doc)
+        elif old != doc['metadata']:
+            to_update.append(doc)
+    to_delete = set(deleted_ids) - set(prepared)
+    if prune:
+        to_delete |= set(stored) - set(prepared)
+
+    log.info(f"Sync: {len(to_embed)} to embed, {len(to_update)} metadata-only, "
+             f"{len(to_delete)} to delete, {len(prepared) - len(to_embed) - len(to_update)} unchanged")
+
+    embedded = 0
+    if to_embed:
+        embeddings = get_embeddings_batch([doc['text'] for doc in to_embed], batch_size=100)
+        # Failed embeddings are skipped; their old hash stays, so the next sync retries them
+        valid = [(doc, emb) for doc, emb in zip(to_embed, embeddings) if emb]
+        for i in range(0, len(valid), batch_size):
+            chunk = valid[i:i + batch_size]
+            collection.upsert(
+                ids=[doc['id'] for doc, _ in chunk],
+                documents=[doc['text'] for doc, _ in chunk],
+                metadatas=[doc['metadata'] for doc, _ in chunk],
+                embeddings=[emb for _, emb in chunk]
+            )
+        embedded = len(valid)
+        if embedded < len(to_embed):
+            log.warning(f"{len(to_embed) - embedded} documents skipped due to failed embeddings")
+
+    for i in range(0, len(to_update), batch_size):
+        chunk = to_update[i:i + batch_size]
+        collection.update(ids=[doc['id'] for doc in chunk], metadatas=[doc['metadata'] for doc in chunk])
+
+    to_delete = sorted(to_delete)
+    for i in range(0, len(to_delete), batch_size):
+        collection.delete(ids=to_delete[i:i + batch_size])
+
+    return {
+        'embedded': embedded,
+        'embed_failed': len(to_embed) - embedded,
+        'metadata_updated': len(to_update),
+        'deleted': len(to_delete),
+        'unchanged': len(prepared) - len(to_embed) - len(to_update),
+    }
+
 def upload_to_chroma(documents: list, collection_name: str = "student_leaderboard"):
-    """Upload documents to ChromaDB."""
-    print(f"[chroma] Creating/getting collection '{collection_name}'…")
+    """Upload documents to ChromaDB (incremental: only changed students are re-embedded)."""
+    log.info(f"Syncing {len(documents)} documents to '{collection_name}'…")
     
     try:
-        # Try to get existing collection or create new one
-        try:
-            collection = client.get_collection(name=collection_name)
-            print(f"[chroma] Found existing collection '{collection_name}'")
-        except NotFoundError:
-            collection = client.create_collection(name=collection_name)
-            print(f"[chroma] Created new collection '{collection_name}'")
-        
-        # Prepare documents for ChromaDB
-        ids = []
-        texts = []
-        metadatas = []
-        
-        print("[chroma] Preparing documents…")
-        
-        for doc in documents:
-            prepared_doc = prepare_document_for_chroma(doc)
-            ids.append(prepared_doc['id'])
-            texts.append(prepared_doc['text'])
-            metadatas.append(prepared_doc['metadata'])
-        
-        print(f"[chroma] Prepared {len(texts)} documents")
-        
-        # Generate embeddings for all texts using batch approach
-        print("[chroma] Generating embeddings for all documents…")
-        embeddings = get_embeddings_batch(texts, batch_size=100)
-        
-        # Filter out documents with failed embeddings
-        valid_data = []
-        for i, embedding in enumerate(embeddings):
-            if embedding:  # Only include documents with valid embeddings
-                valid_data.append({
-                    'id': ids[i],
-                    'text': texts[i],
-                    'metadata': metadatas[i],
-                    'embedding': embedding
-                })
-            else:
-                print(f"Warning: Skipping document {ids[i]} due to failed embedding")
-        
-        if not valid_data:
-            print("No valid embeddings generated. Aborting upload.")
+        stats = sync_to_chroma(documents, collection_name, prune=True)
+        if stats['embed_failed'] and not stats['embedded']:
+            log.error("No valid embeddings generated. Aborting upload.")
             return False
-        
-        print(f"[chroma] Generated embeddings for {len(valid_data)} documents")
-        
-        # Upload to ChromaDB in batches
-        upload_batch_size = 100
-        total_batches = (len(valid_data) + upload_batch_size - 1) // upload_batch_size
-        
-        for i in range(0, len(valid_data), upload_batch_size):
-            batch_data = valid_data[i:i + upload_batch_size]
-            
-            batch_ids = [item['id'] for item in batch_data]
-            batch_texts = [item['text'] for item in batch_data]
-            batch_metadatas = [item['metadata'] for item in batch_data]
-            batch_embeddings = [item['embedding'] for item in batch_data]
-            
-            collection.add(
-                ids=batch_ids,
-                documents=batch_texts,
-                metadatas=batch_metadatas,
-                embeddings=batch_embeddings
-            )
-            
-            batch_num = (i // upload_batch_size) + 1
-            print(f"[chroma] Uploaded batch {batch_num}/{total_batches} ({len(batch_data)} documents)")
-        
-        print(f"[chroma] Successfully uploaded {len(valid_data)} documents to ChromaDB")
+        log.info(f"Sync complete: {stats}")
         return True
         
     except Exception as e:
-        print(f"Error uploading to ChromaDB: {e}")
+        log.error(f"Error uploading to ChromaDB: {e}")
         return False
 
+class LeaderboardVectorSync:
+    """
+    Keeps the Chroma collection in step with Firestore continuously: a snapshot
+    listener collects changed / removed students, and a background thread syncs
+    them after debounce_s, so a burst of writes (e.g. a re-rank) is one sync.
+    """
+
+    def __init__(self, source_collection: str = "student_leaderboard",
+                 collection_name: str = "student_leaderboard", debounce_s: float = 2.0):
+        self.source_collection = source_collection
+        self.collection_name = collection_name
+        self.debounce_s = debounce_s
+        self._pending = {}  # doc id -> doc dict, or None if removed
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._watch = None
+        self._thread = None
+
+    def start(self):
+        log.info(f"Watching '{self.source_collection}' for vector sync…")
+        self._thread = threading.Thread(target=self._run, name="leaderboard-vector-sync", daemon=True)
+        self._thread.start()
+        self._watch = db.collection(self.source_collection).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        with self._cond:
+            for change in changes:
+                doc_id = change.document.id
+                if change.type.name == "REMOVED":
+                    self._pending[doc_id] = None
+                else:
+                    self._pending[doc_id] = {**change.document.to_dict(), 'id': doc_id}
+            if changes:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            time.sleep(self.debounce_s)
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            docs = [doc for doc in pending.values() if doc is not None]
+            deleted = [doc_id for doc_id, doc in pending.items() if doc is None]
+            try:
+                sync_to_chroma(docs, self.collection_name, deleted_ids=deleted)
+            except Exception as e:
+                log.error(f"Error syncing leaderboard to ChromaDB: {e}")
+                # Retry later, unless newer changes for the same students arrived meanwhile
+                with self._cond:
+                    for doc_id, doc in pending.items():
+                        self._pending.setdefault(doc_id, doc)
+
 def main():
     """Main function to orchestrate the upload process."""
     print("Starting Firestore to ChromaDB migration…")
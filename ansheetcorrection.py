@@ -1,66 +1,183 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import re, json
+import asyncio
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
-from google import genai
+import clients
 from google.genai import types
-from search_engine import get_embedding, query_chroma
-from config import GENERATION_MODEL
+from search_engine import get_embedding, get_embeddings, query_chroma, query_chroma_multi
+from config import (
+    GENERATION_MODEL, OCR_MAX_WORKERS,
+    GRADING_RAG_MODE, GRADING_CONTEXT_PER_QUESTION, GRADING_CHUNK_SIZE, GRADING_MAX_WORKERS
+)
+from ocr_layout import merge_page_answers
+import metrics
+from app_logging import get_logger
 
-client = genai.Client()
+client = clients.genai_client()  # shared, built on first use
+log = get_logger("ansheetcorrection")
 
 async def run_ocr_sequential_internal(base64_images: List[str], process_image_func) -> List[Dict]:
     """Runs OCR sequentially using the internal async OCR function."""
-    print(f"[ansheetcorrection] Internal OCR for {len(base64_images)} images...")
+    log.info(f"Internal OCR for {len(base64_images)} images...")
     results = []
     for idx, img_b64 in enumerate(base64_images):
         decoded_bytes = base64.b64decode(img_b64)
         ocr_result = await process_image_func(decoded_bytes)  # <- await here
-        print(f"[ansheetcorrection] OCR done for image #{idx}. Result keys: {list(ocr_result.keys())}")
+        log.info(f"OCR done for image #{idx}. Result keys: {list(ocr_result.keys())}")
         results.append(ocr_result)
     return results
 
     """Runs OCR synchronously using the internal OCR processing function."""
-    print(f"[ansheetcorrection] Internal OCR for {len(base64_images)} images...")
+    log.info(f"Internal OCR for {len(base64_images)} images...")
     results = []
     for idx, img_b64 in enumerate(base64_images):
         decoded_bytes = base64.b64decode(img_b64)
         ocr_result = process_image_func(decoded_bytes)
-        print(f"[ansheetcorrection] OCR done for image #{idx}. Result keys: {list(ocr_result.keys())}")
+        log.info(f"OCR done for image #{idx}. Result keys: {list(ocr_result.keys())}")
         results.append(ocr_result)
     return results
 
+async def run_ocr_concurrent_internal(images: List[bytes], process_image_func,
+                                      max_concurrency: int = OCR_MAX_WORKERS,
+                                      preprocess_func=None) -> List[Dict]:
+    """
+    Runs OCR for all pages concurrently (at most max_concurrency in flight), preserving page order.
+    Takes raw image bytes; preprocess_func (async, bytes -> bytes) runs per page before OCR.
+    """
+    log.info(f"Concurrent OCR for {len(images)} images (max {max_concurrency} in flight)...")
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(idx: int, image_bytes: bytes) -> Dict:
+        if preprocess_func is not None:
+            before = len(image_bytes)
+            image_bytes = await preprocess_func(image_bytes)
+            log.info(f"Preprocessed image #{idx}: {before} -> {len(image_bytes)} bytes")
+        async with sem:
+            ocr_result = await process_image_func(image_bytes)
+        log.info(f"OCR done for image #{idx}. Result keys: {list(ocr_result.keys())}")
+        return ocr_result
+
+    # gather returns results in argument order, so page order is kept
+    return await asyncio.gather(*(_one(idx, img) for idx, img in enumerate(images)))
+
 def merge_ocr_results(results: List[Dict[str, str]]) -> Dict[str, str]:
-    merged = {}
-    for idx, result in enumerate(results, 1):
-        merged.update(result)
-    print(f"[ansheetcorrection] Final merged answer keys: {list(merged.keys())}")
+    # Answers that run onto the next page are appended, not overwritten
+    merged = merge_page_answers(results)
+    log.info(f"Final merged answer keys: {list(merged.keys())}")
     return merged
 
 def rag_search_for_merged_answers(merged_answers: Dict[str, str], chroma_collection_name: str, top_k=8):
     merged_text = "\n".join([f"Q{qno}: {ans}" for qno, ans in merged_answers.items()])
     merged_embedding = get_embedding(merged_text)
-    rag_hits = query_chroma(chroma_collection_name, merged_embedding, page_filter=None)
+    rag_hits = query_chroma(chroma_collection_name, merged_embedding, page_filter=None, n_results=top_k)
     rag_contexts = [
         f"(Page {h['metadata']['page_no']}): {h['text']}" for h in rag_hits[:top_k]
     ]
     return rag_contexts
 
+def _question_text(q: Dict) -> str:
+    return q.get('question', q.get('text', ''))
+
+def rag_search_per_question(
+    questions: List[Dict],
+    chroma_collection_name: str,
+    merged_answers: Optional[Dict[str, str]] = None,
+    top_k: int = GRADING_CONTEXT_PER_QUESTION,
+) -> Dict[str, List[str]]:
+    """
+    Retrieves a small context per question: one batched embedding call for all
+    question(+answer) texts and one multi-vector Chroma query.
+    Without merged_answers the contexts depend only on the paper, so they can be
+    reused across students.
+    """
+    qnos = [str(q.get('question_no')) for q in questions]
+    texts = []
+    for qno, q in zip(qnos, questions):
+        text = f"Question: {_question_text(q)}"
+        if merged_answers is not None:
+            text += f"\nAnswer: {merged_answers.get(qno, '')}"
+        texts.append(text)
+    if not texts:
+        return {}
+    embeddings = get_embeddings(texts)
+    hits_per_question = query_chroma_multi(chroma_collection_name, embeddings, n_results=top_k)
+    return {
+        qno: [f"(Page {h['metadata']['page_no']}): {h['text']}" for h in hits]
+        for qno, hits in zip(qnos, hits_per_question)
+    }
+
+def stored_question_contexts(
+    question_paper_doc: Dict,
+    chroma_collection_name: str,
+    top_k: int = GRADING_CONTEXT_PER_QUESTION,
+) -> Optional[Dict[str, List[str]]]:
+    """Per-question context saved with the paper at creation time, if it fits this collection and k."""
+    grading_context = question_paper_doc.get("grading_context") or {}
+    if (grading_context.get("collection_name") != chroma_collection_name
+            or grading_context.get("top_k", 0) < top_k):
+        return None
+    return {qno: ctx[:top_k] for qno, ctx in (grading_context.get("questions") or {}).items()}
+
+def _grade_with_gemini(system_instruction: str, prompt: str) -> List[Dict]:
+    try:
+        with metrics.timed("llm_generate", GENERATION_MODEL):
+            resp = client.models.generate_content(
+                model=GENERATION_MODEL,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction,
+                    temperature=0.0
+                ),
+                contents=prompt
+            )
+        answer_text = resp.text.strip()
+        log.debug("Gemini raw output (truncated): %s", answer_text[:300])
+        # Try to find JSON array in output:
+        m = re.search(r'(\[[\s\S]+\])', answer_text)
+        if m:
+            return json.loads(m.group(1))
+        log.warning("Could not parse array; fallback to plain parsing.")
+    except Exception as e:
+        log.warning(f"Gemini correction exception: {e}")
+    return []
+
+def _per_question_prompt(questions: List[Dict], merged_answers: Dict[str, str],
+                         question_contexts: Dict[str, List[str]]) -> str:
+    sections = []
+    for q in questions:
+        qno = str(q.get('question_no'))
+        context = "\n".join(question_contexts.get(qno, [])) or "(none found)"
+        section = (
+            f"QUESTION {qno}. {_question_text(q)} [Max: {q.get('marks', 0)} marks]\n"
+            f"STUDENT'S ANSWER (from OCR): {merged_answers.get(qno, '')}\n"
+            f"RELEVANT TEXTBOOK CONTEXT (RAG):\n{context}"
+        )
+        if q.get("rubric"):
+            section += "\nMARKING POINTS:\n" + "\n".join(f"- {point}" for point in q["rubric"])
+        sections.append(section)
+    return (
+        "\n\n".join(sections)
+        + "\n\nFor each question above, evaluate and return marks, context, and remarks as a JSON array as detailed above."
+    )
+
 def correct_answers_single_rag(
     merged_answers: Dict[str, str],
     question_paper_doc: Dict,
     chroma_collection_name: str,
     correctiontype: str = "medium",
     rag_top_k: int = 15,
+    rag_mode: str = GRADING_RAG_MODE,
+    question_contexts: Optional[Dict[str, List[str]]] = None,
+    chunk_size: int = GRADING_CHUNK_SIZE,
 ):
+    """
+    Grades a sheet with Gemini. rag_mode="per_question" attaches a focused context
+    to each question (question_contexts if given, else the context stored with the
+    paper, else retrieved per question) and grades chunks of chunk_size questions
+    in parallel; "single" sends one shared context for the whole sheet in one call.
+    """
     questions = question_paper_doc["question_paper"]["questions"]
-    questions_for_prompt = [
-        f"{q.get('question_no')}. {q.get('question', q.get('text',''))} [Max: {q.get('marks',0)} marks]"
-        for q in questions
-    ]
-    merged_text = "\n".join([f"Q{qno}: {ans}" for qno, ans in merged_answers.items()])
-    rag_contexts = rag_search_for_merged_answers(merged_answers, chroma_collection_name, top_k=rag_top_k)
-    rag_context = "\n".join(rag_contexts)
 
     difficulty_map = {
         "easy": "Be lenient and focus on basic coverage of points.",
@@ -84,35 +201,34 @@ def correct_answers_single_rag(
 '''
     )
 
-    prompt = (
-        f"QUESTION PAPER (listing all questions):\n"
-        f"{chr(10).join(questions_for_prompt)}\n\n"
-        f"STUDENT'S ANSWERS (from OCR):\n{merged_text}\n\n"
-        f"RELEVANT TEXTBOOK CONTEXT (RAG):\n{rag_context}\n\n"
-        "For each question, evaluate and return marks, context, and remarks as a JSON array as detailed above."
-    )
-
-    try:
-        resp = client.models.generate_content(
-            model=GENERATION_MODEL,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.0
-            ),
-            contents=prompt
+    if rag_mode == "per_question":
+        if question_contexts is None:
+            question_contexts = stored_question_contexts(question_paper_doc, chroma_collection_name)
+        if question_contexts is None:
+            question_contexts = rag_search_per_question(questions, chroma_collection_name, merged_answers)
+        chunks = [questions[i:i + chunk_size] for i in range(0, len(questions), max(1, chunk_size))]
+        prompts = [_per_question_prompt(chunk, merged_answers, question_contexts) for chunk in chunks]
+        log.info(f"Grading {len(questions)} questions in {len(prompts)} chunk(s)")
+        with ThreadPoolExecutor(max_workers=max(1, min(GRADING_MAX_WORKERS, len(prompts)))) as pool:
+            grade = metrics.in_context(lambda p: _grade_with_gemini(system_instruction, p))
+            chunk_marks = list(pool.map(grade, prompts))
+        question_marks = [qm for marks in chunk_marks for qm in marks]
+    else:
+        questions_for_prompt = [
+            f"{q.get('question_no')}. {_question_text(q)} [Max: {q.get('marks',0)} marks]"
+            for q in questions
+        ]
+        merged_text = "\n".join([f"Q{qno}: {ans}" for qno, ans in merged_answers.items()])
+        rag_contexts = rag_search_for_merged_answers(merged_answers, chroma_collection_name, top_k=rag_top_k)
+        rag_context = "\n".join(rag_contexts)
+        prompt = (
+            f"QUESTION PAPER (listing all questions):\n"
+            f"{chr(10).join(questions_for_prompt)}\n\n"
+            f"STUDENT'S ANSWERS (from OCR):\n{merged_text}\n\n"
+            f"RELEVANT TEXTBOOK CONTEXT (RAG):\n{rag_context}\n\n"
+            "For each question, evaluate and return marks, context, and remarks as a JSON array as detailed above."
         )
-        answer_text = resp.text.strip()
-        print("[ansheetcorrection] Gemini raw output (truncated):", answer_text[:300])
-        # Try to find JSON array in output:
-        m = re.search(r'(\[[\s\S]+\])', answer_text)
-        if m:
-            question_marks = json.loads(m.group(1))
-        else:
-            print("[ansheetcorrection] Could not parse array; fallback to plain parsing.")
-            question_marks = []
-    except Exception as e:
-        print("[ansheetcorrection] Gemini correction exception:", str(e))
-        question_marks = []
+        question_marks = _grade_with_gemini(system_instruction, prompt)
 
     max_total_marks = sum(int(q.get('marks', 0)) for q in questions)
     obtained = sum(int(round(qm.get("marks", 0))) for qm in question_marks)
@@ -0,0 +1,85 @@
+"""
+Non-blocking structured logging for request hot paths.
+
+Loggers from get_logger() only put records on an in-memory queue
+(QueueHandler); one listener thread formats and writes them to stdout, so a
+request never waits on console I/O. LOG_FORMAT=json writes one JSON object per
+line, including any `extra={...}` fields; "text" keeps a readable line.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from config import LOG_LEVEL, LOG_FORMAT
+
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def _start():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json"
+                            else logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+        root = logging.getLogger("app")
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, stream)
+        _listener.start()
+        atexit.register(shutdown)
+
+
+def get_logger(name: str) -> logging.Logger:
+    _start()
+    return logging.getLogger(f"app.{name}")
+
+
+def _after_fork_in_child():
+    # The listener thread does not survive fork(); a forked worker starts its own
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        root = logging.getLogger("app")
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        _start()
+
+
+def shutdown():
+    """Writes out queued records and stops the listener thread."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,110 @@
+"""
+Benchmark: leaderboard chat latency on a standard query set.
+
+Generates a synthetic leaderboard (in memory, no Firestore), then times each
+query through the intent router (leaderboard_router) against a plain-Python
+scan over the docs doing the same lookups. With --llm, the same queries also
+go through the retrieval + Gemini path (needs GEMINI_API_KEY and an uploaded
+student_leaderboard Chroma collection).
+
+    python bench_leaderboard_chat.py --students 100000 --repeat 5 [--llm]
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("LEADERBOARD_BACKEND", "memory")
+
+from leaderboard import generate_students  # noqa: E402
+from leaderboard_router import LeaderboardTable, route  # noqa: E402
+
+QUERIES = [
+    "Who is ranked 1st?",
+    "Who is in third place?",
+    "Show me the top 5 students",
+    "Top 10 in maths",
+    "Which student scored highest in Mathematics?",
+    "Who is ranked 2nd in science?",
+    "bottom 3 in english",
+    "Top 5 in kannada in 10th standard section B",
+    "What is STU2025000042's rank?",
+    "How much did STU2025000077 score in Kannada?",
+    "What's the feedback for STU2025000100?",
+    "Compare STU2025000001 and STU2025000002",
+    "average marks in social studies",
+    "median percentage in section A",
+    "how many students scored above 90 in maths",
+    "how many students passed english",
+    "Why do students struggle in maths and what can teachers do?",
+]
+
+_SUBJECT_FIELD = {
+    "maths": "maths_marks", "mathematics": "maths_marks", "science": "science_marks",
+    "english": "english_marks", "kannada": "kannada_marks", "social": "social_marks",
+}
+
+
+def _scan_baseline(question: str, docs: list):
+    """What the lookups cost without the columnar table: full Python passes per query."""
+    q = question.lower()
+    field = next((f for word, f in _SUBJECT_FIELD.items() if word in q), "percentage")
+    ids = [w.upper() for w in q.replace("?", " ").replace("'s", " ").split() if w.startswith("stu")]
+    if ids:
+        return [d for d in docs if d["student_id"] in ids]
+    if "average" in q or "median" in q or "how many" in q:
+        values = [d[field] for d in docs]
+        return sum(values) / len(values), sorted(values)[len(values) // 2]
+    return sorted(docs, key=lambda d: (-d[field], d["rank"]))[:10]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm", action="store_true", help="also time retrieval + Gemini (slow, needs keys)")
+    args = parser.parse_args()
+
+    docs = generate_students(args.students, ("9th Standard", "10th Standard"), ("A", "B", "C"), seed=args.seed)
+    t0 = time.perf_counter()
+    table = LeaderboardTable(docs)
+    print(f"Built table for {table.n} students in {time.perf_counter() - t0:.2f}s\n")
+
+    print(f"{'query':<62} {'intent':<10} {'router ms':>10} {'scan ms':>10}")
+    router_ms, scan_ms, routed = [], [], 0
+    for q in QUERIES:
+        result = route(q, table)
+        intent = result[0] if result else "→ LLM"
+        routed += result is not None
+        r = _time(lambda: route(q, table), args.repeat) * 1000
+        s = _time(lambda: _scan_baseline(q, docs), args.repeat) * 1000
+        router_ms.append(r)
+        scan_ms.append(s)
+        print(f"{q[:60]:<62} {intent:<10} {r:>10.2f} {s:>10.2f}")
+
+    print(f"\nRouted {routed}/{len(QUERIES)} queries")
+    print(f"Median router: {statistics.median(router_ms):.2f} ms, median scan: {statistics.median(scan_ms):.2f} ms")
+
+    if args.llm:
+        from GeminiChatModel import leaderboard_chat
+
+        llm_ms = []
+        for q in QUERIES:
+            t0 = time.perf_counter()
+            leaderboard_chat(q)
+            llm_ms.append((time.perf_counter() - t0) * 1000)
+        print(f"Median retrieval + Gemini: {statistics.median(llm_ms):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: offline attendance (local_faces.LocalFaceAttendance) for growing classes.
+
+Uses the synthetic faces from fake_rekognition.py (colour squares): a square
+detector and an embedder that maps each face colour to a fixed random unit
+vector plus noise, so the numbers isolate the engine itself. --onnx-embedder
+swaps in the real ONNX embedder from config to time model inference (its
+answers on synthetic squares are meaningless, so results aren't checked).
+
+For each class size it reports the one-off gallery build, the re-sync with
+unchanged photos, a full group photo (detect + embed + match), and the matching
+pass alone: one matrix product vs a per-student cosine loop.
+
+    python bench_local_faces.py --students 40 400 4000 --max-faces 60
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from fake_rekognition import detect_squares, make_face, make_group
+from local_faces import LocalFaceAttendance, OnnxFaceEmbedder, crop
+
+
+class SquareDetector:
+    def detect(self, img: Image.Image):
+        return [(left, top, right, bottom)
+                for top, bottom, left, right, _ in detect_squares(np.asarray(img, dtype=np.int16))]
+
+
+class ColorEmbedder:
+    def __init__(self, dim: int = 512, noise: float = 0.05, seed: int = 0):
+        self.dim = dim
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    def embed(self, faces):
+        rows = []
+        for face in faces:
+            pixels = np.asarray(face, dtype=np.int16)
+            cy, cx = pixels.shape[0] // 2, pixels.shape[1] // 2
+            color = tuple(int(c) for c in np.median(pixels[cy - 2:cy + 3, cx - 2:cx + 3].reshape(-1, 3), axis=0))
+            identity = np.random.default_rng(abs(hash(color))).standard_normal(self.dim)
+            rows.append(identity / np.linalg.norm(identity) + self.rng.standard_normal(self.dim) * self.noise / np.sqrt(self.dim))
+        vectors = np.array(rows, dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _loop_match(names, matrix, queries, threshold):
+    """Per-student Python loop: what matching looks like without the matrix product."""
+    present = {}
+    for i, name in enumerate(names):
+        for q in queries:
+            sim = float(np.dot(q, matrix[i]) / (np.linalg.norm(q) * np.linalg.norm(matrix[i])))
+            if sim >= threshold and sim > present.get(name, -1):
+                present[name] = sim
+    return present
+
+
+async def _run(students: int, max_faces: int, photos: int, embedder):
+    refs = {f"student{i:04d}": make_face(i) for i in range(students)}
+    versions = {name: "1" for name in refs}
+    rng = np.random.default_rng(students)
+    engine = LocalFaceAttendance(SquareDetector(), embedder, gallery_path=None)
+
+    t0 = time.perf_counter()
+    await engine.sync(refs, versions)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    await engine.sync(refs, versions)
+    resync = time.perf_counter() - t0
+
+    faces = min(students, max_faces)
+    attendance_s, match_s, loop_s = [], [], []
+    for _ in range(photos):
+        chosen = sorted(rng.choice(students, faces, replace=False).tolist())
+        group = make_group(chosen)
+        t0 = time.perf_counter()
+        result = await engine.attendance(group, refs)
+        attendance_s.append(time.perf_counter() - t0)
+
+        img = Image.open(io.BytesIO(group)).convert("RGB")
+        queries = engine._embedder.embed([crop(img, box) for box in engine._detector.detect(img)])
+        t0 = time.perf_counter()
+        best = engine.gallery.best_similarity(queries, engine.threshold)
+        match_s.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        looped = _loop_match(engine.gallery.names, engine.gallery.matrix, queries, engine.threshold)
+        loop_s.append(time.perf_counter() - t0)
+
+        if isinstance(embedder, ColorEmbedder):
+            expected = {f"student{i:04d}" for i in chosen}
+            assert {n for n, s in result.items() if s == "present"} == expected, "wrong attendance"
+            assert set(looped) == {engine.gallery.names[i] for i in np.flatnonzero(best >= 0)}
+
+    return students, faces, build, resync, np.median(attendance_s), np.median(match_s), np.median(loop_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, nargs="+", default=[40, 400, 4000])
+    parser.add_argument("--max-faces", type=int, default=60, help="faces in each group photo")
+    parser.add_argument("--photos", type=int, default=5, help="group photos per class size")
+    parser.add_argument("--onnx-embedder", action="store_true", help="time the real ONNX embedder from config")
+    args = parser.parse_args()
+
+    embedder = OnnxFaceEmbedder() if args.onnx_embedder else ColorEmbedder()
+    rows = [asyncio.run(_run(n, args.max_faces, args.photos, embedder)) for n in args.students]
+
+    print(f"\nembedder={type(embedder).__name__} photos={args.photos} (medians)")
+    print(f"{'students':>8} {'faces':>6} {'build':>9} {'resync':>9} {'photo':>9} {'match':>9} {'loop match':>11}")
+    for students, faces, build, resync, photo, match, loop in rows:
+        print(f"{students:>8} {faces:>6} {build:>8.2f}s {resync * 1e3:>7.2f}ms {photo * 1e3:>7.1f}ms "
+              f"{match * 1e3:>7.3f}ms {loop * 1e3:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: sequential vs concurrent OCR of a multi-page answer sheet.
+
+Starts a local fake Vision server (REST `/v1/images:annotate`) that sleeps for
+--latency seconds per request, points the OCR client at it via
+VISION_API_ENDPOINT and OCRs --pages images both ways.
+
+    python bench_ocr.py --pages 12 --latency 0.8 --workers 8
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _fake_annotation(page_no: int) -> dict:
+    """A small fullTextAnnotation: one block per question, one word per symbol run."""
+    def word(text):
+        return {"symbols": [{"text": ch} for ch in text]}
+
+    blocks = []
+    for q in range(1, 4):
+        qno = (page_no * 3) + q
+        blocks.append({"paragraphs": [
+            {"words": [word(f"Q{qno}."), word("answer"), word("for"), word(f"page{page_no}")]}
+        ]})
+    return {"pages": [{"blocks": blocks}], "text": ""}
+
+
+def _make_handler(latency: float):
+    class FakeVisionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            responses = []
+            for req in body.get("requests", []):
+                # Page number is smuggled in as the image payload
+                page_no = int(base64.b64decode(req["image"]["content"]).decode())
+                responses.append({"fullTextAnnotation": _fake_annotation(page_no)})
+            payload = json.dumps({"responses": responses}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeVisionHandler
+
+
+async def _run(pages: int, workers: int):
+    from ocr import process_image
+    from ansheetcorrection import run_ocr_sequential_internal, run_ocr_concurrent_internal
+
+    raw_images = [str(i).encode() for i in range(pages)]
+    b64_images = [base64.b64encode(img).decode() for img in raw_images]
+
+    t0 = time.perf_counter()
+    seq = await run_ocr_sequential_internal(b64_images, process_image)
+    t_seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    conc = await run_ocr_concurrent_internal(raw_images, process_image, max_concurrency=workers)
+    t_conc = time.perf_counter() - t0
+
+    assert seq == conc, "concurrent OCR changed results or page order"
+    return t_seq, t_conc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds per Vision call")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["VISION_API_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["OCR_MAX_WORKERS"] = str(args.workers)
+    # Both passes OCR identical bytes; the result cache would turn the second into hits
+    os.environ["OCR_CACHE_ENABLED"] = "0"
+    # ansheetcorrection builds a Gemini client at import; no calls are made here
+    os.environ.setdefault("GOOGLE_API_KEY", "bench-not-used")
+
+    try:
+        t_seq, t_conc = asyncio.run(_run(args.pages, args.workers))
+    finally:
+        server.shutdown()
+
+    print(f"\npages={args.pages} latency={args.latency}s workers={args.workers}")
+    print(f"sequential : {t_seq:7.3f}s")
+    print(f"concurrent : {t_conc:7.3f}s  ({t_seq / t_conc:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: OCR text assembly throughput on synthetic dense pages.
+
+Builds Vision-shaped annotations (pages/blocks/paragraphs/words/symbols) and
+compares the old nested-loop `+=` builder with ocr_layout.annotation_to_text,
+then times extract_answers + merge_page_answers across a multi-page sheet.
+
+    python bench_ocr_assembly.py --pages 12 --blocks 60 --paragraphs 6 --words 40
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from ocr_layout import annotation_to_text, extract_answers, merge_page_answers
+
+_WORDS = ["the", "process", "of", "photosynthesis", "converts", "light", "energy",
+          "into", "chemical", "glucose", "water", "carbon", "dioxide", "chlorophyll"]
+
+
+def _synthetic_page(page_no: int, blocks: int, paragraphs: int, words: int, rng) -> SimpleNamespace:
+    def word(text):
+        return SimpleNamespace(symbols=[SimpleNamespace(text=ch) for ch in text])
+
+    qno = page_no * blocks
+    block_list = []
+    for b in range(blocks):
+        paras = []
+        for p in range(paragraphs):
+            tokens = [rng.choice(_WORDS) for _ in range(words)]
+            if p == 0 and b % 2 == 0:
+                qno += 1
+                tokens[0] = f"Q{qno}."
+            paras.append(SimpleNamespace(words=[word(t) for t in tokens]))
+        block_list.append(SimpleNamespace(paragraphs=paras))
+    return SimpleNamespace(pages=[SimpleNamespace(blocks=block_list)])
+
+
+def _old_annotation_to_text(annotation) -> str:
+    full_text = ""
+    for page in annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                paragraph_text = ''
+                for word in paragraph.words:
+                    word_text = ''.join([symbol.text for symbol in word.symbols])
+                    paragraph_text += word_text + ' '
+                full_text += "\n" + paragraph_text
+    return full_text
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--blocks", type=int, default=60)
+    parser.add_argument("--paragraphs", type=int, default=6)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [_synthetic_page(i, args.blocks, args.paragraphs, args.words, rng) for i in range(args.pages)]
+    chars = sum(len(annotation_to_text(p)) for p in pages)
+
+    t_old = _time(lambda: [_old_annotation_to_text(p) for p in pages], args.repeat)
+    t_new = _time(lambda: [annotation_to_text(p) for p in pages], args.repeat)
+
+    texts = [annotation_to_text(p) for p in pages]
+    t_merge = _time(lambda: merge_page_answers([extract_answers(t) for t in texts]), args.repeat)
+
+    print(f"\npages={args.pages} chars={chars:,} ({chars / args.pages / 1024:.0f} KB/page)")
+    print(f"old += builder   : {t_old * 1000:8.1f} ms  ({args.pages / t_old:8.1f} pages/s)")
+    print(f"list-join builder: {t_new * 1000:8.1f} ms  ({args.pages / t_new:8.1f} pages/s)")
+    print(f"extract + merge  : {t_merge * 1000:8.1f} ms  ({args.pages / t_merge:8.1f} pages/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: per-request memory and Vision payload size for answer-sheet uploads.
+
+Synthesizes --pages 12-megapixel phone photos (4000x3000 JPEG, EXIF-rotated) and
+compares:
+  * the old base64 round trip (encode every upload, decode again before OCR)
+    against passing raw bytes straight through, by Python peak memory;
+  * raw vs preprocessed payload size, and the upload time that implies at --uplink-mbps;
+  * preprocessing wall time in the process pool.
+
+    python bench_preprocess.py --pages 12 --uplink-mbps 10
+"""
+import argparse
+import asyncio
+import base64
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_preprocess import preprocess_image, preprocess_image_async, shutdown_pool
+
+
+def _synthetic_phone_photo(seed: int, size=(4000, 3000)) -> bytes:
+    """Paper-coloured noisy background with lines of 'handwriting', EXIF orientation 6."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = rng.normal(225, 12, (h, w, 3)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(base, "RGB")
+    draw = ImageDraw.Draw(img)
+    for y in range(150, h - 150, 90):
+        x = 200
+        while x < w - 300:
+            seg = int(rng.integers(40, 160))
+            draw.line([(x, y), (x + seg, y + int(rng.integers(-10, 10)))], fill=(30, 30, 60), width=6)
+            x += seg + int(rng.integers(20, 60))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90° as phones commonly store portrait shots
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+def _peak(fn) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _base64_path(images):
+    encoded = [base64.b64encode(img).decode("utf-8") for img in images]
+    for img_b64 in encoded:
+        decoded = base64.b64decode(img_b64)
+        del decoded
+
+
+def _raw_path(images):
+    for img in images:
+        view = memoryview(img)  # handed to OCR as-is
+        del view
+
+
+async def _preprocess_all(images):
+    return await asyncio.gather(*(preprocess_image_async(img) for img in images))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.pages} synthetic 12 MP photos…")
+    images = [_synthetic_phone_photo(i) for i in range(args.pages)]
+    raw_total = sum(len(b) for b in images)
+
+    peak_b64 = _peak(lambda: _base64_path(images))
+    peak_raw = _peak(lambda: _raw_path(images))
+
+    t0 = time.perf_counter()
+    single = preprocess_image(images[0])
+    t_single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    processed = asyncio.run(_preprocess_all(images))
+    t_pool = time.perf_counter() - t0
+    shutdown_pool()
+    proc_total = sum(len(b) for b in processed)
+
+    with Image.open(io.BytesIO(single)) as im:
+        out_size, out_mode = im.size, im.mode
+
+    def upload_s(nbytes):
+        return nbytes * 8 / (args.uplink_mbps * 1_000_000)
+
+    mb = 1024 * 1024
+    print(f"\npages={args.pages}")
+    print(f"extra peak memory, base64 round trip : {peak_b64 / mb:8.1f} MB")
+    print(f"extra peak memory, raw pass-through  : {peak_raw / mb:8.1f} MB")
+    print(f"payload raw          : {raw_total / mb:8.1f} MB  (~{upload_s(raw_total):.1f}s upload)")
+    print(f"payload preprocessed : {proc_total / mb:8.1f} MB  (~{upload_s(proc_total):.1f}s upload)")
+    print(f"output page          : {out_size[0]}x{out_size[1]} {out_mode}")
+    print(f"preprocess 1 page    : {t_single:8.3f}s")
+    print(f"preprocess all (pool): {t_pool:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: attendance against the local fake Rekognition server
+(fake_rekognition.py, --latency seconds per call), --students reference photos
+and group photos with --present of them in it:
+  per-call : a new aioboto3 session + client per student, all fired at once
+             (what check_student used to do)
+  pooled   : one RekognitionPool client, one CompareFaces per student
+  search   : FaceSearchAttendance on the same pool, one DetectFaces + one
+             SearchFacesByImage per detected face (collection indexed once,
+             before timing; the one-off index cost is printed separately)
+
+    python bench_rekognition.py --students 40 --present 0.5 --latency 0.15 --concurrency 16 --pool 32
+"""
+import argparse
+import asyncio
+import time
+
+import aioboto3
+
+from face_search import FaceSearchAttendance
+from fake_rekognition import FakeRekognitionServer, make_face, make_group
+from rekognition_client import RekognitionPool
+
+AWS_CONFIG = {
+    "aws_access_key_id": "bench",
+    "aws_secret_access_key": "bench",
+    "region_name": "us-east-1",
+}
+
+
+def _photos(students: int, present: float):
+    refs = {f"student{i:04d}": make_face(i) for i in range(students)}
+    group = make_group(i for i in range(students) if (i * present) % 1 + present >= 1)
+    return refs, group
+
+
+async def _per_call(endpoint_url: str, refs: dict, group: bytes) -> dict:
+    async def check(name, img):
+        async with aioboto3.Session().client("rekognition", endpoint_url=endpoint_url, **AWS_CONFIG) as rek:
+            result = await rek.compare_faces(
+                SourceImage={"Bytes": img}, TargetImage={"Bytes": group}, SimilarityThreshold=80
+            )
+            return name, "present" if result["FaceMatches"] else "absent"
+
+    return dict(await asyncio.gather(*(check(n, img) for n, img in refs.items())))
+
+
+async def _pooled(pool: RekognitionPool, refs: dict, group: bytes) -> dict:
+    async def check(name, img):
+        result = await pool.compare_faces(img, group, 80)
+        return name, "present" if result["FaceMatches"] else "absent"
+
+    return dict(await asyncio.gather(*(check(n, img) for n, img in refs.items())))
+
+
+async def _run(server: FakeRekognitionServer, students: int, present: float, requests: int,
+               concurrency: int, pool_size: int, skip_per_call: bool):
+    refs, group = _photos(students, present)
+    rows = []
+
+    def row(mode, t0):
+        rows.append((mode, time.perf_counter() - t0, server.requests, server.connections, server.max_in_flight))
+
+    if not skip_per_call:
+        server.reset_counters()
+        t0 = time.perf_counter()
+        for _ in range(requests):
+            baseline = await _per_call(server.endpoint_url, refs, group)
+        row("per-call", t0)
+
+    pool = RekognitionPool(AWS_CONFIG, endpoint_url=server.endpoint_url,
+                           max_pool_connections=pool_size, concurrency=concurrency)
+    await pool.start()
+    server.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        pooled = await _pooled(pool, refs, group)
+    row("pooled", t0)
+
+    search = FaceSearchAttendance(pool, collection_id="bench")
+    versions = {name: "1" for name in refs}
+    server.reset_counters()
+    t0 = time.perf_counter()
+    await search.sync(refs, versions)
+    row("index", t0)
+    server.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        await search.sync(refs, versions)  # unchanged photos: no calls
+        searched = await search.attendance(group, refs)
+    row("search", t0)
+    await pool.stop()
+
+    if not skip_per_call:
+        assert pooled == baseline, "pooled client changed attendance results"
+    assert searched == pooled, "face search changed attendance results"
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--present", type=float, default=0.5, help="fraction of students in the group photo")
+    parser.add_argument("--requests", type=int, default=3, help="attendance requests (group photos) in a row")
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per Rekognition call")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool", type=int, default=32, help="max_pool_connections")
+    parser.add_argument("--skip-per-call", action="store_true", help="only pooled vs search (large classes)")
+    args = parser.parse_args()
+
+    server = FakeRekognitionServer(args.latency).start()
+    try:
+        rows = asyncio.run(_run(server, args.students, args.present, args.requests,
+                                args.concurrency, args.pool, args.skip_per_call))
+    finally:
+        server.stop()
+
+    print(f"\nstudents={args.students} present={args.present} requests={args.requests} "
+          f"latency={args.latency}s concurrency={args.concurrency} pool={args.pool}")
+    print(f"{'mode':<10} {'time':>8} {'calls':>7} {'connections':>12} {'max in flight':>14}")
+    for mode, elapsed, calls, connections, in_flight in rows:
+        print(f"{mode:<10} {elapsed:>7.2f}s {calls:>7} {connections:>12} {in_flight:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: cold-start cost of the app's modules, each in a fresh interpreter.
+
+For every --modules entry it reports the median over --runs of:
+  import   : time to import the module (clients are lazy, so no client is built)
+  warm-up  : clients.warm_up() afterwards, i.e. what importing used to pay up
+             front; clients that can't be built here (missing credentials) are
+             listed instead of failing the run
+  lifespan : for modules with a FastAPI `app` (--lifespan), entering and leaving
+             its lifespan with CLIENT_WARMUP as currently configured
+
+and an import-time profile (python -X importtime) of the first module: the
+--top slowest imports by cumulative time.
+
+    python bench_startup.py --modules main --runs 3 --lifespan
+    python bench_startup.py --modules firestore11 StudentLeaderboardVectorStore ocr search_engine
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import importlib
+module = importlib.import_module(sys.argv[1])
+result = {"import": time.perf_counter() - t0}
+if sys.argv[2] == "1" and hasattr(module, "app"):
+    async def run():
+        t = time.perf_counter()
+        async with module.app.router.lifespan_context(module.app):
+            result["lifespan"] = time.perf_counter() - t
+    asyncio.run(run())
+import clients
+t = time.perf_counter()
+errors = clients.warm_up()
+result["warm_up"] = time.perf_counter() - t
+result["clients"] = sorted(errors)
+result["failed"] = {name: err for name, err in errors.items() if err}
+print("__BENCH__" + json.dumps(result))
+"""
+
+
+def _run_child(module: str, lifespan: bool) -> dict:
+    proc = subprocess.run([sys.executable, "-c", _CHILD, module, "1" if lifespan else "0"],
+                          capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("__BENCH__"):
+            return json.loads(line[len("__BENCH__"):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:]
+    return {"error": tail[0] if tail else f"exit {proc.returncode}"}
+
+
+def import_profile(module: str, top: int):
+    """[(cumulative seconds, module)] of the slowest imports (python -X importtime)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [p.strip() for p in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["main"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--lifespan", action="store_true", help="also time the FastAPI lifespan startup")
+    parser.add_argument("--top", type=int, default=15, help="rows in the import-time profile")
+    args = parser.parse_args()
+
+    print(f"{'module':<32} {'import':>8} {'warm-up':>9} {'lifespan':>9}  clients")
+    for module in args.modules:
+        runs = [_run_child(module, args.lifespan) for _ in range(args.runs)]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            print(f"{module:<32} failed: {runs[0]['error']}")
+            continue
+
+        def median(key):
+            values = [r[key] for r in ok if key in r]
+            return f"{statistics.median(values):.2f}s" if values else "-"
+
+        failed = ok[0]["failed"]
+        built = [c for c in ok[0]["clients"] if c not in failed]
+        print(f"{module:<32} {median('import'):>8} {median('warm_up'):>9} {median('lifespan'):>9}  "
+              f"built: {', '.join(built) or '-'}" + (f"; failed: {', '.join(failed)}" if failed else ""))
+
+    print(f"\nimport-time profile of {args.modules[0]} (cumulative):")
+    for seconds, name in import_profile(args.modules[0], args.top):
+        print(f"  {seconds:>7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from ansheetcorrection import (
+    run_ocr_concurrent_internal,
+    merge_ocr_results,
+    correct_answers_single_rag,
+    rag_search_per_question,
+    stored_question_contexts,
+)
+from firestore11 import get_question_paper, store_studentmarks_batch
+from image_preprocess import preprocess_image_async
+from ocr import process_image
+from app_logging import get_logger
+from config import (
+    OCR_PREPROCESS, GRADING_CONTEXT_PER_QUESTION,
+    BULK_OCR_CONCURRENCY, BULK_GRADING_CONCURRENCY, BULK_WRITE_BATCH_SIZE,
+    BULK_JOB_TTL_S, BULK_CONTEXT_CACHE_SIZE,
+)
+
+log = get_logger("bulk_grading")
+
+# Per-question textbook context depends only on (paper, collection, k), so it is
+# shared by every student and every job grading the same paper (LRU, BULK_CONTEXT_CACHE_SIZE papers).
+_context_cache: "OrderedDict[Tuple[str, str, int], Dict[str, List[str]]]" = OrderedDict()
+
+# job_id -> BulkGradingJob (kept in memory; jobs are polled by id until BULK_JOB_TTL_S after they finish)
+_jobs: Dict[str, "BulkGradingJob"] = {}
+
+
+class BulkGradingJob:
+    """Grades many students' sheets for one assignment, reporting progress per student."""
+
+    def __init__(self, students: Dict[str, List[bytes]], questionpaperdocfromfiretore: str,
+                 subject: str, assignmentid: str, classgrade: str,
+                 chromadbcollectionname: str, correctiontype: str):
+        self.job_id = str(uuid4())
+        self.students = students
+        self.questionpaperdocfromfiretore = questionpaperdocfromfiretore
+        self.subject = subject
+        self.assignmentid = assignmentid
+        self.classgrade = classgrade
+        self.chromadbcollectionname = chromadbcollectionname
+        self.correctiontype = correctiontype
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.progress: Dict[str, Dict] = {
+            sid: {"status": "queued", "pages": len(pages)} for sid, pages in students.items()
+        }
+        self._pending_writes: List[dict] = []
+        self._write_lock = asyncio.Lock()
+
+    def to_dict(self) -> dict:
+        counts: Dict[str, int] = {}
+        for p in self.progress.values():
+            counts[p["status"]] = counts.get(p["status"], 0) + 1
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "assignmentid": self.assignmentid,
+            "questionpaperdocfromfiretore": self.questionpaperdocfromfiretore,
+            "total_students": len(self.students),
+            "counts": counts,
+            "students": self.progress,
+            "elapsed_s": round((self.finished_at or time.time()) - self.created_at, 2),
+        }
+
+    async def _question_contexts(self, qp_doc: dict) -> Dict[str, List[str]]:
+        stored = stored_question_contexts(qp_doc, self.chromadbcollectionname)
+        if stored is not None:
+            return stored
+        key = (self.questionpaperdocfromfiretore, self.chromadbcollectionname, GRADING_CONTEXT_PER_QUESTION)
+        contexts = _context_cache.get(key)
+        if contexts is None:
+            questions = qp_doc["question_paper"]["questions"]
+            contexts = await asyncio.to_thread(
+                rag_search_per_question, questions, self.chromadbcollectionname
+            )
+            _context_cache[key] = contexts
+        _context_cache.move_to_end(key)
+        while len(_context_cache) > BULK_CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+        return contexts
+
+    async def _flush(self, force: bool = False):
+        """
+        Commits pending marks once a batch is full (or always, with force). A failed
+        commit puts the batch back for the next flush; on the final (forced) flush
+        those students are marked failed instead. Never raises.
+        """
+        async with self._write_lock:
+            if not self._pending_writes or (not force and len(self._pending_writes) < BULK_WRITE_BATCH_SIZE):
+                return
+            batch, self._pending_writes = self._pending_writes, []
+            try:
+                await asyncio.to_thread(store_studentmarks_batch, batch)
+            except Exception as e:
+                if not force:
+                    log.warning(f"{self.job_id}: storing {len(batch)} students failed, will retry: {e}")
+                    self._pending_writes = batch + self._pending_writes
+                    return
+                log.error(f"{self.job_id}: storing {len(batch)} students failed: {e}")
+                for resp in batch:
+                    self.progress[resp["studentid"]].update(status="failed", error=f"storing marks failed: {e}")
+                return
+            for resp in batch:
+                self.progress[resp["studentid"]]["status"] = "stored"
+
+    async def _grade_student(self, studentid: str, qp_doc: dict, contexts: Dict[str, List[str]],
+                             ocr_sem: asyncio.Semaphore, grading_sem: asyncio.Semaphore):
+        progress = self.progress[studentid]
+        try:
+            async with ocr_sem:
+                progress["status"] = "ocr"
+                ocr_results = await run_ocr_concurrent_internal(
+                    self.students[studentid], process_image,
+                    preprocess_func=preprocess_image_async if OCR_PREPROCESS else None
+                )
+            # Page bytes are no longer needed once OCR'd
+            self.students[studentid] = []
+            merged_answers = merge_ocr_results(ocr_results)
+
+            async with grading_sem:
+                progress["status"] = "grading"
+                total, details = await asyncio.to_thread(
+                    correct_answers_single_rag,
+                    merged_answers, qp_doc, self.chromadbcollectionname,
+                    correctiontype=self.correctiontype, question_contexts=contexts,
+                )
+        except Exception as e:
+            log.warning(f"{self.job_id}: student {studentid} failed: {e}")
+            progress.update(status="failed", error=str(e))
+            return
+
+        progress.update(status="graded", totalmarks=total)
+        self._pending_writes.append({
+            "totalmarks": total,
+            "eachquestion_marks": details,
+            "studentid": studentid,
+            "questionpaperdocfromfiretore": self.questionpaperdocfromfiretore,
+            "subject": self.subject,
+            "assignmentid": self.assignmentid,
+            "classgrade": self.classgrade,
+        })
+        await self._flush()
+
+    async def run(self):
+        self.status = "running"
+        log.info(f"{self.job_id}: grading {len(self.students)} students")
+        try:
+            qp_doc = await asyncio.to_thread(get_question_paper, self.questionpaperdocfromfiretore)
+            if not qp_doc:
+                raise ValueError(f"No question paper found with ID: {self.questionpaperdocfromfiretore}")
+            contexts = await self._question_contexts(qp_doc)
+
+            ocr_sem = asyncio.Semaphore(BULK_OCR_CONCURRENCY)
+            grading_sem = asyncio.Semaphore(BULK_GRADING_CONCURRENCY)
+            await asyncio.gather(*(
+                self._grade_student(sid, qp_doc, contexts, ocr_sem, grading_sem)
+                for sid in list(self.students)
+            ))
+            await self._flush(force=True)
+            self.status = "completed"
+        except Exception as e:
+            log.error(f"{self.job_id}: job failed: {e}")
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            log.info(f"{self.job_id}: {self.status} in {self.finished_at - self.created_at:.1f}s")
+
+
+def _expire_jobs():
+    cutoff = time.time() - BULK_JOB_TTL_S
+    for job_id in [j.job_id for j in _jobs.values() if j.finished_at is not None and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def start_job(job: BulkGradingJob) -> BulkGradingJob:
+    _expire_jobs()
+    _jobs[job.job_id] = job
+    job.task = asyncio.create_task(job.run())
+    return job
+
+
+def get_job(job_id: str) -> Optional[BulkGradingJob]:
+    _expire_jobs()
+    return _jobs.get(job_id)
@@ -0,0 +1,141 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from config import (
+    CHAT_SESSION_MAX_TURNS, CHAT_SESSION_SUMMARY_CHARS, CHAT_SESSION_MAX_ENTITIES,
+    CHAT_SESSION_TTL_S, CHAT_SESSION_MAX_SESSIONS
+)
+from app_logging import get_logger
+
+log = get_logger("chat_sessions")
+
+_PRONOUN_RE = re.compile(r"\b(he|she|him|her|his|hers|they|them|their|theirs|both)\b", re.I)
+_PLURAL_RE = re.compile(r"\b(they|them|their|theirs|both)\b", re.I)
+
+Turn = Tuple[str, str]  # (question, answer)
+
+
+def extractive_summary(summary: str, turns: List[Turn], max_chars: int = CHAT_SESSION_SUMMARY_CHARS) -> str:
+    """Cheap summary: clipped Q/A pairs appended to the old summary, oldest text dropped first."""
+    parts = [summary] if summary else []
+    parts += [f"Q: {q[:150]} A: {a[:250]}" for q, a in turns]
+    text = " | ".join(parts)
+    return text[-max_chars:]
+
+
+class ChatSession:
+    """
+    Bounded memory for one conversation: at most 2 * max_turns recent turns
+    verbatim, a rolling summary of everything older (capped at summary_chars),
+    and an LRU of the student records the conversation has touched.
+    """
+
+    def __init__(self, session_id: str, max_turns: int = CHAT_SESSION_MAX_TURNS,
+                 summary_chars: int = CHAT_SESSION_SUMMARY_CHARS,
+                 max_entities: int = CHAT_SESSION_MAX_ENTITIES):
+        self.session_id = session_id
+        self.max_turns = max_turns
+        self.summary_chars = summary_chars
+        self.max_entities = max_entities
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self.entities: "OrderedDict[str, dict]" = OrderedDict()  # student_id -> record
+        self.focus: List[str] = []  # students the last answer was about
+        self.lock = asyncio.Lock()  # one request per session at a time
+        self.last_used = time.monotonic()
+
+    def is_followup(self, question: str) -> bool:
+        return bool(self.focus) and bool(_PRONOUN_RE.search(question))
+
+    def resolve(self, question: str) -> str:
+        """
+        Makes pronouns concrete for lookup: "and her science marks?" gets the
+        focused student's id appended (all focused students for they/them/both).
+        """
+        if not self.is_followup(question):
+            return question
+        ids = self.focus if _PLURAL_RE.search(question) else self.focus[:1]
+        return f"{question} ({' and '.join(ids)})"
+
+    def remember(self, records: Iterable[dict], focus: Optional[List[str]] = None):
+        for record in records:
+            sid = record.get('student_id')
+            if not sid:
+                continue
+            self.entities[sid] = record
+            self.entities.move_to_end(sid)
+        while len(self.entities) > self.max_entities:
+            self.entities.popitem(last=False)
+        if focus:
+            self.focus = [sid for sid in focus if sid in self.entities][:5]
+
+    def focused_records(self) -> List[dict]:
+        return [self.entities[sid] for sid in self.focus if sid in self.entities]
+
+    def add_turn(self, question: str, answer: str,
+                 summarize: Callable[[str, List[Turn]], str] = extractive_summary):
+        """
+        Records a turn. Once 2 * max_turns are held, the oldest max_turns are
+        folded into the summary in one call, so summarizing costs one call per
+        max_turns turns and the prompt never grows past the caps.
+        """
+        self.turns.append((question, answer))
+        if len(self.turns) >= 2 * self.max_turns:
+            old, self.turns = self.turns[:self.max_turns], self.turns[self.max_turns:]
+            try:
+                self.summary = summarize(self.summary, old)[-self.summary_chars:]
+            except Exception as e:
+                log.warning(f"Summary failed, using extractive: {e}")
+                self.summary = extractive_summary(self.summary, old, self.summary_chars)
+
+    def history_text(self, max_chars_per_turn: int = 600) -> str:
+        """Summary + recent turns, each clipped, for the LLM prompt."""
+        parts = []
+        if self.summary:
+            parts.append(f"Conversation so far (summary): {self.summary}")
+        for q, a in self.turns:
+            parts.append(f"User: {q[:max_chars_per_turn]}\nAssistant: {a[:max_chars_per_turn]}")
+        return "\n\n".join(parts)
+
+
+class ChatSessionStore:
+    """In-process sessions, LRU-evicted past max_sessions and expired after ttl_s idle."""
+
+    def __init__(self, max_sessions: int = CHAT_SESSION_MAX_SESSIONS, ttl_s: float = CHAT_SESSION_TTL_S):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> ChatSession:
+        """The session for session_id (new if unknown or expired); a fresh id if None."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_used > self.ttl_s:
+                session = None
+            if session is None:
+                session = ChatSession(session_id or uuid4().hex)
+                self._sessions[session.session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session.session_id)
+            self._evict(now)
+            return session
+
+    def _evict(self, now: float):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl_s:
+                break
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
@@ -0,0 +1,171 @@
+"""
+Lazily built, process-wide API clients.
+
+Importing the app used to construct every client at import time (Chroma twice,
+Firestore in four modules, Vision, GCS, one genai client per module), so cold
+start paid for all of them and one missing credential failed the whole import.
+Each client is now a LazyClient: a proxy that builds the real client on first
+attribute access, once, and is shared by every module. The FastAPI lifespan
+can warm them up (CLIENT_WARMUP) and closes whatever was built on shutdown.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from config import CHROMA_DB_DIR, GOOGLE_CREDENTIALS_FILE
+from app_logging import get_logger
+
+log = get_logger("clients")
+
+
+class LazyClient:
+    """Builds `factory()` on first use (thread-safe); attribute access is forwarded to it."""
+
+    def __init__(self, name: str, factory: Callable[[], object], close: Optional[Callable[[object], None]] = None):
+        self._name = name
+        self._factory = factory
+        self._close = close
+        self._client = None
+        self._lock = threading.Lock()
+        self._init_s: Optional[float] = None
+        self._error: Optional[str] = None
+
+    def get(self):
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                t0 = time.perf_counter()
+                try:
+                    self._client = self._factory()
+                except Exception as e:
+                    self._error = f"{type(e).__name__}: {e}"
+                    raise
+                self._init_s = time.perf_counter() - t0
+                self._error = None
+                log.info(f"{self._name} ready in {self._init_s * 1000:.0f} ms")
+            return self._client
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None and self._close is not None:
+            try:
+                self._close(client)
+            except Exception as e:
+                log.warning(f"Error closing {self._name}: {e}")
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "init_ms": round(self._init_s * 1000, 1) if self._init_s else None,
+                "error": self._error}
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        return f"<LazyClient {self._name} ({'ready' if self.ready else 'not built'})>"
+
+
+_registry: Dict[str, LazyClient] = {}
+_registry_lock = threading.Lock()
+
+
+def lazy_client(name: str, factory: Callable[[], object],
+                close: Optional[Callable[[object], None]] = None) -> LazyClient:
+    """The registered LazyClient called `name`, created with `factory` the first time."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyClient(name, factory, close)
+        return _registry[name]
+
+
+def _close_method(client):
+    close = getattr(client, "close", None)
+    if callable(close):
+        close()
+
+
+def _google_credentials():
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_CREDENTIALS_FILE
+
+
+def _make_chroma():
+    from chromadb import PersistentClient
+    from chromadb.config import Settings
+    os.makedirs(CHROMA_DB_DIR, exist_ok=True)
+    return PersistentClient(CHROMA_DB_DIR, settings=Settings(anonymized_telemetry=False))
+
+
+def _make_firestore():
+    from google.cloud import firestore
+    _google_credentials()
+    return firestore.Client()
+
+
+def _make_storage():
+    from google.cloud import storage
+    _google_credentials()
+    return storage.Client()
+
+
+_genai_by_key: Dict[Optional[str], object] = {}
+
+
+def _make_genai(api_key_env: Optional[str]):
+    def factory():
+        from google import genai
+        api_key = os.getenv(api_key_env) if api_key_env else None
+        # Env vars holding the same key share one client
+        with _registry_lock:
+            if api_key not in _genai_by_key:
+                _genai_by_key[api_key] = genai.Client(api_key=api_key)
+            return _genai_by_key[api_key]
+    return factory
+
+
+# One Chroma client per process: two PersistentClients on one directory don't share state
+chroma = lazy_client("chroma", _make_chroma)
+firestore_db = lazy_client("firestore", _make_firestore, _close_method)
+storage_client = lazy_client("storage", _make_storage, _close_method)
+
+
+def genai_client(api_key_env: Optional[str] = None) -> LazyClient:
+    """Shared genai client; api_key_env names the env var with the key (None = library default)."""
+    return lazy_client(f"genai:{api_key_env}" if api_key_env else "genai", _make_genai(api_key_env))
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+    """
+    Builds the named clients (all registered ones if None) now instead of on
+    first request. Failures are reported, not raised, so startup continues.
+    """
+    wanted = None if names is None else set(names)
+    with _registry_lock:
+        targets = [c for n, c in _registry.items() if wanted is None or n in wanted]
+    results = {}
+    for client in targets:
+        try:
+            client.get()
+            results[client._name] = None
+        except Exception as e:
+            log.warning(f"Warm-up of {client._name} failed: {e}")
+            results[client._name] = f"{type(e).__name__}: {e}"
+    return results
+
+
+def close_all():
+    with _registry_lock:
+        targets = list(_registry.values())
+    for client in targets:
+        client.close()
+
+
+def stats() -> Dict[str, dict]:
+    with _registry_lock:
+        return {name: client.stats() for name, client in _registry.items()}
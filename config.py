@@ -8,10 +8,126 @@ _raw = os.getenv("CHROMA_DB_DIR", "./chroma_db")
 CHROMA_DB_DIR = os.path.abspath(_raw)
 
 GEMINI_API_KEY   = os.getenv("GEMINI_API_KEY")
+
+# Service-account file for Firestore / Cloud Storage (an env var wins over the repo default).
+GOOGLE_CREDENTIALS_FILE = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "sahayak-d88d3-2e1f13a7b2bc.json")
+# Clients are built on first use; list names ("firestore,chroma,genai,...") or "all" to build them at startup.
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "")
+
+# Logging: records are queued and written by a background thread (app_logging.py).
+LOG_LEVEL  = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")   # "text" or "json"
+
 EMBEDDING_MODEL  = "gemini-embedding-001"
 GENERATION_MODEL = "gemini-2.5-flash-lite"
 TOP_K            = 10
 
+# OCR: Vision round trips are blocking, so they run on a bounded thread pool.
+OCR_MAX_WORKERS     = int(os.getenv("OCR_MAX_WORKERS", "8"))
+# Point the Vision client at a local/fake endpoint (benchmarks, emulators).
+VISION_API_ENDPOINT = os.getenv("VISION_API_ENDPOINT")
+# Pre-OCR image shrink (EXIF-rotate, grayscale, downscale, re-encode) in a process pool.
+OCR_PREPROCESS         = os.getenv("OCR_PREPROCESS", "1") == "1"
+OCR_TARGET_DPI         = int(os.getenv("OCR_TARGET_DPI", "200"))
+OCR_JPEG_QUALITY       = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+OCR_PREPROCESS_WORKERS = int(os.getenv("OCR_PREPROCESS_WORKERS", str(os.cpu_count() or 2)))
+# Content-hash OCR result cache (SQLite, LRU-evicted).
+OCR_CACHE_ENABLED     = os.getenv("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_PATH        = os.path.abspath(os.getenv("OCR_CACHE_PATH", "./ocr_cache/ocr_cache.sqlite3"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "5000"))
+
+# Answer grading: "per_question" retrieves a small context per question in one
+# batched embed + multi-vector query; "single" keeps one context for the sheet.
+GRADING_RAG_MODE             = os.getenv("GRADING_RAG_MODE", "per_question")
+GRADING_CONTEXT_PER_QUESTION = int(os.getenv("GRADING_CONTEXT_PER_QUESTION", "3"))
+GRADING_CHUNK_SIZE           = int(os.getenv("GRADING_CHUNK_SIZE", "10"))   # questions per Gemini call
+GRADING_MAX_WORKERS          = int(os.getenv("GRADING_MAX_WORKERS", "4"))
+
+# Precompute per-question context (and optional Gemini rubric points) when a
+# question paper is created, so grading can skip retrieval.
+GRADING_PRECOMPUTE_CONTEXT = os.getenv("GRADING_PRECOMPUTE_CONTEXT", "1") == "1"
+GRADING_PRECOMPUTE_RUBRIC  = os.getenv("GRADING_PRECOMPUTE_RUBRIC", "0") == "1"
+
+# In-process read-through cache for question paper docs.
+QUESTION_PAPER_CACHE_TTL  = float(os.getenv("QUESTION_PAPER_CACHE_TTL", "600"))  # seconds
+QUESTION_PAPER_CACHE_SIZE = int(os.getenv("QUESTION_PAPER_CACHE_SIZE", "256"))
+
+# Whole-class bulk grading: students in the OCR / grading stages at once,
+# and how many finished students are committed per Firestore batch.
+BULK_OCR_CONCURRENCY     = int(os.getenv("BULK_OCR_CONCURRENCY", "4"))
+BULK_GRADING_CONCURRENCY = int(os.getenv("BULK_GRADING_CONCURRENCY", "4"))
+BULK_WRITE_BATCH_SIZE    = int(os.getenv("BULK_WRITE_BATCH_SIZE", "20"))
+# Finished jobs stay pollable this long; per-paper contexts kept for at most this many papers.
+BULK_JOB_TTL_S           = float(os.getenv("BULK_JOB_TTL_S", "3600"))
+BULK_CONTEXT_CACHE_SIZE  = int(os.getenv("BULK_CONTEXT_CACHE_SIZE", "64"))
+
+# Queued grading jobs: SQLite queue + spooled uploads, drained by grading_worker.py.
+GRADING_QUEUE_PATH         = os.path.abspath(os.getenv("GRADING_QUEUE_PATH", "./grading_queue/jobs.sqlite3"))
+GRADING_SPOOL_DIR          = os.path.abspath(os.getenv("GRADING_SPOOL_DIR", "./grading_queue/spool"))
+GRADING_JOB_LEASE_S        = float(os.getenv("GRADING_JOB_LEASE_S", "300"))
+GRADING_JOB_MAX_ATTEMPTS   = int(os.getenv("GRADING_JOB_MAX_ATTEMPTS", "3"))
+GRADING_WORKER_PROCESSES   = int(os.getenv("GRADING_WORKER_PROCESSES", "2"))
+GRADING_WORKER_CONCURRENCY = int(os.getenv("GRADING_WORKER_CONCURRENCY", "2"))  # jobs per process
+# Worker process i serves its own /metrics on this port + i (0 = off); the API's /metrics never sees them.
+GRADING_WORKER_METRICS_PORT = int(os.getenv("GRADING_WORKER_METRICS_PORT", "0"))
+
+# Write-behind buffer for student marks (batched Firestore writes off the request path).
+MARKS_WRITE_BEHIND     = os.getenv("MARKS_WRITE_BEHIND", "1") == "1"
+MARKS_FLUSH_BATCH_SIZE = int(os.getenv("MARKS_FLUSH_BATCH_SIZE", "100"))     # <= 250 (2 writes each)
+MARKS_FLUSH_INTERVAL_S = float(os.getenv("MARKS_FLUSH_INTERVAL_S", "2.0"))
+MARKS_QUEUE_MAX        = int(os.getenv("MARKS_QUEUE_MAX", "10000"))
+MARKS_FLUSH_RETRIES    = int(os.getenv("MARKS_FLUSH_RETRIES", "5"))
+# Results still failing after MARKS_FLUSH_RETRIES are kept here for replay instead of being dropped.
+MARKS_DEAD_LETTER_PATH = os.path.abspath(os.getenv("MARKS_DEAD_LETTER_PATH", "./grading_queue/marks_dead_letter.sqlite3"))
+
+# Serve /leaderboard from an in-process cache kept fresh by a Firestore snapshot listener.
+LEADERBOARD_CACHE_ENABLED = os.getenv("LEADERBOARD_CACHE_ENABLED", "1") == "1"
+
+# Backend for leaderboard.py: "firestore" (honours FIRESTORE_EMULATOR_HOST) or "memory" for load tests.
+LEADERBOARD_BACKEND = os.getenv("LEADERBOARD_BACKEND", "firestore")
+
+# Materialized leaderboard analytics (per class/section views, updated on every marks write).
+ANALYTICS_PASS_PERCENT = float(os.getenv("ANALYTICS_PASS_PERCENT", "35"))
+ANALYTICS_TOP_N        = int(os.getenv("ANALYTICS_TOP_N", "10"))
+
+# Keep the student_leaderboard Chroma collection in sync from a Firestore listener.
+LEADERBOARD_VECTOR_SYNC            = os.getenv("LEADERBOARD_VECTOR_SYNC", "0") == "1"
+LEADERBOARD_VECTOR_SYNC_DEBOUNCE_S = float(os.getenv("LEADERBOARD_VECTOR_SYNC_DEBOUNCE_S", "2.0"))
+
+# Multi-turn leaderboard chat: recent turns kept verbatim, older ones folded into a
+# rolling summary, plus the student records the conversation is about.
+CHAT_SESSION_MAX_TURNS     = int(os.getenv("CHAT_SESSION_MAX_TURNS", "6"))
+CHAT_SESSION_SUMMARY_CHARS = int(os.getenv("CHAT_SESSION_SUMMARY_CHARS", "1200"))
+CHAT_SESSION_MAX_ENTITIES  = int(os.getenv("CHAT_SESSION_MAX_ENTITIES", "20"))
+CHAT_SESSION_TTL_S         = float(os.getenv("CHAT_SESSION_TTL_S", "1800"))
+CHAT_SESSION_MAX_SESSIONS  = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "1000"))
+
+# /attendance: local cache of student reference photos (disk by blob generation + memory LRU).
+STUDENT_PHOTO_CACHE_DIR             = os.path.abspath(os.getenv("STUDENT_PHOTO_CACHE_DIR", "./photo_cache"))
+STUDENT_PHOTO_MEMORY_MB             = float(os.getenv("STUDENT_PHOTO_MEMORY_MB", "64"))
+STUDENT_PHOTO_LIST_TTL_S            = float(os.getenv("STUDENT_PHOTO_LIST_TTL_S", "30"))   # reuse bucket listing
+STUDENT_PHOTO_DOWNLOAD_CONCURRENCY  = int(os.getenv("STUDENT_PHOTO_DOWNLOAD_CONCURRENCY", "16"))
+
+# Shared Rekognition client for /attendance: one connection pool, bounded calls in flight.
+REKOGNITION_ENDPOINT_URL         = os.getenv("REKOGNITION_ENDPOINT_URL")  # local/fake endpoint for benchmarks
+REKOGNITION_MAX_POOL_CONNECTIONS = int(os.getenv("REKOGNITION_MAX_POOL_CONNECTIONS", "32"))
+REKOGNITION_CONCURRENCY          = int(os.getenv("REKOGNITION_CONCURRENCY", "16"))
+REKOGNITION_MAX_ATTEMPTS         = int(os.getenv("REKOGNITION_MAX_ATTEMPTS", "3"))
+
+# /attendance mode: "compare" (CompareFaces per student), "search" (index once, search detected faces)
+# or "local" (offline embeddings, see LOCAL_FACE_* below).
+ATTENDANCE_MODE            = os.getenv("ATTENDANCE_MODE", "compare")
+REKOGNITION_COLLECTION_ID  = os.getenv("REKOGNITION_COLLECTION_ID", "students")
+ATTENDANCE_CROP_MARGIN     = float(os.getenv("ATTENDANCE_CROP_MARGIN", "0.15"))  # padding around each face box
+
+# /attendance mode "local": offline CPU face detection + embeddings (onnxruntime), no Rekognition calls.
+LOCAL_FACE_DETECTOR_MODEL  = os.path.abspath(os.getenv("LOCAL_FACE_DETECTOR_MODEL", "./models/version-RFB-320.onnx"))  # UltraFace
+LOCAL_FACE_EMBEDDER_MODEL  = os.path.abspath(os.getenv("LOCAL_FACE_EMBEDDER_MODEL", "./models/w600k_mbf.onnx"))        # ArcFace 112x112
+LOCAL_FACE_DETECT_SCORE    = float(os.getenv("LOCAL_FACE_DETECT_SCORE", "0.7"))
+LOCAL_FACE_THRESHOLD       = float(os.getenv("LOCAL_FACE_THRESHOLD", "0.45"))   # cosine similarity for a match
+LOCAL_FACE_THREADS         = int(os.getenv("LOCAL_FACE_THREADS", "0"))          # onnxruntime intra-op threads (0 = auto)
+LOCAL_FACE_GALLERY_PATH    = os.path.abspath(os.getenv("LOCAL_FACE_GALLERY_PATH", "./face_gallery.npz"))
+
 print(f"[config] Working dir: {os.getcwd()}")
 print(f"[config] ChromaDB_DIR: {CHROMA_DB_DIR}")
 print(f"[config] Gemini key loaded: {'YES' if GEMINI_API_KEY else 'NO'}")
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import io
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from PIL import Image, ImageOps
+
+from config import REKOGNITION_COLLECTION_ID, ATTENDANCE_CROP_MARGIN
+from rekognition_client import RekognitionPool
+from app_logging import get_logger
+
+log = get_logger("face_search")
+
+# IndexFaces errors caused by the photo itself; retrying the same bytes cannot succeed
+_UNUSABLE_PHOTO_ERRORS = {"InvalidParameterException", "InvalidImageFormatException", "ImageTooLargeException"}
+
+
+def _external_id(student_name: str, version: str) -> str:
+    """ExternalImageId ([A-Za-z0-9_.\\-:]+) naming the student and photo version."""
+    safe = re.sub(r"[^A-Za-z0-9_.\-]", "_", student_name)[:180]
+    digest = hashlib.sha1(student_name.encode("utf-8")).hexdigest()[:8]
+    return f"{safe}.{digest}:{version}"
+
+
+def crop_faces(image_bytes: bytes, boxes: List[dict], margin: float = ATTENDANCE_CROP_MARGIN) -> List[bytes]:
+    """
+    JPEG crops of each Rekognition BoundingBox (ratios of width/height), padded
+    by `margin` of the box size on every side so the whole face is kept.
+    Boxes refer to the EXIF-orientation-corrected image, so the photo is
+    rotated upright first.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        width, height = img.size
+        crops = []
+        for box in boxes:
+            w, h = box["Width"] * width, box["Height"] * height
+            left = max(0, int(box["Left"] * width - margin * w))
+            top = max(0, int(box["Top"] * height - margin * h))
+            right = min(width, int(box["Left"] * width + w + margin * w))
+            bottom = min(height, int(box["Top"] * height + h + margin * h))
+            if right - left < 2 or bottom - top < 2:
+                continue
+            out = io.BytesIO()
+            img.crop((left, top, right, bottom)).save(out, format="JPEG", quality=90)
+            crops.append(out.getvalue())
+        return crops
+
+
+def class_photos(photos: Dict[str, bytes], roster: Iterable[dict], classgrade: str,
+                 section: Optional[str] = None) -> Dict[str, bytes]:
+    """
+    The reference photos of one class: photos whose name is the student_name or
+    student_id of a roster doc (leaderboard student docs) in classgrade, and in
+    section if given. "10th" matches a class stored as "10th Standard".
+    """
+    grade = classgrade.strip().lower()
+    wanted = section.strip().lower() if section else None
+    members = set()
+    for doc in roster:
+        class_name = str(doc.get("class", "")).strip().lower()
+        if class_name != grade and not class_name.startswith(grade + " "):
+            continue
+        if wanted and str(doc.get("section", "")).strip().lower() != wanted:
+            continue
+        members.update(str(doc.get(key, "")).strip().lower() for key in ("student_name", "student_id"))
+    members.discard("")
+    return {name: img for name, img in photos.items() if name.strip().lower() in members}
+
+
+def merge_matches(per_photo: List[Dict[str, float]], enrolled: Iterable[str]) -> Dict[str, dict]:
+    """
+    Union of several photos of one class: a student is present if matched in
+    any photo, with their best similarity and the photos (0-based) they were in.
+    """
+    merged = {name: {"status": "absent", "similarity": None, "photos": []} for name in enrolled}
+    for index, found in enumerate(per_photo):
+        for name, similarity in found.items():
+            record = merged.get(name)
+            if record is None:
+                continue
+            record["status"] = "present"
+            record["photos"].append(index)
+            if record["similarity"] is None or similarity > record["similarity"]:
+                record["similarity"] = round(float(similarity), 4)
+    return merged
+
+
+class FaceSearchAttendance:
+    """
+    Attendance that scales with the faces in the photo, not the class size.
+
+    Student reference photos are indexed into a Rekognition face collection
+    once (re-indexed only when a photo's version changes). A group photo then
+    costs one DetectFaces plus one SearchFacesByImage per detected face crop.
+    """
+
+    def __init__(self, pool: RekognitionPool, collection_id: str = REKOGNITION_COLLECTION_ID):
+        self.pool = pool
+        self.collection_id = collection_id
+        self._names: Dict[str, str] = {}  # ExternalImageId -> student name
+        self._synced_versions: Dict[str, str] = {}
+        self._unusable: Dict[str, str] = {}  # name -> version of photos Rekognition cannot index
+        self._sync_lock = asyncio.Lock()
+
+    async def ensure_collection(self):
+        try:
+            await self.pool.call("create_collection", CollectionId=self.collection_id)
+            log.info(f"Created collection '{self.collection_id}'")
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ResourceAlreadyExistsException":
+                raise
+
+    async def _indexed_faces(self) -> Dict[str, List[str]]:
+        """{ExternalImageId: [FaceId, ...]} currently in the collection."""
+        faces: Dict[str, List[str]] = {}
+        kwargs = {"CollectionId": self.collection_id, "MaxResults": 4096}
+        while True:
+            resp = await self.pool.call("list_faces", **kwargs)
+            for face in resp.get("Faces", []):
+                faces.setdefault(face.get("ExternalImageId", ""), []).append(face["FaceId"])
+            if not resp.get("NextToken"):
+                return faces
+            kwargs["NextToken"] = resp["NextToken"]
+
+    async def sync(self, photos: Dict[str, bytes], versions: Dict[str, str]) -> dict:
+        """
+        Makes the collection hold exactly one face per current student photo:
+        indexes new/changed photos, deletes faces of removed or replaced ones.
+        A no-op when versions haven't changed since the last sync. Photos with
+        no indexable face are not retried until their version changes.
+        """
+        async with self._sync_lock:
+            if versions == self._synced_versions and self._names:
+                return {"indexed": 0, "deleted": 0, "unchanged": len(versions)}
+            await self.ensure_collection()
+            wanted = {_external_id(name, versions.get(name, "0")): name for name in photos}
+            indexed = await self._indexed_faces()
+
+            stale = [fid for ext, fids in indexed.items() if ext not in wanted for fid in fids]
+            for i in range(0, len(stale), 4096):
+                await self.pool.call("delete_faces", CollectionId=self.collection_id, FaceIds=stale[i:i + 4096])
+
+            async def index(ext: str, name: str) -> str:
+                """"indexed", "unusable" (the photo itself is the problem) or "failed" (worth retrying)."""
+                try:
+                    resp = await self.pool.call(
+                        "index_faces", CollectionId=self.collection_id, Image={"Bytes": photos[name]},
+                        ExternalImageId=ext, MaxFaces=1, QualityFilter="AUTO"
+                    )
+                except ClientError as e:
+                    log.warning(f"Could not index {name}: {e}")
+                    return "unusable" if e.response["Error"]["Code"] in _UNUSABLE_PHOTO_ERRORS else "failed"
+                if not resp.get("FaceRecords"):
+                    log.warning(f"No face found in reference photo of {name}")
+                    return "unusable"
+                return "indexed"
+
+            to_index = [(ext, name) for ext, name in wanted.items()
+                        if ext not in indexed and self._unusable.get(name) != versions.get(name, "0")]
+            results = await asyncio.gather(*(index(ext, name) for ext, name in to_index))
+
+            self._names = wanted
+            outcomes = {name: result for (_, name), result in zip(to_index, results)}
+            self._unusable = {n: v for n, v in self._unusable.items() if n in photos}
+            self._unusable.update({n: versions.get(n, "0") for n, r in outcomes.items() if r == "unusable"})
+            # Only transient failures are retried on the next sync
+            failed = {n for n, r in outcomes.items() if r == "failed"}
+            self._synced_versions = {n: v for n, v in versions.items() if n not in failed}
+            stats = {"indexed": results.count("indexed"), "deleted": len(stale),
+                     "unchanged": len(wanted) - len(to_index), "failed": len(failed),
+                     "unusable": results.count("unusable")}
+            log.info(f"Collection sync: {stats}")
+            return stats
+
+    async def _search(self, crop: bytes, threshold: float) -> List[Tuple[str, float]]:
+        try:
+            resp = await self.pool.call(
+                "search_faces_by_image", CollectionId=self.collection_id, Image={"Bytes": crop},
+                FaceMatchThreshold=threshold, MaxFaces=1
+            )
+        except ClientError as e:
+            # No usable face in the crop (blurred, partial): not a match
+            if e.response["Error"]["Code"] == "InvalidParameterException":
+                return []
+            raise
+        return [(m["Face"].get("ExternalImageId", ""), m["Similarity"]) for m in resp.get("FaceMatches", [])]
+
+    async def match(self, group_bytes: bytes, photos: Dict[str, bytes], threshold: float = 80) -> Dict[str, float]:
+        """{student_name: best similarity} for students of `photos` found in the photo."""
+        resp = await self.pool.call("detect_faces", Image={"Bytes": group_bytes})
+        boxes = [d["BoundingBox"] for d in resp.get("FaceDetails", [])]
+        log.info(f"Detected {len(boxes)} faces")
+        crops = await asyncio.to_thread(crop_faces, group_bytes, boxes)
+        found: Dict[str, float] = {}
+        for matches in await asyncio.gather(*(self._search(crop, threshold) for crop in crops)):
+            for ext, similarity in matches:
+                name = self._names.get(ext)
+                if name in photos and similarity > found.get(name, -1):
+                    found[name] = similarity
+        return found
+
+    async def attendance(self, group_bytes: bytes, photos: Dict[str, bytes], threshold: float = 80) -> Dict[str, str]:
+        """{student_name: "present"/"absent"} for every student of `photos`."""
+        present = await self.match(group_bytes, photos, threshold)
+        return {name: "present" if name in present else "absent" for name in photos}
+
+
+class CompareFacesAttendance:
+    """
+    The original attendance: one CompareFaces(student photo, group photo) per
+    enrolled student. Same sync()/match()/attendance() contract as the other
+    engines; nothing is indexed, so sync() has nothing to do and the reference
+    photos come with each match() (the engine is shared by concurrent requests).
+    """
+
+    def __init__(self, pool: RekognitionPool):
+        self.pool = pool
+
+    async def sync(self, photos: Dict[str, bytes], versions: Dict[str, str]) -> dict:
+        return {"students": len(photos)}
+
+    async def _compare(self, name: str, student_img: bytes, group_bytes: bytes, threshold: float):
+        log.debug(f"Comparing {name}")
+        try:
+            result = await self.pool.compare_faces(student_img, group_bytes, threshold)
+        except Exception as e:
+            log.warning(f"{name}: error → {e}")
+            return name, None
+        best = max((m["Similarity"] for m in result["FaceMatches"]), default=None)
+        log.debug(f"{name}: {'present' if best is not None else 'absent'}")
+        return name, best
+
+    async def match(self, group_bytes: bytes, photos: Dict[str, bytes], threshold: float = 80) -> Dict[str, float]:
+        """{student_name: best similarity} for students of `photos` found in the photo."""
+        results = await asyncio.gather(
+            *(self._compare(name, img, group_bytes, threshold) for name, img in photos.items())
+        )
+        return {name: best for name, best in results if best is not None}
+
+    async def attendance(self, group_bytes: bytes, photos: Dict[str, bytes], threshold: float = 80) -> Dict[str, str]:
+        """{student_name: "present"/"absent"} for every student of `photos`."""
+        present = await self.match(group_bytes, photos, threshold)
+        return {name: "present" if name in present else "absent" for name in photos}
@@ -0,0 +1,258 @@
+"""
+Local stand-in for the Rekognition JSON API, for benchmarks.
+
+Serves POST / with an `X-Amz-Target: RekognitionService.<Operation>` header over
+HTTP/1.1 keep-alive, sleeping `latency` seconds per call, and counts requests and
+TCP connections so connection reuse is visible.
+
+Faces are solid-colour squares on a white background (make_face/make_group);
+a face's colour is its identity. DetectFaces finds the squares, and CompareFaces,
+IndexFaces and SearchFacesByImage match by colour, so crops and face collections
+behave like the real service without any model.
+"""
+import base64
+import io
+import json
+import math
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+FACE_SIZE = 64
+_LEVELS = 16           # 16**3 distinct face colours
+_COLOR_TOLERANCE = 6   # max per-channel distance for a match (JPEG noise)
+
+
+def face_color(i: int) -> tuple:
+    return tuple(16 + ((i // _LEVELS ** k) % _LEVELS) * 14 for k in range(3))
+
+
+def _png(img: Image.Image) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def make_face(i: int) -> bytes:
+    """Reference photo of student i: their face square with a white border."""
+    img = Image.new("RGB", (FACE_SIZE * 2, FACE_SIZE * 2), "white")
+    img.paste(face_color(i), (FACE_SIZE // 2, FACE_SIZE // 2, FACE_SIZE * 3 // 2, FACE_SIZE * 3 // 2))
+    return _png(img)
+
+
+def make_group(indexes) -> bytes:
+    """Group photo with the faces of the given students laid out in a grid."""
+    indexes = list(indexes)
+    cols = max(1, math.ceil(math.sqrt(len(indexes))))
+    rows = max(1, math.ceil(len(indexes) / cols))
+    cell = FACE_SIZE * 3 // 2
+    img = Image.new("RGB", (cols * cell + FACE_SIZE // 2, rows * cell + FACE_SIZE // 2), "white")
+    for n, i in enumerate(indexes):
+        x, y = FACE_SIZE // 2 + (n % cols) * cell, FACE_SIZE // 2 + (n // cols) * cell
+        img.paste(face_color(i), (x, y, x + FACE_SIZE, y + FACE_SIZE))
+    return _png(img)
+
+
+class RekognitionError(Exception):
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(message)
+        self.code = code
+
+
+def _decode(image: dict) -> np.ndarray:
+    try:
+        with Image.open(io.BytesIO(base64.b64decode(image["Bytes"]))) as img:
+            return np.asarray(img.convert("RGB"), dtype=np.int16)
+    except (OSError, ValueError):
+        raise RekognitionError("InvalidImageFormatException", "Request has invalid image format")
+
+
+def _runs(flags: np.ndarray) -> list:
+    """[start, end) of each run of True values."""
+    padded = np.concatenate(([False], flags, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def detect_squares(pixels: np.ndarray) -> list:
+    """(top, bottom, left, right, colour) of every face square (grid layouts only)."""
+    face = (pixels < 235).any(axis=2)
+    faces = []
+    for top, bottom in _runs(face.any(axis=1)):
+        for left, right in _runs(face[top:bottom].any(axis=0)):
+            if min(bottom - top, right - left) < 8:
+                continue
+            cy, cx = (top + bottom) // 2, (left + right) // 2
+            color = np.median(pixels[cy - 2:cy + 3, cx - 2:cx + 3].reshape(-1, 3), axis=0)
+            faces.append((top, bottom, left, right, tuple(int(c) for c in color)))
+    return faces
+
+
+def _same_face(a: tuple, b: tuple) -> bool:
+    return max(abs(x - y) for x, y in zip(a, b)) <= _COLOR_TOLERANCE
+
+
+class FakeRekognitionServer:
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.collections = {}  # collection id -> {face id: (external image id, colour)}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "FakeRekognitionServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = self.connections = self.max_in_flight = 0
+
+    # --- operations -------------------------------------------------------
+
+    def compare_faces(self, body: dict) -> dict:
+        sources = detect_squares(_decode(body["SourceImage"]))
+        if not sources:
+            raise RekognitionError("InvalidParameterException", "No face in source image")
+        targets = detect_squares(_decode(body["TargetImage"]))
+        matched = [t for t in targets if _same_face(sources[0][4], t[4])]
+        return {
+            "FaceMatches": [{"Similarity": 99.0, "Face": {"Confidence": 99.9}} for _ in matched],
+            "UnmatchedFaces": [{"Confidence": 99.0} for t in targets if t not in matched],
+        }
+
+    def detect_faces(self, body: dict) -> dict:
+        pixels = _decode(body["Image"])
+        height, width = pixels.shape[:2]
+        return {"FaceDetails": [
+            {"BoundingBox": {"Left": left / width, "Top": top / height,
+                             "Width": (right - left) / width, "Height": (bottom - top) / height},
+             "Confidence": 99.9}
+            for top, bottom, left, right, _ in detect_squares(pixels)
+        ]}
+
+    def _collection(self, body: dict) -> dict:
+        faces = self.collections.get(body["CollectionId"])
+        if faces is None:
+            raise RekognitionError("ResourceNotFoundException", body["CollectionId"])
+        return faces
+
+    def create_collection(self, body: dict) -> dict:
+        with self._lock:
+            if body["CollectionId"] in self.collections:
+                raise RekognitionError("ResourceAlreadyExistsException", body["CollectionId"])
+            self.collections[body["CollectionId"]] = {}
+        return {"StatusCode": 200, "FaceModelVersion": "fake"}
+
+    def index_faces(self, body: dict) -> dict:
+        faces = self._collection(body)
+        detected = detect_squares(_decode(body["Image"]))[:body.get("MaxFaces", 100)]
+        records = []
+        with self._lock:
+            for *_, color in detected:
+                face_id = str(uuid.uuid4())
+                faces[face_id] = (body.get("ExternalImageId", ""), color)
+                records.append({"Face": {"FaceId": face_id, "ExternalImageId": body.get("ExternalImageId", "")}})
+        return {"FaceRecords": records, "UnindexedFaces": []}
+
+    def list_faces(self, body: dict) -> dict:
+        with self._lock:
+            faces = list(self._collection(body).items())
+        start = int(body.get("NextToken") or 0)
+        end = start + body.get("MaxResults", 1000)
+        result = {"Faces": [{"FaceId": fid, "ExternalImageId": ext} for fid, (ext, _) in faces[start:end]]}
+        if end < len(faces):
+            result["NextToken"] = str(end)
+        return result
+
+    def delete_faces(self, body: dict) -> dict:
+        faces = self._collection(body)
+        with self._lock:
+            deleted = [fid for fid in body["FaceIds"] if faces.pop(fid, None) is not None]
+        return {"DeletedFaces": deleted}
+
+    def search_faces_by_image(self, body: dict) -> dict:
+        faces = self._collection(body)
+        detected = detect_squares(_decode(body["Image"]))
+        if not detected:
+            raise RekognitionError("InvalidParameterException", "There are no faces in the image")
+        # Like the real API, only the largest face in the image is searched
+        top, bottom, left, right, color = max(detected, key=lambda f: (f[1] - f[0]) * (f[3] - f[2]))
+        with self._lock:
+            matches = [
+                {"Similarity": 99.0, "Face": {"FaceId": fid, "ExternalImageId": ext, "Confidence": 99.9}}
+                for fid, (ext, c) in faces.items() if _same_face(color, c)
+            ]
+        return {"FaceMatches": matches[:body.get("MaxFaces", 1)], "SearchedFaceConfidence": 99.9}
+
+    def handle(self, operation: str, body: dict) -> dict:
+        handler = getattr(self, _snake(operation), None)
+        if handler is None:
+            raise NotImplementedError(operation)
+        return handler(body)
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                operation = self.headers.get("X-Amz-Target", "").rsplit(".", 1)[-1]
+                with fake._lock:
+                    fake.requests += 1
+                    fake._in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                try:
+                    time.sleep(fake.latency)
+                    try:
+                        status, result = 200, fake.handle(operation, body)
+                    except NotImplementedError:
+                        status, result = 400, {"__type": "UnknownOperationException", "message": operation}
+                    except RekognitionError as e:
+                        status, result = 400, {"__type": e.code, "message": str(e)}
+                    except KeyError as e:
+                        status, result = 400, {"__type": "InvalidParameterException", "message": str(e)}
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+                payload = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _snake(name: str) -> str:
+    return "".join(f"_{c.lower()}" if c.isupper() else c for c in name).lstrip("_")
@@ -1,28 +1,111 @@
 from google.cloud import firestore
+import copy
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import logging
+from config import QUESTION_PAPER_CACHE_TTL, QUESTION_PAPER_CACHE_SIZE
+import clients
+import metrics
+from app_logging import get_logger
 
-# Optionally, set this if you're not setting it in your environment:
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "sahayak-d88d3-2e1f13a7b2bc.json"
+# Shared Firestore client, built on first use (credentials: config.GOOGLE_CREDENTIALS_FILE)
+client = clients.firestore_db
+log = get_logger("firestore")
 
-client = firestore.Client()
+# Read-through cache for question paper docs: a paper is written once and then
+# read for every sheet graded against it. doc_id -> (loaded_at, doc)
+_question_paper_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_question_paper_cache_lock = threading.Lock()
 
-def _get_next_doc_id(base_name: str, collection_ref) -> str:
-    """
-    Finds the next available document ID in the format 'base_name-1', 'base_name-2', etc.
-    """
-    existing_ids = [doc.id for doc in collection_ref.stream() if doc.id.startswith(base_name + "-")]
+def _cache_question_paper(doc_id: str, doc: dict):
+    with _question_paper_cache_lock:
+        _question_paper_cache[doc_id] = (time.monotonic(), copy.deepcopy(doc))
+        _question_paper_cache.move_to_end(doc_id)
+        while len(_question_paper_cache) > QUESTION_PAPER_CACHE_SIZE:
+            _question_paper_cache.popitem(last=False)
+
+def _cached_question_paper(doc_id: str) -> Optional[dict]:
+    with _question_paper_cache_lock:
+        entry = _question_paper_cache.get(doc_id)
+        if entry is None:
+            return None
+        loaded_at, doc = entry
+        if time.monotonic() - loaded_at > QUESTION_PAPER_CACHE_TTL:
+            del _question_paper_cache[doc_id]
+            return None
+        _question_paper_cache.move_to_end(doc_id)
+    # Callers may mutate what they get back
+    return copy.deepcopy(doc)
+
+def invalidate_question_paper(doc_id: Optional[str] = None):
+    """Drops one cached question paper (or all of them)."""
+    with _question_paper_cache_lock:
+        if doc_id is None:
+            _question_paper_cache.clear()
+        else:
+            _question_paper_cache.pop(doc_id, None)
+
+# Doc ID counters live in their own collection: counters/<collection>-<base_name> = {"last": N}
+COUNTERS_COLLECTION = "counters"
+
+def _counter_ref(base_name: str, collection_ref):
+    return client.collection(COUNTERS_COLLECTION).document(f"{collection_ref.id}-{base_name}")
+
+def _scan_max_index(base_name: str, collection_ref) -> int:
+    """Highest N among existing 'base_name-N' ids (ids only, no document bodies)."""
     max_index = 0
-    for doc_id in existing_ids:
+    for doc in collection_ref.select([]).stream():
+        if not doc.id.startswith(base_name + "-"):
+            continue
         try:
-            suffix = int(doc_id.split("-")[-1])
-            max_index = max(max_index, suffix)
+            max_index = max(max_index, int(doc.id.split("-")[-1]))
         except ValueError:
             continue
-    return f"{base_name}-{max_index + 1}"
+    return max_index
+
+@firestore.transactional
+def _raise_counter_to(transaction, counter_ref, floor: int) -> int:
+    snapshot = counter_ref.get(transaction=transaction)
+    last = max(floor, snapshot.get("last") if snapshot.exists else 0)
+    transaction.set(counter_ref, {"last": last, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    return last
+
+def seed_doc_id_counter(base_name: str, collection_ref) -> int:
+    """
+    Migration: seeds (or raises) the counter from the ids already in the collection.
+    Safe to re-run; the counter never goes down.
+    """
+    floor = _scan_max_index(base_name, collection_ref)
+    last = _raise_counter_to(client.transaction(), _counter_ref(base_name, collection_ref), floor)
+    log.info(f"Seeded counter for '{collection_ref.id}/{base_name}' at {last}")
+    return last
+
+@firestore.transactional
+def _increment_counter(transaction, counter_ref) -> Optional[int]:
+    snapshot = counter_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    next_index = snapshot.get("last") + 1
+    transaction.update(counter_ref, {"last": next_index, "updated_at": firestore.SERVER_TIMESTAMP})
+    return next_index
+
+def _get_next_doc_id(base_name: str, collection_ref) -> str:
+    """
+    Allocates the next document ID in the format 'base_name-1', 'base_name-2', etc.
+    from a transactional counter doc, so concurrent callers never get the same id.
+    """
+    counter_ref = _counter_ref(base_name, collection_ref)
+    next_index = _increment_counter(client.transaction(), counter_ref)
+    if next_index is None:
+        # First use (migration not run yet): seed from existing ids once, then allocate
+        seed_doc_id_counter(base_name, collection_ref)
+        next_index = _increment_counter(client.transaction(), counter_ref)
+    return f"{base_name}-{next_index}"
 
 def store_question_paper(response: dict) -> str:
     """
@@ -37,18 +120,28 @@ def store_question_paper(response: dict) -> str:
     if "question_paper" in firestore_doc:
         firestore_doc["question_paper"]["id"] = doc_id
 
-    collection_ref.document(doc_id).set(firestore_doc)
-    print(f"[firestore] Stored question paper: {doc_id}")
+    # create() rather than set(): never overwrite a paper if an id is ever reused
+    with metrics.timed("firestore_write", "questionpaper"):
+        collection_ref.document(doc_id).create(firestore_doc)
+    _cache_question_paper(doc_id, firestore_doc)
+    log.info(f"Stored question paper: {doc_id}")
     return doc_id
 
 def get_question_paper(doc_id: str) -> dict:
     """
-    Fetch a specific question paper by its document ID.
+    Fetch a specific question paper by its document ID (read-through cached).
     """
+    cached = _cached_question_paper(doc_id)
+    if cached is not None:
+        log.info(f"Question paper cache hit: {doc_id}")
+        return cached
     collection_ref = client.collection("questionpaper")
-    doc = collection_ref.document(doc_id).get()
+    with metrics.timed("firestore_read", "questionpaper"):
+        doc = collection_ref.document(doc_id).get()
     if doc.exists:
-        return doc.to_dict()
+        data = doc.to_dict()
+        _cache_question_paper(doc_id, data)
+        return data
     else:
         raise ValueError(f"Document with ID '{doc_id}' not found.")
     """
@@ -63,16 +156,49 @@ def get_question_paper(doc_id: str) -> dict:
     doc_ref = client.collection("questionpaper").document(doc_id)
     doc = doc_ref.get()
     if doc.exists:
-        print(f"[firestore] Loaded question paper: {doc_id}")
+        log.info(f"Loaded question paper: {doc_id}")
         return doc.to_dict()
     else:
-        print(f"[firestore] No document found for ID: {doc_id}")
+        log.info(f"No document found for ID: {doc_id}")
         return None
 
+def list_question_paper_ids(limit: Optional[int] = None, start_after: Optional[str] = None):
+    """
+    Question paper ids ordered by id: all of them, or one page of `limit`.
+    Ids-only projection, so no question bodies are read.
+    Returns (ids, next_start_after or None).
+    """
+    collection_ref = client.collection("questionpaper")
+    doc_id_field = firestore.FieldPath.document_id()
+    query = collection_ref.select([]).order_by(doc_id_field)
+    if limit is not None:
+        query = query.limit(limit)
+    if start_after:
+        query = query.start_after({doc_id_field: collection_ref.document(start_after)})
+    with metrics.timed("firestore_read", "questionpaper"):
+        ids = [doc.id for doc in query.stream()]
+    next_start_after = ids[-1] if limit is not None and len(ids) == limit else None
+    return ids, next_start_after
+
+def studentmarks_refs(response: dict):
+    """
+    Where a correction response is stored:
+      studentmarks/studentid-<id>                          latest result (what get_studentmarks reads)
+      studentmarks/studentid-<id>/assignments/<assignment>  one doc per assignment (history)
+    """
+    studentid = str(response.get("studentid") or "")
+    if not studentid:
+        raise ValueError("Response must include 'studentid'")
+    latest_ref = client.collection("studentmarks").document("studentid-" + studentid)
+    assignmentid = str(response.get("assignmentid") or "unassigned").replace("/", "_")
+    history_ref = latest_ref.collection("assignments").document(assignmentid)
+    return latest_ref, history_ref
+
 def store_studentmarks(response: dict) -> str:
     """
     Stores the answer correction response in Firestore collection 'studentmarks'.
-    Uses studentid as Firestore document ID.
+    Uses studentid as Firestore document ID, and keeps per-assignment history
+    under its 'assignments' subcollection.
 
     Args:
         response (dict): The full correction API response.
@@ -80,26 +206,93 @@ def store_studentmarks(response: dict) -> str:
     Returns:
         str: Firestore document ID
     """
-    collection_ref = client.collection("studentmarks")
-    studentid = str(response.get("studentid"))
-    if not studentid:
-        raise ValueError("Response must include 'studentid'")
-    doc_id = "studentid-"+studentid  
-
+    latest_ref, history_ref = studentmarks_refs(response)
     firestore_doc = dict(response)
-    collection_ref.document(doc_id).set(firestore_doc)
-    print(f"[firestore] Stored student marks for: {doc_id}")
-    return doc_id
+    batch = client.batch()
+    batch.set(history_ref, firestore_doc)
+    batch.set(latest_ref, firestore_doc)
+    with metrics.timed("firestore_write", "studentmarks"):
+        batch.commit()
+    log.info(f"Stored student marks for: {latest_ref.id}")
+    return latest_ref.id
+
+
+def store_studentmarks_batch(responses: List[dict], batch_size: int = 250) -> List[str]:
+    """
+    Stores many correction responses with Firestore batched writes. Each response
+    is two writes (latest + history) and Firestore caps a batch at 500 writes.
+    """
+    doc_ids = []
+    for i in range(0, len(responses), batch_size):
+        batch = client.batch()
+        for response in responses[i:i + batch_size]:
+            latest_ref, history_ref = studentmarks_refs(response)
+            batch.set(history_ref, dict(response))
+            batch.set(latest_ref, dict(response))
+            doc_ids.append(latest_ref.id)
+        with metrics.timed("firestore_write", "studentmarks"):
+            batch.commit()
+    log.info(f"Stored student marks for {len(doc_ids)} students in batched writes")
+    return doc_ids
 
+def attendance_doc_id(classgrade: str, date: str, section: Optional[str] = None) -> str:
+    parts = [classgrade, section, date] if section else [classgrade, date]
+    return "__".join(str(p).replace("/", "_") for p in parts)
+
+def store_attendance_session(classgrade: str, date: str, students: Dict[str, dict],
+                             section: Optional[str] = None, meta: Optional[dict] = None,
+                             batch_size: int = 500) -> str:
+    """
+    Stores one attendance session: a summary doc attendance/<class>[__<section>]__<date>
+    and one doc per student in its 'students' subcollection, with batched writes
+    (the summary goes in the first batch). Re-running a session for the same
+    class and date overwrites it: student docs of an earlier run that are not in
+    `students` are deleted in the same batches.
+    """
+    doc_id = attendance_doc_id(classgrade, date, section)
+    session_ref = client.collection("attendance").document(doc_id)
+    students_ref = session_ref.collection("students")
+    student_ids = {name.replace("/", "_") for name in students}
+    with metrics.timed("firestore_read", "attendance"):
+        leftover = [doc.id for doc in students_ref.select([]).stream() if doc.id not in student_ids]
+    present = sum(1 for s in students.values() if s["status"] == "present")
+    writes = [(session_ref, {
+        **(meta or {}),
+        "classgrade": classgrade,
+        "section": section,
+        "date": date,
+        "total": len(students),
+        "present_count": present,
+        "absent_count": len(students) - present,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    })]
+    writes += [
+        (students_ref.document(name.replace("/", "_")), {"student_name": name, "date": date, **record})
+        for name, record in students.items()
+    ]
+    writes += [(students_ref.document(student_id), None) for student_id in leftover]  # None: delete
+    for i in range(0, len(writes), batch_size):
+        batch = client.batch()
+        for ref, data in writes[i:i + batch_size]:
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        with metrics.timed("firestore_write", "attendance"):
+            batch.commit()
+    log.info(f"Stored attendance {doc_id}: {present}/{len(students)} present in {len(writes)} writes"
+             + (f", {len(leftover)} stale students removed" if leftover else ""))
+    return doc_id
 
 def get_studentmarks(studentid: str) -> dict:
     doc_ref = client.collection("studentmarks").document(studentid)
-    doc = doc_ref.get()
+    with metrics.timed("firestore_read", "studentmarks"):
+        doc = doc_ref.get()
     if doc.exists:
-        print(f"[firestore] Loaded student marks: {studentid}")
+        log.info(f"Loaded student marks: {studentid}")
         return doc.to_dict()
     else:
-        print(f"[firestore] No document found for ID: {studentid}")
+        log.info(f"No document found for ID: {studentid}")
         return None
 
 
@@ -125,5 +318,5 @@ def get_studentmarks(studentid: str) -> dict:
 
     firestore_doc = dict(response)
     collection_ref.document(doc_id).set(firestore_doc)
-    print(f"[firestore] Stored student marks for: {doc_id}")
+    log.info(f"Stored student marks for: {doc_id}")
     return doc_id
@@ -0,0 +1,63 @@
+import asyncio
+from typing import List
+
+from ansheetcorrection import (
+    run_ocr_concurrent_internal,
+    merge_ocr_results,
+    correct_answers_single_rag
+)
+from firestore11 import get_question_paper, store_studentmarks
+from marks_writer import marks_writer
+from image_preprocess import preprocess_image_async
+from ocr import process_image
+from config import OCR_PREPROCESS, GRADING_RAG_MODE, MARKS_WRITE_BEHIND
+
+
+async def grade_answersheet(
+    raw_images: List[bytes],
+    studentid: str,
+    questionpaperdocfromfiretore: str,
+    subject: str,
+    assignmentid: str,
+    classgrade: str,
+    chromadbcollectionname: str,
+    correctiontype: str,
+    ragmode: str = GRADING_RAG_MODE,
+    write_behind: bool = MARKS_WRITE_BEHIND,
+) -> dict:
+    """
+    OCR -> merge -> grade -> store for one student's answer sheet.
+    Shared by /correct_answersheet and the queued grading workers.
+    Raises ValueError if the question paper doesn't exist. With write_behind the
+    marks are buffered and committed in the background (see marks_writer).
+    """
+    # Pages are shrunk, then OCR'd concurrently on a bounded pool; results keep page order
+    ocr_results = await run_ocr_concurrent_internal(
+        raw_images, process_image,
+        preprocess_func=preprocess_image_async if OCR_PREPROCESS else None
+    )
+    merged_answers = merge_ocr_results(ocr_results)
+    qp_doc = await asyncio.to_thread(get_question_paper, questionpaperdocfromfiretore)
+    if not qp_doc:
+        raise ValueError(f"No question paper found with ID: {questionpaperdocfromfiretore}")
+    total, details = await asyncio.to_thread(
+        correct_answers_single_rag,
+        merged_answers, qp_doc, chromadbcollectionname,
+        correctiontype=correctiontype, rag_mode=ragmode
+    )
+    resp = {
+        "totalmarks": total,
+        "eachquestion_marks": details,
+        "studentid": studentid,
+        "questionpaperdocfromfiretore": questionpaperdocfromfiretore,
+        "subject": subject,
+        "assignmentid": assignmentid,
+        "classgrade": classgrade,
+    }
+    if write_behind:
+        # A full queue would block in put(); wait for room off the event loop instead
+        if not marks_writer.try_enqueue(resp):
+            await asyncio.to_thread(marks_writer.enqueue, resp)
+    else:
+        await asyncio.to_thread(store_studentmarks, resp)
+    return resp
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from uuid import uuid4
+from config import GRADING_QUEUE_PATH, GRADING_SPOOL_DIR, GRADING_JOB_LEASE_S, GRADING_JOB_MAX_ATTEMPTS
+from app_logging import get_logger
+
+log = get_logger("grading_queue")
+
+
+class GradingQueue:
+    """
+    Durable local queue of answer-sheet grading jobs.
+
+    Jobs live in SQLite; uploaded pages are spooled to GRADING_SPOOL_DIR/<job_id>/.
+    Workers claim jobs with a lease, so a job held by a crashed worker becomes
+    claimable again once the lease expires. Idempotency keys map retried
+    submissions onto the original job.
+    """
+
+    def __init__(self, path: str = GRADING_QUEUE_PATH, spool_dir: str = GRADING_SPOOL_DIR,
+                 lease_s: float = GRADING_JOB_LEASE_S, max_attempts: int = GRADING_JOB_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        os.makedirs(spool_dir, exist_ok=True)
+        self.path = path
+        self.spool_dir = spool_dir
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grading_jobs ("
+                " id TEXT PRIMARY KEY,"
+                " idempotency_key TEXT UNIQUE,"
+                " status TEXT NOT NULL,"            # queued | running | done | failed
+                " payload TEXT NOT NULL,"
+                " image_paths TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " lease_expires_at REAL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS grading_jobs_status ON grading_jobs(status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row) -> dict:
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "payload": json.loads(row["payload"]),
+            "image_paths": json.loads(row["image_paths"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def submit(self, payload: dict, images: List[bytes],
+               idempotency_key: Optional[str] = None) -> Tuple[dict, bool]:
+        """Enqueues a job. Returns (job, created); created is False for a repeated idempotency key."""
+        if idempotency_key:
+            existing = self.get_by_idempotency_key(idempotency_key)
+            if existing:
+                return existing, False
+
+        job_id = str(uuid4())
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir)
+        image_paths = []
+        for idx, img in enumerate(images):
+            path = os.path.join(job_dir, f"page-{idx:03d}")
+            with open(path, "wb") as f:
+                f.write(img)
+            image_paths.append(path)
+
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO grading_jobs (id, idempotency_key, status, payload, image_paths, created_at, updated_at)"
+                    " VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                    (job_id, idempotency_key, json.dumps(payload), json.dumps(image_paths), now, now),
+                )
+        except sqlite3.IntegrityError:
+            # Lost a race with a concurrent submit using the same key
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return self.get_by_idempotency_key(idempotency_key), False
+        log.info(f"Queued job {job_id} ({len(images)} pages)")
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM grading_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get_by_idempotency_key(self, key: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM grading_jobs WHERE idempotency_key = ?", (key,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """
+        Atomically takes the oldest queued (or lease-expired) job. A lease-expired
+        job that has used up its attempts (its worker crashed or hung every time)
+        is marked failed instead of being run again.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exhausted = [r["id"] for r in conn.execute(
+                    "UPDATE grading_jobs SET status = 'failed', error = ?, worker = NULL, lease_expires_at = NULL,"
+                    " updated_at = ? WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?"
+                    " RETURNING id",
+                    (f"lease expired after {self.max_attempts} attempts", now, now, self.max_attempts),
+                ).fetchall()]
+                row = conn.execute(
+                    "SELECT id FROM grading_jobs"
+                    " WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE grading_jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                        " lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                        (worker, now + self.lease_s, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for job_id in exhausted:
+            log.warning(f"Job {job_id} failed: lease expired after {self.max_attempts} attempts")
+            self._drop_spool(job_id)
+        return self.get(row["id"]) if row is not None else None
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extends the lease of a running job; False if another worker has taken it over."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE grading_jobs SET lease_expires_at = ?, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_s, time.time(), job_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        """Stores the result; False (nothing written) if another worker has taken the job over."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE grading_jobs SET status = 'done', result = ?, error = NULL, lease_expires_at = NULL,"
+                " updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id, worker),
+            )
+        if cur.rowcount != 1:
+            return False
+        self._drop_spool(job_id)
+        return True
+
+    def fail(self, job_id: str, worker: str, error: str, retry: bool = True) -> bool:
+        """
+        Requeues the job while attempts remain (and retry is True), else marks it
+        failed. False (nothing written) if another worker has taken the job over.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE grading_jobs"
+                " SET status = CASE WHEN ? OR attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = ?, lease_expires_at = NULL, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running' RETURNING status",
+                (not retry, self.max_attempts, error, time.time(), job_id, worker),
+            ).fetchone()
+        if row is None:
+            return False
+        if row["status"] == "failed":
+            self._drop_spool(job_id)
+        return True
+
+    def depth(self) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM grading_jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _drop_spool(self, job_id: str):
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
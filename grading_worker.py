@@ -0,0 +1,148 @@
+"""
+Grading worker: drains the durable grading queue filled by POST /grading_jobs.
+
+    python grading_worker.py --processes 2 --concurrency 2
+
+Each process runs up to --concurrency jobs at once and keeps their leases alive
+while they run; jobs whose worker dies are picked up again after the lease expires.
+With --metrics-port, process i serves its stage latencies on <port + i>/metrics.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+
+from config import (
+    GRADING_WORKER_PROCESSES, GRADING_WORKER_CONCURRENCY, GRADING_JOB_LEASE_S, GRADING_WORKER_METRICS_PORT
+)
+import app_logging
+
+log = app_logging.get_logger("grading_worker")
+
+POLL_INTERVAL_S = 1.0
+
+
+async def _heartbeat(queue, job_id: str, worker: str, job_task: asyncio.Task):
+    """Renews the lease; once it is lost the job belongs to another worker, so job_task is cancelled."""
+    while True:
+        await asyncio.sleep(max(1.0, GRADING_JOB_LEASE_S / 3))
+        if not await asyncio.to_thread(queue.renew, job_id, worker):
+            log.warning(f"{worker}: lost lease on {job_id}, cancelling it")
+            job_task.cancel()
+            return
+
+
+async def _run_job(queue, job: dict, worker: str):
+    from grading_pipeline import grade_answersheet
+
+    job_id = job["job_id"]
+    log.info(f"{worker}: running {job_id} (attempt {job['attempts']})")
+    heartbeat = asyncio.create_task(_heartbeat(queue, job_id, worker, asyncio.current_task()))
+    try:
+        images = []
+        for path in job["image_paths"]:
+            with open(path, "rb") as f:
+                images.append(f.read())
+        # Write marks before the job is marked done, so a crash can't lose them
+        result = await grade_answersheet(images, write_behind=False, **job["payload"])
+    except ValueError as e:
+        # Bad input (e.g. unknown question paper): retrying won't help
+        await asyncio.to_thread(queue.fail, job_id, worker, str(e), False)
+        log.warning(f"{worker}: {job_id} failed: {e}")
+        return
+    except Exception as e:
+        await asyncio.to_thread(queue.fail, job_id, worker, str(e), True)
+        log.warning(f"{worker}: {job_id} error, will retry if attempts remain: {e}")
+        return
+    finally:
+        heartbeat.cancel()
+    if not await asyncio.to_thread(queue.complete, job_id, worker, result):
+        log.warning(f"{worker}: {job_id} was taken over by another worker, result dropped")
+        return
+    log.info(f"{worker}: {job_id} done ({result['totalmarks']})")
+
+
+async def _worker_loop(concurrency: int, stop: asyncio.Event):
+    import metrics
+    from grading_queue import GradingQueue
+
+    # Job tasks copy this context, so their stages are labeled endpoint="grading_worker"
+    metrics.current_endpoint.set("grading_worker")
+
+    queue = GradingQueue()
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    running = set()
+    log.info(f"{worker}: started (concurrency={concurrency})")
+    while not stop.is_set():
+        if len(running) >= concurrency:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        job = await asyncio.to_thread(queue.claim, worker)
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = asyncio.create_task(_run_job(queue, job, worker))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        log.info(f"{worker}: finishing {len(running)} in-flight jobs")
+        await asyncio.gather(*running, return_exceptions=True)
+    log.info(f"{worker}: stopped")
+
+
+def _process_main(concurrency: int, metrics_port: int = 0):
+    if metrics_port:
+        import metrics
+        metrics.serve(metrics_port)
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await _worker_loop(concurrency, stop)
+
+    try:
+        asyncio.run(main())
+    finally:
+        # Worker processes exit without running atexit hooks
+        app_logging.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=GRADING_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=GRADING_WORKER_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=GRADING_WORKER_METRICS_PORT,
+                        help="process i serves /metrics on this port + i (0 = off)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(args.concurrency, args.metrics_port)
+        return
+
+    procs = [
+        multiprocessing.Process(target=_process_main, name=f"grading-worker-{i}",
+                                args=(args.concurrency, args.metrics_port + i if args.metrics_port else 0))
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from config import OCR_TARGET_DPI, OCR_JPEG_QUALITY, OCR_PREPROCESS_WORKERS
+from app_logging import get_logger
+
+# Answer sheets are A4. Phone photos carry no meaningful DPI, so the target
+# pixel size is the A4 page at OCR_TARGET_DPI.
+_A4_INCHES = (8.27, 11.69)
+
+_pool = None
+log = get_logger("image_preprocess")
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        log.info(f"Starting process pool ({OCR_PREPROCESS_WORKERS} workers)")
+        _pool = ProcessPoolExecutor(max_workers=OCR_PREPROCESS_WORKERS)
+    return _pool
+
+def preprocess_image(byte_array: bytes, target_dpi: int = OCR_TARGET_DPI,
+                     quality: int = OCR_JPEG_QUALITY) -> bytes:
+    """
+    EXIF-rotate, grayscale, downscale to an A4 page at target_dpi and re-encode as JPEG.
+    Returns the original bytes if the image can't be decoded or would not get smaller.
+    """
+    max_short = int(_A4_INCHES[0] * target_dpi)
+    max_long = int(_A4_INCHES[1] * target_dpi)
+    try:
+        with Image.open(io.BytesIO(byte_array)) as img:
+            # Let the JPEG decoder skip detail we'd throw away anyway (DCT scaling)
+            img.draft("L", (max_long, max_long))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("L")
+            w, h = img.size
+            scale = min(1.0, max_long / max(w, h), max_short / min(w, h))
+            if scale < 1.0:
+                img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        log.warning(f"Skipping preprocessing: {e}")
+        return byte_array
+
+    processed = out.getvalue()
+    if len(processed) >= len(byte_array):
+        return byte_array
+    return processed
+
+async def preprocess_image_async(byte_array: bytes) -> bytes:
+    """Runs preprocess_image in the process pool (Pillow decode/resize is CPU-bound)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), preprocess_image, byte_array)
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,204 @@
+"""
+Minimal in-memory stand-in for google.cloud.firestore.Client, for load tests and
+local runs without credentials. Covers what the leaderboard code uses:
+collection/document get/set/update/delete, subcollections, stream with
+select/order_by/start_after/limit, batch() and bulk_writer().
+"""
+import copy
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class DocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[dict], reference=None):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class DocumentReference:
+    def __init__(self, store: "InMemoryFirestore", collection_id: str, doc_id: str):
+        self._store = store
+        self.id = doc_id
+        self.parent_id = collection_id
+
+    def get(self, **_) -> DocumentSnapshot:
+        with self._store._lock:
+            data = self._store._collections.get(self.parent_id, {}).get(self.id)
+            return DocumentSnapshot(self.id, copy.deepcopy(data), self)
+
+    def set(self, data: dict, merge: bool = False):
+        with self._store._lock:
+            docs = self._store._collections.setdefault(self.parent_id, {})
+            if merge and self.id in docs:
+                docs[self.id].update(copy.deepcopy(data))
+            else:
+                docs[self.id] = copy.deepcopy(data)
+
+    def create(self, data: dict):
+        with self._store._lock:
+            docs = self._store._collections.setdefault(self.parent_id, {})
+            if self.id in docs:
+                raise ValueError(f"Document already exists: {self.parent_id}/{self.id}")
+            docs[self.id] = copy.deepcopy(data)
+
+    def update(self, data: dict):
+        with self._store._lock:
+            docs = self._store._collections.get(self.parent_id, {})
+            if self.id not in docs:
+                raise KeyError(f"No document to update: {self.parent_id}/{self.id}")
+            docs[self.id].update(copy.deepcopy(data))
+
+    def delete(self):
+        with self._store._lock:
+            self._store._collections.get(self.parent_id, {}).pop(self.id, None)
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self._store, f"{self.parent_id}/{self.id}/{name}")
+
+
+class Query:
+    def __init__(self, store: "InMemoryFirestore", collection_id: str):
+        self._store = store
+        self._collection_id = collection_id
+        self._fields: Optional[List[str]] = None
+        self._order: List[tuple] = []
+        self._start_after: Optional[dict] = None
+        self._limit: Optional[int] = None
+
+    def _copy(self) -> "Query":
+        q = Query(self._store, self._collection_id)
+        q._fields, q._order = self._fields, list(self._order)
+        q._start_after, q._limit = self._start_after, self._limit
+        return q
+
+    def select(self, field_paths: List[str]) -> "Query":
+        q = self._copy()
+        q._fields = list(field_paths)
+        return q
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        q = self._copy()
+        q._order.append((field, direction))
+        return q
+
+    def start_after(self, values: dict) -> "Query":
+        q = self._copy()
+        q._start_after = values
+        return q
+
+    def limit(self, count: int) -> "Query":
+        q = self._copy()
+        q._limit = count
+        return q
+
+    def stream(self):
+        with self._store._lock:
+            items = list(self._store._collections.get(self._collection_id, {}).items())
+        for field, direction in reversed(self._order):
+            if field == "__name__":
+                items.sort(key=lambda kv: kv[0], reverse=direction == "DESCENDING")
+            else:
+                items.sort(key=lambda kv: kv[1].get(field), reverse=direction == "DESCENDING")
+        if self._start_after and self._order:
+            field, direction = self._order[0]
+            cursor = self._start_after.get(field)
+            cursor = getattr(cursor, "id", cursor)
+            key = (lambda kv: kv[0]) if field == "__name__" else (lambda kv: kv[1].get(field))
+            if direction == "DESCENDING":
+                items = [kv for kv in items if key(kv) < cursor]
+            else:
+                items = [kv for kv in items if key(kv) > cursor]
+        if self._limit is not None:
+            items = items[:self._limit]
+        for doc_id, data in items:
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield DocumentSnapshot(doc_id, copy.deepcopy(data),
+                                   DocumentReference(self._store, self._collection_id, doc_id))
+
+
+class CollectionReference(Query):
+    def __init__(self, store: "InMemoryFirestore", collection_id: str):
+        super().__init__(store, collection_id)
+        self.id = collection_id
+
+    def document(self, doc_id: str) -> DocumentReference:
+        return DocumentReference(self._store, self.id, doc_id)
+
+
+class WriteBatch:
+    """Applies queued writes on commit (atomically with respect to readers)."""
+
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._writes: List[tuple] = []
+
+    def set(self, ref: DocumentReference, data: dict, merge: bool = False):
+        self._writes.append(("set", ref, data, merge))
+
+    def update(self, ref: DocumentReference, data: dict):
+        self._writes.append(("update", ref, data, False))
+
+    def delete(self, ref: DocumentReference):
+        self._writes.append(("delete", ref, None, False))
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("A batch can contain at most 500 writes")
+        with self._store._lock:
+            for op, ref, data, merge in self._writes:
+                if op == "set":
+                    ref.set(data, merge=merge)
+                elif op == "update":
+                    ref.update(data)
+                else:
+                    ref.delete()
+        self._writes = []
+
+
+class BulkWriter(WriteBatch):
+    """Same calls as Firestore's BulkWriter; writes are flushed in chunks of 500."""
+
+    def _maybe_flush(self):
+        if len(self._writes) >= 500:
+            self.flush()
+
+    def set(self, ref, data, merge=False):
+        super().set(ref, data, merge)
+        self._maybe_flush()
+
+    def update(self, ref, data):
+        super().update(ref, data)
+        self._maybe_flush()
+
+    def flush(self):
+        self.commit()
+
+    def close(self):
+        self.flush()
+
+
+class InMemoryFirestore:
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def bulk_writer(self) -> BulkWriter:
+        return BulkWriter(self)
@@ -1,10 +1,27 @@
 from google.cloud import firestore
+import argparse
 import random
+import threading
+import time
 from datetime import datetime
 import os
+import numpy as np
+from leaderboard_ranking import RankIndex
+from leaderboard_analytics import AnalyticsIndex, METRICS, ANALYTICS_COLLECTION, analytics_view_id
+from config import LEADERBOARD_BACKEND, ANALYTICS_PASS_PERCENT, ANALYTICS_TOP_N
+from app_logging import get_logger
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "sahayak-d88d3-2e1f13a7b2bc.json"
+
+def _make_db():
+    if LEADERBOARD_BACKEND == "memory":
+        from inmemory_firestore import InMemoryFirestore
+        return InMemoryFirestore()
+    # Set FIRESTORE_EMULATOR_HOST (e.g. localhost:8080) to write to the local emulator
+    return firestore.Client()
+
 # Initialize Firestore client
-db = firestore.Client()
+db = _make_db()
+log = get_logger("leaderboard")
 
 # Sample data for generating realistic student records
 student_names = [
@@ -75,88 +92,244 @@ def generate_overall_feedback(percentage, rank):
     else:
         return f"Below average performance. Ranked {rank}. Requires immediate attention and extra coaching."
 
-def create_student_leaderboard():
-    """Create and populate student leaderboard in Firestore"""
-    
-    students_data = []
-    
-    # Generate data for 10 students
-    for i, name in enumerate(student_names):
-        # Generate realistic marks (some correlation between subjects)
-        base_performance = random.randint(40, 95)  # Base performance level
-        
-        maths_marks = max(0, min(100, base_performance + random.randint(-15, 15)))
-        science_marks = max(0, min(100, base_performance + random.randint(-12, 12)))
-        social_marks = max(0, min(100, base_performance + random.randint(-10, 10)))
-        english_marks = max(0, min(100, base_performance + random.randint(-8, 8)))
-        kannada_marks = max(0, min(100, base_performance + random.randint(-10, 10)))
-        
-        # Calculate total and percentage
-        all_subject_marks = maths_marks + science_marks + social_marks + english_marks + kannada_marks
-        percentage = round(all_subject_marks / 5, 2)
-        
-        # Generate subject-specific feedbacks
-        feedbacks = []
-        feedbacks.append(generate_subject_feedback('maths', maths_marks))
-        feedbacks.append(generate_subject_feedback('science', science_marks))
-        feedbacks.append(generate_subject_feedback('social', social_marks))
-        feedbacks.append(generate_subject_feedback('english', english_marks))
-        feedbacks.append(generate_subject_feedback('kannada', kannada_marks))
-        
-        # Add some general feedbacks
-        if maths_marks < 50:
+# Ranks are maintained incrementally from this index (loaded on first use)
+_rank_index = None
+_rank_lock = threading.Lock()
+
+def get_rank_index() -> RankIndex:
+    """Loads every student's percentage once (projection only) into a RankIndex."""
+    global _rank_index
+    if _rank_index is None:
+        docs = db.collection('student_leaderboard').select(['percentage']).stream()
+        _rank_index = RankIndex.from_scores(
+            (doc.id, (doc.to_dict() or {}).get('percentage', 0)) for doc in docs
+        )
+        log.info(f"Rank index loaded with {len(_rank_index)} students")
+    return _rank_index
+
+def _commit_rank_changes(changed_ranks, batch=None, pending=0):
+    """
+    Writes only the rank field of the students whose rank moved, 500 writes per batch.
+    batch/pending continue an existing batch that already holds `pending` writes.
+    """
+    collection_ref = db.collection('student_leaderboard')
+    batch = batch or db.batch()
+    for sid, rank in changed_ranks.items():
+        if pending == 500:
+            batch.commit()
+            batch, pending = db.batch(), 0
+        batch.update(collection_ref.document(sid), {'rank': rank})
+        pending += 1
+    batch.commit()
+
+def reconcile_ranks():
+    """Rewrites stored ranks that disagree with the index (e.g. after a bulk load)."""
+    with _rank_lock:
+        ranks = get_rank_index().ranks()
+        stored = {
+            doc.id: (doc.to_dict() or {}).get('rank')
+            for doc in db.collection('student_leaderboard').select(['rank']).stream()
+        }
+        changed = {sid: r for sid, r in ranks.items() if stored.get(sid) != r}
+        if changed:
+            _commit_rank_changes(changed)
+    log.info(f"Reconciled {len(changed)} ranks")
+    return changed
+
+# Extra names for generated students beyond the hard-coded ten
+first_names = [n.split()[0] for n in student_names] + [
+    "Ishaan", "Diya", "Karthik", "Lakshmi", "Nikhil", "Pooja", "Siddharth", "Tanvi",
+    "Varun", "Yamini"
+]
+last_names = [n.split()[1] for n in student_names] + [
+    "Rao", "Hegde", "Shetty", "Menon", "Kulkarni", "Bhat", "Desai", "Pillai"
+]
+
+SUBJECTS = ['maths', 'science', 'social', 'english', 'kannada']
+_SUBJECT_SPREADS = np.array([15, 12, 10, 8, 10])  # +/- around a student's base performance
+_CATEGORIES = ['poor', 'average', 'good', 'excellent']  # np.digitize order for [50, 75, 90]
+
+def generate_students(num_students=len(student_names), classes=('10th Standard',), sections=('A',), seed=None):
+    """
+    Generates student records with ranks assigned. Marks, grade categories and
+    feedback picks are drawn for every student at once with NumPy; only the final
+    dicts are built per student. Ranks use the same tie-break as RankIndex.
+    """
+    rng = np.random.default_rng(seed)
+    n = num_students
+
+    base_performance = rng.integers(40, 96, size=n)
+    marks = np.clip(
+        base_performance[:, None] + rng.integers(-_SUBJECT_SPREADS, _SUBJECT_SPREADS + 1, size=(n, len(SUBJECTS))),
+        0, 100
+    )
+    totals = marks.sum(axis=1)
+    percentages = np.round(totals / len(SUBJECTS), 2)
+
+    # Feedback template index per (student, subject), scaled to that category's template count
+    categories = np.digitize(marks, [50, 75, 90])
+    template_counts = np.array([[len(feedback_templates[s][c]) for c in _CATEGORIES] for s in SUBJECTS])
+    picks = (rng.random(marks.shape) * template_counts[np.arange(len(SUBJECTS)), categories]).astype(int)
+
+    needs_maths = marks[:, 0] < 50
+    needs_english = marks[:, 3] < 60
+    strong_stem = (marks[:, 0] >= 85) & (marks[:, 1] >= 85)
+    exceptional = percentages >= 90
+
+    width = max(3, len(str(n)))
+    student_ids = np.array([f'STU{2025}{str(i + 1).zfill(width)}' for i in range(n)])  # e.g., STU2025001
+    # Rank by percentage descending, ties by student_id (matches RankIndex)
+    order = np.lexsort((student_ids, -percentages))
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = np.arange(1, n + 1)
+
+    if n <= len(student_names):
+        names = student_names[:n]
+    else:
+        names = [
+            f"{first_names[f]} {last_names[l]}"
+            for f, l in zip(rng.integers(0, len(first_names), n), rng.integers(0, len(last_names), n))
+        ]
+    class_idx = rng.integers(0, len(classes), n) if len(classes) > 1 else np.zeros(n, dtype=int)
+    section_idx = rng.integers(0, len(sections), n) if len(sections) > 1 else np.zeros(n, dtype=int)
+
+    created_at = datetime.now()
+    marks_list, pct_list, rank_list = marks.tolist(), percentages.tolist(), ranks.tolist()
+    cat_list, pick_list, totals_list = categories.tolist(), picks.tolist(), totals.tolist()
+    students_data = [None] * n
+    for pos in order.tolist():
+        m = marks_list[pos]
+        feedbacks = [
+            feedback_templates[subject][_CATEGORIES[c]][p]
+            for subject, c, p in zip(SUBJECTS, cat_list[pos], pick_list[pos])
+        ]
+        if needs_maths[pos]:
             feedbacks.append("Mathematics needs immediate attention")
-        if english_marks < 60:
+        if needs_english[pos]:
             feedbacks.append("Focus on English grammar and vocabulary")
-        if all([maths_marks >= 85, science_marks >= 85]):
+        if strong_stem[pos]:
             feedbacks.append("Strong in STEM subjects - consider science stream")
-        if percentage >= 90:
+        if exceptional[pos]:
             feedbacks.append("Exceptional overall performance!")
-        
-        student_data = {
-            'student_name': name,
-            'student_id': f'STU{2025}{str(i+1).zfill(3)}',  # e.g., STU2025001
-            'maths_marks': maths_marks,
-            'science_marks': science_marks,
-            'social_marks': social_marks,
-            'english_marks': english_marks,
-            'kannada_marks': kannada_marks,
-            'all_subject_marks': all_subject_marks,
-            'percentage': percentage,
+        feedbacks.append(generate_overall_feedback(pct_list[pos], rank_list[pos]))
+
+        students_data[rank_list[pos] - 1] = {
+            'student_name': names[pos],
+            'student_id': str(student_ids[pos]),
+            'maths_marks': m[0],
+            'science_marks': m[1],
+            'social_marks': m[2],
+            'english_marks': m[3],
+            'kannada_marks': m[4],
+            'all_subject_marks': totals_list[pos],
+            'percentage': pct_list[pos],
             'feedbacks': feedbacks,
-            'created_at': datetime.now(),
+            'created_at': created_at,
             'exam_date': '2025-07-20',
-            'class': '10th Standard',
-            'section': 'A'
+            'class': classes[class_idx[pos]],
+            'section': sections[section_idx[pos]],
+            'rank': rank_list[pos]
         }
-        
-        students_data.append(student_data)
-    
-    # Sort students by percentage for ranking
-    students_data.sort(key=lambda x: x['percentage'], reverse=True)
-    
-    # Assign ranks and add overall feedback
-    for i, student in enumerate(students_data):
-        student['rank'] = i + 1
-        student['feedbacks'].append(generate_overall_feedback(student['percentage'], student['rank']))
-    
-    # Store in Firestore
+    return students_data
+
+def write_students(students_data, writer='bulk', batch_size=500):
+    """
+    Writes student docs with Firestore's BulkWriter (parallel, throttled) or with
+    sequential batched commits of batch_size (<= 500) writes.
+    """
     collection_ref = db.collection('student_leaderboard')
-    
-    print("Adding students to Firestore...")
+    if writer == 'bulk':
+        bulk_writer = db.bulk_writer()
+        for student in students_data:
+            bulk_writer.set(collection_ref.document(student['student_id']), student)
+        bulk_writer.close()
+        return
+    batch, pending = db.batch(), 0
     for student in students_data:
-        doc_ref = collection_ref.document(student['student_id'])
-        doc_ref.set(student)
-        print(f"Added: {student['student_name']} - Rank: {student['rank']} - Percentage: {student['percentage']}%")
-    
-    print(f"\nSuccessfully added {len(students_data)} students to Firestore!")
+        if pending == batch_size:
+            batch.commit()
+            batch, pending = db.batch(), 0
+        batch.set(collection_ref.document(student['student_id']), student)
+        pending += 1
+    batch.commit()
+
+# Materialized analytics views, maintained alongside ranks (loaded on first use)
+_analytics_index = None
+
+def get_analytics_index() -> AnalyticsIndex:
+    """Loads the fields the analytics views need (projection only) into an AnalyticsIndex."""
+    global _analytics_index
+    if _analytics_index is None:
+        fields = ['student_name', 'class', 'section', *METRICS]
+        docs = db.collection('student_leaderboard').select(fields).stream()
+        _analytics_index = AnalyticsIndex.from_docs(
+            ({**(doc.to_dict() or {}), 'student_id': doc.id} for doc in docs),
+            pass_percent=ANALYTICS_PASS_PERCENT, top_n=ANALYTICS_TOP_N
+        )
+        log.info(f"Analytics index loaded with {len(_analytics_index)} students")
+    return _analytics_index
+
+def _analytics_writes(scopes):
+    """(doc_ref, view) for each (class, section) scope to rewrite in leaderboard_analytics."""
+    index = get_analytics_index()
+    collection_ref = db.collection(ANALYTICS_COLLECTION)
+    updated_at = datetime.now()
+    for class_name, section in scopes:
+        view = index.view(class_name, section)
+        view['updated_at'] = updated_at
+        yield collection_ref.document(analytics_view_id(class_name, section)), view
+
+def rebuild_analytics():
+    """Rewrites every analytics view from the index (after a bulk load or to repair drift)."""
+    with _rank_lock:
+        scopes = get_analytics_index().all_views()
+        batch, pending = db.batch(), 0
+        for ref, view in _analytics_writes(scopes):
+            if pending == 500:
+                batch.commit()
+                batch, pending = db.batch(), 0
+            batch.set(ref, view)
+            pending += 1
+        batch.commit()
+    log.info(f"Wrote {len(scopes)} analytics views")
+    return scopes
+
+def create_student_leaderboard(num_students=len(student_names), classes=('10th Standard',), sections=('A',),
+                               seed=None, writer='bulk'):
+    """Create and populate student leaderboard in Firestore"""
+    global _rank_index, _analytics_index
+
+    start = time.perf_counter()
+    students_data = generate_students(num_students, classes, sections, seed)
+    generated = time.perf_counter()
+    print(f"Generated {len(students_data)} students in {generated - start:.2f}s")
+
+    print("Adding students to Firestore...")
+    write_students(students_data, writer)
+    written = time.perf_counter() - generated
+    if len(students_data) <= 50:
+        for student in students_data:
+            print(f"Added: {student['student_name']} - Rank: {student['rank']} - Percentage: {student['percentage']}%")
+
+    # Ranks were assigned above; seed the indexes so later updates work from them
+    with _rank_lock:
+        _rank_index = RankIndex.from_scores((s['student_id'], s['percentage']) for s in students_data)
+        _analytics_index = AnalyticsIndex.from_docs(
+            students_data, pass_percent=ANALYTICS_PASS_PERCENT, top_n=ANALYTICS_TOP_N
+        )
+    rebuild_analytics()
+
+    print(f"\nSuccessfully added {len(students_data)} students to Firestore! "
+          f"({written:.2f}s, {len(students_data) / max(written, 1e-9):.0f} docs/s, writer={writer})")
     return students_data
 
-def display_leaderboard():
-    """Retrieve and display leaderboard from Firestore"""
+def display_leaderboard(limit=None):
+    """Retrieve and display leaderboard from Firestore (top `limit` students if given)"""
     try:
-        collection_ref = db.collection('student_leaderboard')
-        students = collection_ref.order_by('rank').stream()
+        query = db.collection('student_leaderboard').order_by('rank')
+        if limit:
+            query = query.limit(limit)
+        students = query.stream()
         
         print("\n" + "="*80)
         print("🏆 STUDENT LEADERBOARD - 10th Standard Section A 🏆")
@@ -190,7 +363,7 @@ def get_student_detailed_report(student_id):
             print(f"Student ID: {student['student_id']}")
             print(f"Class: {student['class']} - Section: {student['section']}")
             print(f"Exam Date: {student['exam_date']}")
-            print(f"Overall Rank: {student['rank']}/10")
+            print(f"Overall Rank: {student['rank']}/{len(get_rank_index())}")
             print(f"Overall Percentage: {student['percentage']}%")
             print("\nSUBJECT-WISE MARKS:")
             print(f"Mathematics: {student['maths_marks']}/100")
@@ -212,6 +385,10 @@ def get_student_detailed_report(student_id):
 
 def update_student_marks(student_id, subject, new_marks):
     """Update marks for a specific student and subject"""
+    global _rank_index, _analytics_index
+    max_marks = METRICS.get(subject, 100)
+    if isinstance(new_marks, bool) or not isinstance(new_marks, int) or not 0 <= new_marks <= max_marks:
+        raise ValueError(f"{subject} must be an integer between 0 and {max_marks}, got {new_marks!r}")
     try:
         doc_ref = db.collection('student_leaderboard').document(student_id)
         student_doc = doc_ref.get()
@@ -234,26 +411,63 @@ def update_student_marks(student_id, subject, new_marks):
                 subject_name = subject.replace('_marks', '')
                 new_feedback = generate_subject_feedback(subject_name, new_marks)
                 
-                # Update document
-                doc_ref.update(student)
+                # Re-rank incrementally: only students whose rank moved are written,
+                # together with this student's doc and the analytics views it falls in, in one batch
+                with _rank_lock:
+                    try:
+                        changed_ranks = get_rank_index().update(student_id, student['percentage'])
+                        student['rank'] = changed_ranks.pop(student_id, student.get('rank'))
+                        batch = db.batch()
+                        batch.update(doc_ref, student)
+                        pending = 1
+                        changed_groups = get_analytics_index().apply({**student, 'student_id': student_id})
+                        for ref, view in _analytics_writes(AnalyticsIndex.affected_views(changed_groups)):
+                            batch.set(ref, view)
+                            pending += 1
+                        _commit_rank_changes(changed_ranks, batch, pending=pending)
+                    except Exception:
+                        # The indexes already hold the new marks but Firestore may not;
+                        # drop them so the next caller rebuilds from what was stored
+                        _rank_index = _analytics_index = None
+                        raise
                 
-                print(f"Updated {student['student_name']}'s {subject}: {old_marks} → {new_marks}")
-                print(f"New percentage: {student['percentage']}%")
-                print(f"New feedback: {new_feedback}")
+                log.info(f"Updated {student['student_name']}'s {subject}: {old_marks} → {new_marks}")
+                log.info(f"New rank: {student['rank']} ({len(changed_ranks)} other students moved)")
+                log.info(f"New percentage: {student['percentage']}%")
+                log.info(f"New feedback: {new_feedback}")
                 
         else:
-            print(f"Student with ID {student_id} not found!")
+            log.warning(f"Student with ID {student_id} not found!")
             
     except Exception as e:
-        print(f"Error updating student marks: {e}")
+        log.error(f"Error updating student marks: {e}")
+        raise
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic student leaderboard. "
+                    "LEADERBOARD_BACKEND=memory keeps it in memory; FIRESTORE_EMULATOR_HOST targets the emulator."
+    )
+    parser.add_argument("--students", type=int, default=len(student_names))
+    parser.add_argument("--classes", default="10th Standard", help="comma-separated")
+    parser.add_argument("--sections", default="A", help="comma-separated")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--writer", choices=["bulk", "batch"], default="bulk")
+    parser.add_argument("--show", type=int, default=10, help="leaderboard rows to print")
+    args = parser.parse_args()
+
     # Create the leaderboard
-    students = create_student_leaderboard()
+    students = create_student_leaderboard(
+        args.students,
+        classes=[c.strip() for c in args.classes.split(",")],
+        sections=[s.strip() for s in args.sections.split(",")],
+        seed=args.seed,
+        writer=args.writer
+    )
     
     # Display the leaderboard
-    display_leaderboard()
+    display_leaderboard(args.show)
     
     # Example: Get detailed report for first student
     if students:
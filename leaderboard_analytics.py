@@ -0,0 +1,195 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# field -> max value; marks are integers, so each metric is a fixed-size histogram
+METRICS = {
+    'maths_marks': 100,
+    'science_marks': 100,
+    'social_marks': 100,
+    'english_marks': 100,
+    'kannada_marks': 100,
+    'all_subject_marks': 500,
+}
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BUCKETS = 10
+ANALYTICS_COLLECTION = 'leaderboard_analytics'
+
+GroupKey = Tuple[str, str]  # (class, section)
+
+
+def analytics_view_id(class_name: Optional[str] = None, section: Optional[str] = None) -> str:
+    """Doc id of a materialized view: 'all', '<class>' or '<class>__<section>'."""
+    if class_name is None:
+        return 'all'
+    return class_name if section is None else f'{class_name}__{section}'
+
+
+class _MetricCounts:
+    """Exact per-value counts for one metric in one class/section, plus who holds each value."""
+
+    def __init__(self, max_value: int):
+        self.counts = np.zeros(max_value + 1, dtype=np.int64)
+        self.members: Dict[int, Set[str]] = defaultdict(set)
+
+    def add(self, student_id: str, value: int):
+        if not 0 <= value < len(self.counts):
+            raise ValueError(f"value {value} outside 0..{len(self.counts) - 1}")
+        self.counts[value] += 1
+        self.members[value].add(student_id)
+
+    def remove(self, student_id: str, value: int):
+        self.counts[value] -= 1
+        self.members[value].discard(student_id)
+        if not self.members[value]:
+            del self.members[value]
+
+
+def summarize(counts: np.ndarray, members: List[Dict[int, Set[str]]], names: Dict[str, str],
+              max_value: int, pass_percent: float, top_n: int) -> dict:
+    """Mean, median, percentiles, pass rate, bucketed histogram and top-N from value counts."""
+    n = int(counts.sum())
+    buckets = np.add.reduceat(counts, np.linspace(0, max_value + 1, HISTOGRAM_BUCKETS + 1)[:-1].astype(int))
+    summary = {
+        'count': n,
+        'max_value': max_value,
+        'histogram': buckets.tolist(),  # HISTOGRAM_BUCKETS equal-width buckets over 0..max_value
+    }
+    if n == 0:
+        return {**summary, 'mean': None, 'median': None, 'percentiles': {}, 'min': None, 'max': None,
+                'pass_rate': None, 'top': []}
+
+    values = np.arange(max_value + 1)
+    cumulative = np.cumsum(counts)
+    # Nearest-rank percentile: smallest value with at least q% of students at or below it
+    pct_values = {
+        f'p{q}': int(np.searchsorted(cumulative, max(1, int(np.ceil(q / 100 * n)))))
+        for q in PERCENTILES
+    }
+    pass_from = int(np.ceil(pass_percent / 100 * max_value))
+
+    top = []
+    for value in range(max_value, -1, -1):
+        if not counts[value]:
+            continue
+        holders = sorted(sid for group in members for sid in group.get(value, ()))
+        for sid in holders[:top_n - len(top)]:
+            top.append({'student_id': sid, 'student_name': names.get(sid), 'value': value})
+        if len(top) >= top_n:
+            break
+
+    return {
+        **summary,
+        'mean': round(float((values * counts).sum()) / n, 2),
+        'median': pct_values['p50'],
+        'percentiles': pct_values,
+        'min': int(np.argmax(counts > 0)),
+        'max': int(max_value - np.argmax(counts[::-1] > 0)),
+        'pass_rate': round(float(counts[pass_from:].sum()) / n, 4),
+        'top': top,
+    }
+
+
+class AnalyticsIndex:
+    """
+    Aggregate views of the leaderboard per class/section, maintained incrementally.
+
+    Only (class, section) groups hold state; class-wide and school-wide views are
+    merged from them on demand (histograms add up, and the top-N of a union is
+    the top-N of its parts), so one marks write touches exactly one group.
+    """
+
+    def __init__(self, pass_percent: float = 35, top_n: int = 10):
+        self.pass_percent = pass_percent
+        self.top_n = top_n
+        self._groups: Dict[GroupKey, Dict[str, _MetricCounts]] = {}
+        self._students: Dict[str, Tuple[GroupKey, Dict[str, int]]] = {}
+        self._names: Dict[str, str] = {}
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[dict], **kwargs) -> "AnalyticsIndex":
+        index = cls(**kwargs)
+        for doc in docs:
+            index.apply(doc)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    def groups(self) -> List[GroupKey]:
+        return sorted(self._groups)
+
+    def _group(self, key: GroupKey) -> Dict[str, _MetricCounts]:
+        if key not in self._groups:
+            self._groups[key] = {field: _MetricCounts(max_value) for field, max_value in METRICS.items()}
+        return self._groups[key]
+
+    def apply(self, student: dict) -> List[GroupKey]:
+        """
+        Adds or updates one student from their leaderboard doc. Returns the groups
+        whose views changed: none, theirs, or both old and new on a class/section move.
+        """
+        sid = student['student_id']
+        key = (student.get('class', ''), student.get('section', ''))
+        # Stored docs may hold out-of-range marks; clamp so they land in the end buckets
+        values = {field: min(max(int(student.get(field, 0)), 0), max_value) for field, max_value in METRICS.items()}
+        self._names[sid] = student.get('student_name', sid)
+
+        previous = self._students.get(sid)
+        if previous == (key, values):
+            return []
+        changed = []
+        if previous is not None:
+            changed.append(self.remove(sid, keep_name=True))
+        group = self._group(key)
+        for field, value in values.items():
+            group[field].add(sid, value)
+        self._students[sid] = (key, values)
+        if key not in changed:
+            changed.append(key)
+        return changed
+
+    def remove(self, student_id: str, keep_name: bool = False) -> Optional[GroupKey]:
+        if student_id not in self._students:
+            return None
+        key, values = self._students.pop(student_id)
+        group = self._groups[key]
+        for field, value in values.items():
+            group[field].remove(student_id, value)
+        if not keep_name:
+            self._names.pop(student_id, None)
+        return key
+
+    def view(self, class_name: Optional[str] = None, section: Optional[str] = None) -> dict:
+        """Summary of every metric over one section, one class, or everyone."""
+        keys = [
+            k for k in self._groups
+            if (class_name is None or k[0] == class_name) and (section is None or k[1] == section)
+        ]
+        metrics = {}
+        for field, max_value in METRICS.items():
+            counts = sum((self._groups[k][field].counts for k in keys), np.zeros(max_value + 1, dtype=np.int64))
+            members = [self._groups[k][field].members for k in keys]
+            metrics[field] = summarize(counts, members, self._names, max_value, self.pass_percent, self.top_n)
+        return {
+            'class': class_name,
+            'section': section,
+            'student_count': metrics['all_subject_marks']['count'],
+            'pass_percent': self.pass_percent,
+            'metrics': metrics,
+        }
+
+    @staticmethod
+    def affected_views(keys: Iterable[GroupKey]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """The (class, section) view scopes that changes in groups `keys` invalidate."""
+        scopes = []
+        for key in keys:
+            for scope in (key, (key[0], None), (None, None)):
+                if scope not in scopes:
+                    scopes.append(scope)
+        return scopes
+
+    def all_views(self) -> List[Tuple[Optional[str], Optional[str]]]:
+        classes = sorted({k[0] for k in self._groups})
+        return [(None, None)] + [(c, None) for c in classes] + self.groups()
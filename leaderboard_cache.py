@@ -0,0 +1,90 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from app_logging import get_logger
+
+log = get_logger("leaderboard_cache")
+
+
+class LeaderboardCache:
+    """
+    In-process copy of the student_leaderboard collection, kept fresh by a
+    Firestore on_snapshot listener and held sorted by rank.
+
+    Each applied snapshot publishes a new immutable view (docs sorted by rank,
+    their ranks for bisect, and an ETag), so reads never take a lock.
+    """
+
+    def __init__(self, db, collection_name: str = "student_leaderboard"):
+        self.db = db
+        self.collection_name = collection_name
+        self._docs: Dict[str, dict] = {}
+        self._view: Tuple[Tuple[dict, ...], List[int], str] = ((), [], "")
+        self._epoch = uuid4().hex[:8]  # keeps ETags from colliding across restarts
+        self._version = 0
+        self._ready = threading.Event()
+        self._watch = None
+        self.last_update: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def etag(self) -> str:
+        return self._view[2]
+
+    def start(self, wait_s: float = 10.0) -> bool:
+        """Starts the listener; waits up to wait_s for the initial snapshot."""
+        log.info(f"Listening to '{self.collection_name}'…")
+        self._watch = self.db.collection(self.collection_name).on_snapshot(self._on_snapshot)
+        if not self._ready.wait(wait_s):
+            log.warning("Initial snapshot not received yet; serving from Firestore until it is")
+        return self.ready
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        # Runs on the listener's thread; only this thread writes _docs
+        for change in changes:
+            if change.type.name == "REMOVED":
+                self._docs.pop(change.document.id, None)
+            else:
+                self._docs[change.document.id] = change.document.to_dict()
+        if not changes and self.ready:
+            return
+        rows = tuple(sorted(self._docs.values(), key=lambda d: d.get("rank", float("inf"))))
+        ranks = [d.get("rank", float("inf")) for d in rows]
+        self._version += 1
+        self._view = (rows, ranks, f'W/"{self._epoch}-{self._version}"')
+        self.last_update = time.time()
+        if not self.ready:
+            log.info(f"Loaded {len(rows)} students")
+        self._ready.set()
+
+    def page(self, limit: Optional[int], start_after: Optional[int] = None,
+             fields: Optional[List[str]] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Same contract as the Firestore query: ordered by rank, after start_after, projected to fields.
+        limit=None returns everything after start_after.
+        """
+        rows, ranks, _ = self._view
+        start = bisect.bisect_right(ranks, start_after) if start_after is not None else 0
+        selected = rows[start:start + limit] if limit is not None else rows[start:]
+        if fields:
+            keep = set(fields) | {"rank"}
+            students = [{k: v for k, v in row.items() if k in keep} for row in selected]
+        else:
+            students = [dict(row) for row in selected]
+        next_start_after = selected[-1].get("rank") if limit is not None and len(selected) == limit else None
+        return students, next_start_after
+
+    def all(self) -> Tuple[dict, ...]:
+        """Every cached student, sorted by rank (shared; don't mutate)."""
+        return self._view[0]
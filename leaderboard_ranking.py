@@ -0,0 +1,78 @@
+import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class RankIndex:
+    """
+    Order-statistic index over leaderboard scores.
+
+    Students are kept in a sorted list of (-percentage, student_id) keys, so
+    rank = position + 1 is a binary search away. Ties are broken by student_id
+    so every student has a distinct, stable rank. Moving one student between
+    positions i and j shifts exactly the students in between by one; update()
+    reports precisely those.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[float, str]] = []
+        self._score: Dict[str, float] = {}
+
+    @classmethod
+    def from_scores(cls, scores: Iterable[Tuple[str, float]]) -> "RankIndex":
+        index = cls()
+        for student_id, percentage in scores:
+            index._score[student_id] = float(percentage)
+        index._keys = sorted((-p, sid) for sid, p in index._score.items())
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._score
+
+    def rank_of(self, student_id: str) -> Optional[int]:
+        if student_id not in self._score:
+            return None
+        return bisect.bisect_left(self._keys, (-self._score[student_id], student_id)) + 1
+
+    def ranks(self) -> Dict[str, int]:
+        """Every student's rank."""
+        return {sid: pos + 1 for pos, (_, sid) in enumerate(self._keys)}
+
+    def _ranks_between(self, lo: int, hi: int) -> Dict[str, int]:
+        return {self._keys[pos][1]: pos + 1 for pos in range(lo, min(hi, len(self._keys) - 1) + 1)}
+
+    def update(self, student_id: str, percentage: float) -> Dict[str, int]:
+        """
+        Sets a student's score (adding them if new). Returns {student_id: new_rank}
+        for every student whose rank changed; empty if nobody moved.
+        """
+        percentage = float(percentage)
+        new_key = (-percentage, student_id)
+        if student_id in self._score:
+            old_key = (-self._score[student_id], student_id)
+            if old_key == new_key:
+                return {}
+            old_pos = bisect.bisect_left(self._keys, old_key)
+            del self._keys[old_pos]
+            self._score[student_id] = percentage
+            new_pos = bisect.bisect_left(self._keys, new_key)
+            self._keys.insert(new_pos, new_key)
+            if old_pos == new_pos:
+                return {}
+            return self._ranks_between(min(old_pos, new_pos), max(old_pos, new_pos))
+
+        # New student: everyone at or below the insertion point moves down one
+        self._score[student_id] = percentage
+        new_pos = bisect.bisect_left(self._keys, new_key)
+        self._keys.insert(new_pos, new_key)
+        return self._ranks_between(new_pos, len(self._keys) - 1)
+
+    def remove(self, student_id: str) -> Dict[str, int]:
+        """Drops a student; returns the new ranks of everyone who moved up."""
+        if student_id not in self._score:
+            return {}
+        pos = bisect.bisect_left(self._keys, (-self._score.pop(student_id), student_id))
+        del self._keys[pos]
+        return self._ranks_between(pos, len(self._keys) - 1)
@@ -0,0 +1,327 @@
+"""
+Intent router for leaderboard chat.
+
+Common ranking / score / comparison questions ("Who is ranked 1st?", "Top 5 in
+maths", "How much did Priya score in Kannada?") are answered directly from a
+columnar NumPy copy of the leaderboard. Anything it doesn't recognise returns
+None so the caller can fall back to retrieval + Gemini (GeminiChatModel).
+"""
+import re
+import threading
+import time
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app_logging import get_logger
+from config import ANALYTICS_PASS_PERCENT
+
+log = get_logger("leaderboard_router")
+
+SUBJECT_FIELDS = ['maths_marks', 'science_marks', 'social_marks', 'english_marks', 'kannada_marks']
+SUBJECT_LABELS = {
+    'maths_marks': 'Maths', 'science_marks': 'Science', 'social_marks': 'Social Studies',
+    'english_marks': 'English', 'kannada_marks': 'Kannada', 'percentage': 'overall percentage',
+}
+_SUBJECT_ALIASES = [
+    (r'math(?:s|ematics)?', 'maths_marks'),
+    (r'science', 'science_marks'),
+    (r'social(?: studies| science)?|sst', 'social_marks'),
+    (r'english', 'english_marks'),
+    (r'kannada', 'kannada_marks'),
+    (r'overall|percentage|total', 'percentage'),
+]
+_SUBJECT_RE = re.compile(r'\b(' + '|'.join(f'(?:{a})' for a, _ in _SUBJECT_ALIASES) + r')\b', re.I)
+
+_ORDINALS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
+    'sixth': 6, 'seventh': 7, 'eighth': 8, 'ninth': 9, 'tenth': 10, 'last': -1,
+}
+_NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+                 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10}
+
+# "who is in 10th standard" names a class, not a rank
+_RANK_RE = re.compile(
+    r'\b(?:who(?:\'s| is| was)?\s+(?:ranked|rank|in|at|placed|came)?\s*(?:the\s+)?'
+    r'(?:(\d+)(?:st|nd|rd|th)?|(' + '|'.join(_ORDINALS) + r'))\b(?!\s+(?:standard|std|class|grade)\b)'
+    r'(?:\s+(?:place|position|rank))?'
+    r'|\brank(?:ed)?\s*(?:no\.?|number|#)?\s*(\d+)\b)', re.I)
+# top/last etc. only route when followed by a count or a rank word ("top 5", "top scorer"),
+# so "the top reason" or "last term" fall through to the LLM
+_RANK_WORDS = r'rank(?:ed|er|ers)?|students?|scorers?|performers?|marks|positions?|places?|percentages?'
+_TOP_RE = re.compile(
+    r'\b(top|best|highest|bottom|worst|lowest|last)'
+    r'(?:\s*(\d+|' + '|'.join(_NUMBER_WORDS) + r')\b|\s+(?=(?:' + _RANK_WORDS + r')\b))'
+    r'|\b(topper|toppers)\b'
+    r'|\b(?:scored|got|has)\s+(?:the\s+)?(most|least|highest|lowest|best|worst)\b', re.I)
+_AVERAGE_RE = re.compile(r'\b(average|mean|median)\b', re.I)
+_COUNT_RE = re.compile(
+    r'\bhow many\b.*?\b(?:(above|over|more than|at least|below|under|less than)\s+(\d+(?:\.\d+)?)\s*%?'
+    r'|(passed|failed|pass|fail))', re.I)
+_FEEDBACK_RE = re.compile(r'\b(feedback|comments?|remarks?)\b', re.I)
+_COMPARE_RE = re.compile(r'\b(compare|vs\.?|versus|better than|difference between)\b', re.I)
+_RANK_OF_RE = re.compile(r'\b(rank|position|place)\b', re.I)
+_SCORE_RE = re.compile(r'\b(score|scored|marks?|got|percentage|result)\b', re.I)
+_FILTER_RE = re.compile(r'\bsection\s+([a-z])\b|\b(\d{1,2}(?:st|nd|rd|th)?)\s+(?:standard|std|class|grade)\b', re.I)
+
+
+class Routed(NamedTuple):
+    intent: str
+    answer: str
+    student_ids: List[str]  # students the answer is about (for follow-up questions)
+
+
+class LeaderboardTable:
+    """The leaderboard as parallel NumPy columns, rows sorted by rank."""
+
+    def __init__(self, docs: Iterable[dict]):
+        docs = sorted(docs, key=lambda d: d.get('rank', float('inf')))
+        self.docs = docs
+        self.n = len(docs)
+        self.student_id = np.array([d.get('student_id', '') for d in docs], dtype=object)
+        self.name = np.array([d.get('student_name', '') for d in docs], dtype=object)
+        self.class_name = np.array([str(d.get('class', '')) for d in docs], dtype=str)
+        self.section = np.array([str(d.get('section', '')) for d in docs], dtype=str)
+        self.rank = np.array([d.get('rank', 0) for d in docs], dtype=np.int64)
+        self.columns = {
+            field: np.array([d.get(field, 0) for d in docs], dtype=np.float64)
+            for field in SUBJECT_FIELDS + ['percentage']
+        }
+        # name / id / first name (lowercase) -> row indexes, for spotting students in a question
+        self._by_key = {}
+        for i, d in enumerate(docs):
+            name = str(d.get('student_name', '')).lower()
+            for key in {name, str(d.get('student_id', '')).lower(), name.split(' ')[0]}:
+                if key:
+                    self._by_key.setdefault(key, []).append(i)
+
+    def mask(self, class_name: Optional[str] = None, section: Optional[str] = None) -> np.ndarray:
+        m = np.ones(self.n, dtype=bool)
+        if class_name:
+            m &= np.char.startswith(self.class_name, class_name)
+        if section:
+            m &= self.section == section
+        return m
+
+    def top(self, field: str, k: int, mask: np.ndarray, lowest: bool = False) -> np.ndarray:
+        """Row indexes of the k best (or worst) in field among mask; ties keep rank order."""
+        rows = np.flatnonzero(mask)
+        values = self.columns[field][rows]
+        k = min(k, len(rows))
+        if k == 0:
+            return rows[:0]
+        keys = values if lowest else -values
+        if k < len(rows):
+            cut = np.partition(keys, k - 1)[k - 1]
+            rows, keys = rows[keys <= cut], keys[keys <= cut]
+        return rows[np.lexsort((rows, keys))][:k]
+
+    def ids(self, rows: Iterable[int]) -> List[str]:
+        return [str(self.student_id[i]) for i in rows]
+
+    def records(self, student_ids: Iterable[str]) -> List[dict]:
+        """Full docs for the given student ids (unknown ids are skipped)."""
+        rows = (self._by_key.get(str(sid).lower(), []) for sid in student_ids)
+        return [self.docs[r[0]] for r in rows if len(r) == 1]
+
+    def find_students(self, text: str) -> Tuple[List[int], List[str]]:
+        """
+        Students named in text (full name, first name or id), in order of mention,
+        plus any names that match more than one student.
+        """
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        rows, ambiguous = [], []
+        i = 0
+        while i < len(words):
+            pair = ' '.join(words[i:i + 2])
+            if i + 1 < len(words) and pair in self._by_key:
+                key, i = pair, i + 2  # "priya patel" wins over "priya"
+            elif words[i] in self._by_key:
+                key, i = words[i], i + 1
+            else:
+                i += 1
+                continue
+            hits = self._by_key[key]
+            if len(hits) > 1:
+                ambiguous.append(key)
+            elif hits[0] not in rows:
+                rows.append(hits[0])
+        return rows, ambiguous
+
+
+def _subject(question: str) -> Optional[str]:
+    m = _SUBJECT_RE.search(question)
+    if not m:
+        return None
+    word = m.group(1).lower()
+    for alias, field in _SUBJECT_ALIASES:
+        if re.fullmatch(alias, word):
+            return field
+    return None
+
+
+def _filters(question: str) -> Tuple[Optional[str], Optional[str]]:
+    class_name = section = None
+    for m in _FILTER_RE.finditer(question):
+        if m.group(1):
+            section = m.group(1).upper()
+        if m.group(2):
+            class_name = re.sub(r'(st|nd|rd|th)$', '', m.group(2).lower()) + 'th'
+            class_name = {'1th': '1st', '2th': '2nd', '3th': '3rd'}.get(class_name, class_name)
+    return class_name, section
+
+
+def _fmt(value: float) -> str:
+    return f"{value:g}"
+
+
+def _student_line(t: LeaderboardTable, i: int, field: Optional[str] = None) -> str:
+    if field and field != 'percentage':
+        return f"{t.name[i]} ({t.student_id[i]}) – {_fmt(t.columns[field][i])} in {SUBJECT_LABELS[field]}"
+    return f"{t.name[i]} ({t.student_id[i]}) – rank {t.rank[i]}, {_fmt(t.columns['percentage'][i])}%"
+
+
+def route(question: str, t: LeaderboardTable) -> Optional[Routed]:
+    """Routed(intent, answer, student_ids) for questions answerable from the table, else None."""
+    if t.n == 0:
+        return None
+    q = question.strip()
+    field = _subject(q)
+    class_name, section = _filters(q)
+    scope_parts = [f"{class_name} Standard" if class_name else '', f"section {section}" if section else '']
+    scope = ' in ' + ' '.join(p for p in scope_parts if p) if (class_name or section) else ''
+    mask = t.mask(class_name, section)
+    students, ambiguous = t.find_students(q)
+    if ambiguous and not students and (_FEEDBACK_RE.search(q) or _COMPARE_RE.search(q)
+                                       or _RANK_OF_RE.search(q) or _SCORE_RE.search(q)):
+        key = ambiguous[0]
+        rows = t._by_key[key]
+        lines = '\n'.join(f"- {_student_line(t, i)}" for i in rows[:10])
+        more = f"\n…and {len(rows) - 10} more" if len(rows) > 10 else ''
+        return Routed('ambiguous', f"{len(rows)} students match '{key}'. Ask again with the student ID:\n"
+                                   f"{lines}{more}", [])
+
+    if _FEEDBACK_RE.search(q) and len(students) == 1:
+        i = students[0]
+        feedbacks = t.docs[i].get('feedbacks') or []
+        lines = '\n'.join(f"{n}. {f}" for n, f in enumerate(feedbacks, 1)) or 'No feedback recorded.'
+        return Routed('feedback', f"Feedback for {t.name[i]}:\n{lines}", t.ids(students))
+
+    if _COMPARE_RE.search(q) and len(students) >= 2:
+        fields = [field] if field else SUBJECT_FIELDS + ['percentage']
+        lines = []
+        for f in fields:
+            a, b = (t.columns[f][i] for i in students[:2])
+            lead = t.name[students[0]] if a > b else t.name[students[1]] if b > a else 'Tie'
+            lines.append(f"{SUBJECT_LABELS[f]}: {_fmt(a)} vs {_fmt(b)} ({lead})")
+        header = f"{t.name[students[0]]} (rank {t.rank[students[0]]}) vs {t.name[students[1]]} (rank {t.rank[students[1]]})"
+        return Routed('compare', header + '\n' + '\n'.join(lines), t.ids(students[:2]))
+
+    if len(students) == 1:
+        i = students[0]
+        if field and field != 'percentage' and _SCORE_RE.search(q):
+            return Routed('score', f"{t.name[i]} scored {_fmt(t.columns[field][i])}/100 in {SUBJECT_LABELS[field]}.",
+                          t.ids(students))
+        if _RANK_OF_RE.search(q) or _SCORE_RE.search(q):
+            marks = ', '.join(f"{SUBJECT_LABELS[f]} {_fmt(t.columns[f][i])}" for f in SUBJECT_FIELDS)
+            return Routed('student', f"{t.name[i]} ({t.student_id[i]}) is ranked {t.rank[i]} of {t.n} with "
+                                     f"{_fmt(t.columns['percentage'][i])}% ({marks}).", t.ids(students))
+
+    m = _COUNT_RE.search(q)
+    if m:
+        values = t.columns[field or 'percentage'][mask]
+        if m.group(3):
+            passed = m.group(3).lower().startswith('pass')
+            # Same pass mark as the /leaderboard/analytics pass rates
+            above = values >= ANALYTICS_PASS_PERCENT
+            count = int(above.sum()) if passed else int((~above).sum())
+            what = 'passed' if passed else 'failed'
+            return Routed('count', f"{count} of {len(values)} students{scope} {what} "
+                                   f"{SUBJECT_LABELS[field or 'percentage']} "
+                                   f"(pass mark {_fmt(ANALYTICS_PASS_PERCENT)}).", [])
+        op, threshold = m.group(1).lower(), float(m.group(2))
+        if op in ('above', 'over', 'more than'):
+            count = int((values > threshold).sum())
+        elif op == 'at least':
+            count = int((values >= threshold).sum())
+        else:
+            count = int((values < threshold).sum())
+        return Routed('count', f"{count} of {len(values)} students{scope} scored {op} {_fmt(threshold)} "
+                               f"in {SUBJECT_LABELS[field or 'percentage']}.", [])
+
+    m = _AVERAGE_RE.search(q)
+    if m and not students:
+        values = t.columns[field or 'percentage'][mask]
+        if not len(values):
+            return None
+        stat = m.group(1).lower()
+        value = np.median(values) if stat == 'median' else values.mean()
+        return Routed('average', f"The {stat} {SUBJECT_LABELS[field or 'percentage']}{scope} is {value:.2f} "
+                                 f"across {len(values)} students.", [])
+
+    m = _RANK_RE.search(q)
+    if m and not students:
+        n = int(m.group(1) or m.group(3)) if (m.group(1) or m.group(3)) else _ORDINALS[m.group(2).lower()]
+        total = int(mask.sum())
+        if n == -1:
+            n = total
+        if not 1 <= n <= total:
+            return Routed('rank', f"There is no rank {n}; {total} students are on the leaderboard{scope}.", [])
+        if field and field != 'percentage':
+            row = t.top(field, n, mask)[-1]
+            return Routed('rank', f"Rank {n} in {SUBJECT_LABELS[field]}{scope}: {_student_line(t, row, field)}",
+                          t.ids([row]))
+        row = np.flatnonzero(mask)[n - 1]
+        return Routed('rank', f"Rank {n}{scope}: {_student_line(t, row)}", t.ids([row]))
+
+    m = _TOP_RE.search(q)
+    if m and not students:
+        word = (m.group(1) or m.group(3) or m.group(4) or '').lower()
+        lowest = word in ('bottom', 'worst', 'lowest', 'last', 'least')
+        count = m.group(2)
+        k = (int(count) if count.isdigit() else _NUMBER_WORDS[count.lower()]) if count else (
+            5 if word in ('toppers',) else 1)
+        f = field or 'percentage'
+        rows = t.top(f, k, mask, lowest=lowest)
+        if not len(rows):
+            return None
+        label = 'Lowest' if lowest else 'Top'
+        lines = '\n'.join(f"{n}. {_student_line(t, i, f)}" for n, i in enumerate(rows, 1))
+        return Routed('top', f"{label} {len(rows)} in {SUBJECT_LABELS[f]}{scope}:\n{lines}", t.ids(rows))
+
+    return None
+
+
+class LeaderboardRouter:
+    """
+    Keeps a LeaderboardTable built from load_docs() and routes questions over it.
+    The table is rebuilt when version() changes (e.g. the leaderboard cache ETag),
+    or every ttl_s when no version is available.
+    """
+
+    def __init__(self, load_docs: Callable[[], Iterable[dict]],
+                 version: Callable[[], Optional[str]] = lambda: None, ttl_s: float = 60.0):
+        self._load_docs = load_docs
+        self._version = version
+        self._ttl_s = ttl_s
+        self._table: Optional[LeaderboardTable] = None
+        self._key: Optional[str] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def table(self) -> LeaderboardTable:
+        key = self._version()
+        with self._lock:
+            stale = (
+                self._table is None
+                or (key is not None and key != self._key)
+                or (key is None and time.monotonic() - self._built_at > self._ttl_s)
+            )
+            if stale:
+                self._table = LeaderboardTable(self._load_docs())
+                self._key, self._built_at = key, time.monotonic()
+                log.info(f"Table built with {self._table.n} students")
+            return self._table
+
+    def answer(self, question: str) -> Optional[Routed]:
+        return route(question, self.table())
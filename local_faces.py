@@ -0,0 +1,281 @@
+import asyncio
+import io
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import (
+    ATTENDANCE_CROP_MARGIN, LOCAL_FACE_DETECTOR_MODEL, LOCAL_FACE_EMBEDDER_MODEL,
+    LOCAL_FACE_DETECT_SCORE, LOCAL_FACE_THRESHOLD, LOCAL_FACE_THREADS, LOCAL_FACE_GALLERY_PATH
+)
+from app_logging import get_logger
+
+log = get_logger("local_faces")
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom in pixels
+
+
+def _onnx_session(model_path: str, threads: int = LOCAL_FACE_THREADS):
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("Local face engine needs onnxruntime: pip install onnxruntime")
+    if not os.path.exists(model_path):
+        raise RuntimeError(f"Face model not found: {model_path}")
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou: float) -> List[int]:
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        xx1 = np.maximum(boxes[i, 0], boxes[order[1:], 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[order[1:], 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[order[1:], 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[order[1:], 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        overlap = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][overlap <= iou]
+    return keep
+
+
+class OnnxFaceDetector:
+    """UltraFace (version-RFB-320) detector: normalized corner boxes + scores, then NMS."""
+
+    def __init__(self, model_path: str = LOCAL_FACE_DETECTOR_MODEL,
+                 score_threshold: float = LOCAL_FACE_DETECT_SCORE, nms_iou: float = 0.3):
+        self.session = _onnx_session(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        _, _, height, width = self.session.get_inputs()[0].shape
+        self.size = (width, height) if isinstance(width, int) else (320, 240)
+        self.score_threshold = score_threshold
+        self.nms_iou = nms_iou
+
+    def detect(self, img: Image.Image) -> List[Box]:
+        pixels = np.asarray(img.resize(self.size), dtype=np.float32)
+        blob = ((pixels - 127.0) / 128.0).transpose(2, 0, 1)[None]
+        scores, boxes = self.session.run(None, {self.input_name: blob})
+        scores, boxes = scores[0, :, 1], boxes[0]
+        mask = scores >= self.score_threshold
+        boxes, scores = boxes[mask], scores[mask]
+        width, height = img.size
+        return [
+            (int(boxes[i, 0] * width), int(boxes[i, 1] * height),
+             int(boxes[i, 2] * width), int(boxes[i, 3] * height))
+            for i in _nms(boxes, scores, self.nms_iou)
+        ]
+
+
+class OnnxFaceEmbedder:
+    """ArcFace-style embedder (112x112 RGB, (x - 127.5) / 127.5) returning L2-normalized rows."""
+
+    def __init__(self, model_path: str = LOCAL_FACE_EMBEDDER_MODEL, batch_size: int = 32):
+        self.session = _onnx_session(model_path)
+        spec = self.session.get_inputs()[0]
+        self.input_name = spec.name
+        self.size = (spec.shape[3], spec.shape[2]) if isinstance(spec.shape[3], int) else (112, 112)
+        # Fixed-batch exports take one face per run
+        self.batch_size = spec.shape[0] if isinstance(spec.shape[0], int) else batch_size
+
+    def embed(self, faces: List[Image.Image]) -> np.ndarray:
+        out = []
+        for i in range(0, len(faces), self.batch_size):
+            chunk = np.stack([np.asarray(f.resize(self.size), dtype=np.float32) for f in faces[i:i + self.batch_size]])
+            blob = ((chunk - 127.5) / 127.5).transpose(0, 3, 1, 2)
+            out.append(self.session.run(None, {self.input_name: blob})[0])
+        vectors = np.concatenate(out).astype(np.float32) if out else np.zeros((0, 0), np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def crop(img: Image.Image, box: Box, margin: float = ATTENDANCE_CROP_MARGIN) -> Image.Image:
+    left, top, right, bottom = box
+    dx, dy = margin * (right - left), margin * (bottom - top)
+    width, height = img.size
+    return img.crop((max(0, int(left - dx)), max(0, int(top - dy)),
+                     min(width, int(right + dx)), min(height, int(bottom + dy))))
+
+
+class FaceGallery:
+    """
+    Reference embeddings as one L2-normalized (students x dim) float32 matrix,
+    so matching a photo is a single matrix product. Rows are keyed by
+    (name, photo version); persisted to an .npz so restarts don't re-embed.
+    names, versions and matrix are swapped in together as one tuple, so a
+    match running during a sync always sees a consistent set.
+    """
+
+    def __init__(self, path: Optional[str] = LOCAL_FACE_GALLERY_PATH):
+        self.path = path
+        self._rows: Tuple[List[str], List[str], np.ndarray] = ([], [], np.zeros((0, 0), np.float32))
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self._rows = (data["names"].tolist(), data["versions"].tolist(), data["matrix"])
+
+    @property
+    def names(self) -> List[str]:
+        return self._rows[0]
+
+    @property
+    def versions(self) -> List[str]:
+        return self._rows[1]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._rows[2]
+
+    def save(self):
+        if not self.path:
+            return
+        names, versions, matrix = self._rows
+        tmp = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, names=np.array(names), versions=np.array(versions), matrix=matrix)
+        os.replace(tmp, self.path)
+
+    def stale(self, versions: Dict[str, str]) -> List[str]:
+        """Students whose row is missing or was embedded from an older photo."""
+        names, have_versions, _ = self._rows
+        have = dict(zip(names, have_versions))
+        return [name for name, version in versions.items() if have.get(name) != version]
+
+    def replace(self, versions: Dict[str, str], fresh: Dict[str, np.ndarray]):
+        """
+        Keeps rows for students in `versions`, swapping in `fresh` embeddings
+        (stamped with the new version). A kept row keeps the version it was
+        embedded from, so a photo that failed to embed stays stale.
+        """
+        names, old_versions, matrix = self._rows
+        rows = {name: (old_versions[i], matrix[i]) for i, name in enumerate(names) if name in versions}
+        rows.update({name: (versions[name], embedding) for name, embedding in fresh.items()})
+        names = [name for name in versions if name in rows]
+        self._rows = (
+            names,
+            [rows[name][0] for name in names],
+            np.stack([rows[name][1] for name in names]) if names else np.zeros((0, 0), np.float32),
+        )
+
+    def matches(self, queries: np.ndarray, threshold: float) -> Dict[str, float]:
+        """{student_name: best similarity} of matched students, from one consistent snapshot."""
+        names, _, matrix = self._rows
+        best = self._best_similarity(queries, matrix, threshold)
+        return {names[i]: float(best[i]) for i in np.flatnonzero(best >= 0)}
+
+    def best_similarity(self, queries: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Per-student best cosine similarity over the detected faces (-1 = no match).
+        Each face counts only for its single most similar student, and only if
+        that similarity reaches `threshold`.
+        """
+        return self._best_similarity(queries, self.matrix, threshold)
+
+    @staticmethod
+    def _best_similarity(queries: np.ndarray, matrix: np.ndarray, threshold: float) -> np.ndarray:
+        best = np.full(len(matrix), -1.0, np.float32)
+        if not len(queries) or not len(matrix):
+            return best
+        sims = queries @ matrix.T                           # faces x students
+        student = sims.argmax(axis=1)
+        score = sims[np.arange(len(queries)), student]
+        hit = score >= threshold
+        np.maximum.at(best, student[hit], score[hit])
+        return best
+
+
+class LocalFaceAttendance:
+    """
+    Offline attendance with the same sync()/match()/attendance() contract as
+    FaceSearchAttendance. Reference photos are embedded once (again only when a
+    photo version changes); a group photo is one detection pass, one batched
+    embedding of the face crops and one vectorized cosine-similarity pass.
+
+    The detector/embedder default to the ONNX models in config and are loaded
+    on first use; anything with detect(img)/embed(faces) can be plugged in.
+    """
+
+    def __init__(self, detector=None, embedder=None, gallery_path: Optional[str] = LOCAL_FACE_GALLERY_PATH,
+                 threshold: float = LOCAL_FACE_THRESHOLD):
+        self._detector = detector
+        self._embedder = embedder
+        self.gallery = FaceGallery(gallery_path)
+        self.threshold = threshold
+        self._unusable: Dict[str, str] = {}  # name -> version of photos with no usable face
+        self._models_lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+
+    def _models(self):
+        with self._models_lock:
+            if self._detector is None:
+                self._detector = OnnxFaceDetector()
+            if self._embedder is None:
+                self._embedder = OnnxFaceEmbedder()
+        return self._detector, self._embedder
+
+    def _faces(self, image_bytes: bytes) -> Tuple[Image.Image, List[Box]]:
+        # Phone photos are stored sideways with an EXIF Orientation tag; the
+        # detector and embedder both expect the upright image.
+        with Image.open(io.BytesIO(image_bytes)) as raw:
+            img = ImageOps.exif_transpose(raw).convert("RGB")
+        detector, _ = self._models()
+        return img, detector.detect(img)
+
+    def _embed_references(self, photos: Dict[str, bytes]) -> Dict[str, np.ndarray]:
+        _, embedder = self._models()
+        names, faces = [], []
+        for name, data in photos.items():
+            try:
+                img, boxes = self._faces(data)
+            except OSError as e:
+                log.warning(f"Could not read reference photo of {name}: {e}")
+                continue
+            if not boxes:
+                log.warning(f"No face found in reference photo of {name}")
+                continue
+            largest = max(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+            names.append(name)
+            faces.append(crop(img, largest))
+        return dict(zip(names, embedder.embed(faces))) if faces else {}
+
+    async def sync(self, photos: Dict[str, bytes], versions: Dict[str, str]) -> dict:
+        """Embeds new/changed reference photos and drops rows of removed students."""
+        async with self._sync_lock:
+            versions = {name: versions.get(name, "0") for name in photos}
+            stale = [n for n in self.gallery.stale(versions) if self._unusable.get(n) != versions[n]]
+            if not stale and set(self.gallery.names) <= set(versions):
+                return {"embedded": 0, "removed": 0, "unchanged": len(versions)}
+            before = set(self.gallery.names)
+            fresh = await asyncio.to_thread(self._embed_references, {n: photos[n] for n in stale})
+            self.gallery.replace(versions, fresh)
+            self._unusable.update({n: versions[n] for n in stale if n not in fresh})
+            await asyncio.to_thread(self.gallery.save)
+            stats = {"embedded": len(fresh), "removed": len(before - set(versions)),
+                     "unchanged": len(versions) - len(stale), "failed": len(stale) - len(fresh)}
+            log.info(f"Gallery sync: {stats}")
+            return stats
+
+    def _similarities(self, group_bytes: bytes, threshold: Optional[float] = None) -> Dict[str, float]:
+        """{student_name: best similarity} for students matched in the photo."""
+        img, boxes = self._faces(group_bytes)
+        log.info(f"Detected {len(boxes)} faces")
+        _, embedder = self._models()
+        queries = embedder.embed([crop(img, box) for box in boxes]) if boxes else np.zeros((0, 0), np.float32)
+        return self.gallery.matches(queries, self.threshold if threshold is None else threshold)
+
+    async def match(self, group_bytes: bytes, photos: Dict[str, bytes],
+                    threshold: Optional[float] = None) -> Dict[str, float]:
+        """{student_name: best similarity} for students of `photos` found in the photo."""
+        found = await asyncio.to_thread(self._similarities, group_bytes, threshold)
+        return {name: similarity for name, similarity in found.items() if name in photos}
+
+    async def attendance(self, group_bytes: bytes, photos: Dict[str, bytes],
+                         threshold: Optional[float] = None) -> Dict[str, str]:
+        """{student_name: "present"/"absent"} for every student of `photos`."""
+        present = await self.match(group_bytes, photos, threshold)
+        return {name: "present" if name in present else "absent" for name in photos}
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Query, Request, Response
 from uuid import uuid4
 from pdf_processor import extract_text_chunks
 from vector_store import store_documents
@@ -9,28 +9,96 @@ from models import (
     AnswerSheetCorrectionResponse,OcrRequest, LeaderboardChatRequest
 )
 from questionpaper import generate_question_paper
-from firestore11 import store_question_paper, get_question_paper,store_studentmarks
-from StudentLeaderboardVectorStore import fetch_firestore_collection, upload_to_chroma
-from GeminiChatModel import interactive_chat
+from firestore11 import store_question_paper, get_question_paper,store_studentmarks, list_question_paper_ids, store_attendance_session
+from StudentLeaderboardVectorStore import fetch_firestore_collection, upload_to_chroma, LeaderboardVectorSync
+from GeminiChatModel import interactive_chat, summarize_conversation
+from chat_sessions import ChatSessionStore
 
 from ansheetcorrection import (
-    run_ocr_sequential_internal,
+    run_ocr_concurrent_internal,
     merge_ocr_results,
     correct_answers_single_rag
 )
-import os
-import boto3
-import chromadb
-from typing import List
+from typing import List, Optional
+from datetime import date as date_type
 import base64
-from google.cloud import firestore 
-from google.cloud import storage
-from ocr import process_image
+import time
+import clients
+import metrics
+import app_logging
+from ocr import process_image, ocr_cache
+from ocr_layout import page_answers
+from bulk_grading import BulkGradingJob, start_job, get_job as get_bulk_job
+from grading_pipeline import grade_answersheet
+from grading_queue import GradingQueue
+from config import (
+    GRADING_RAG_MODE, LEADERBOARD_CACHE_ENABLED,
+    LEADERBOARD_VECTOR_SYNC, LEADERBOARD_VECTOR_SYNC_DEBOUNCE_S, ATTENDANCE_MODE, CLIENT_WARMUP
+)
+from leaderboard_cache import LeaderboardCache
+from leaderboard_analytics import ANALYTICS_COLLECTION, analytics_view_id
+from leaderboard_router import LeaderboardRouter
+from student_photo_cache import StudentPhotoCache
+from rekognition_client import RekognitionPool
+from face_search import FaceSearchAttendance, CompareFacesAttendance, class_photos, merge_matches
+from local_faces import LocalFaceAttendance
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware 
 import asyncio
-import aioboto3
-app = FastAPI(title="Flat Textbook RAG API")
+from contextlib import asynccontextmanager
+from marks_writer import marks_writer
+from image_preprocess import shutdown_pool as shutdown_preprocess_pool
+
+log = app_logging.get_logger("main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # API clients are built on first use; CLIENT_WARMUP builds some/all of them now
+    if CLIENT_WARMUP:
+        names = None if CLIENT_WARMUP == "all" else [n.strip() for n in CLIENT_WARMUP.split(",") if n.strip()]
+        await asyncio.to_thread(clients.warm_up, names)
+    if LEADERBOARD_CACHE_ENABLED:
+        try:
+            await asyncio.to_thread(leaderboard_cache.start)
+        except Exception as e:
+            log.warning(f"Leaderboard cache not started, reading Firestore directly: {e}")
+    await rekognition.start()
+    # Marks dead-lettered by an earlier run get another try, off the startup path
+    asyncio.get_running_loop().run_in_executor(None, marks_writer.replay_dead_letters)
+    vector_sync = None
+    if LEADERBOARD_VECTOR_SYNC:
+        vector_sync = LeaderboardVectorSync(debounce_s=LEADERBOARD_VECTOR_SYNC_DEBOUNCE_S)
+        vector_sync.start()
+    yield
+    if LEADERBOARD_CACHE_ENABLED:
+        leaderboard_cache.stop()
+    if vector_sync is not None:
+        await asyncio.to_thread(vector_sync.stop)
+    await rekognition.stop()
+    # Shutdown: commit buffered marks before the process exits
+    await asyncio.to_thread(marks_writer.stop)
+    shutdown_preprocess_pool()
+    clients.close_all()
+    app_logging.shutdown()
+
+app = FastAPI(title="Flat Textbook RAG API", lifespan=lifespan)
+grading_queue = GradingQueue()
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Stages timed while handling this request are labeled with its route template
+    endpoint = metrics.route_template(request.app, request.scope)
+    token = metrics.current_endpoint.set(endpoint)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.request_seconds.observe(time.perf_counter() - t0, endpoint, request.method, str(status))
+        metrics.current_endpoint.reset(token)
 
 
 app.add_middleware(
@@ -43,31 +111,31 @@ app.add_middleware(
 
 @app.post("/upload_pdf")
 async def upload_pdf(file: UploadFile = File(...)):
-    print("[main] /upload_pdf")
+    log.info("/upload_pdf")
     if not file.filename.lower().endswith(".pdf"):
-        print("[main] ERROR: non‑PDF")
+        log.warning(f"Rejected non-PDF upload: {file.filename}")
         raise HTTPException(400, "Only PDF allowed")
     name = file.filename.rsplit(".", 1)[0].replace(" ", "_")
     pdf = await file.read()
-    print(f"[main] Read {file.filename} ({len(pdf)} bytes)")
+    log.info(f"Read {file.filename} ({len(pdf)} bytes)")
     chunks = extract_text_chunks(pdf)
     docs = [
         {"id": str(uuid4()), "metadata": {"page_no": c["page_no"], "text": c["text"]}}
         for c in chunks
     ]
     store_documents(name, docs)
-    print(f"[main] Stored {len(docs)} chunks in '{name}'")
+    log.info(f"Stored {len(docs)} chunks in '{name}'")
     return {"message": f"Stored {len(docs)} chunks in '{name}'."}
 
 @app.post("/chat_with_textbook", response_model=ChatResponse)
 async def chat_with_textbook(req: ChatRequest):
-    print("[main] /chat_with_textbook")
+    log.info("/chat_with_textbook")
     emb  = get_embedding(req.prompt)
     pf   = extract_page_filter(req.prompt)
     hits = query_chroma(req.collection_name, emb, page_filter=pf)
     context = "\n\n".join(f"(Page {h['metadata']['page_no']}): {h['text']}" for h in hits)
     ans     = query_gemini(req.prompt, context)
-    print("[main] Returning answer + context")
+    log.info("Returning answer + context")
     return {
         "answer": ans,
         "context_with_pages": [
@@ -77,7 +145,7 @@ async def chat_with_textbook(req: ChatRequest):
 
 @app.post("/generate_question_paper", response_model=QuestionPaperResponse)
 async def create_question_paper(req: QuestionPaperRequest):
-    print("[main] /generate_question_paper")
+    log.info("/generate_question_paper")
     try:
         result = generate_question_paper(
             collection_name=req.collection_name,
@@ -86,10 +154,10 @@ async def create_question_paper(req: QuestionPaperRequest):
         )
         if "error" in result:
             raise HTTPException(400, result["error"])
-        print("[main] Question paper generated successfully")
+        log.info("Question paper generated successfully")
         return result
     except Exception as e:
-        print(f"[main] Error generating question paper: {e}")
+        log.warning(f"Error generating question paper: {e}")
         raise HTTPException(500, f"Failed to generate question paper: {str(e)}")
 
 @app.post("/correct_answersheet", response_model=AnswerSheetCorrectionResponse)
@@ -101,48 +169,111 @@ async def correct_answersheet(
     assignmentid: str = Form(...),
     classgrade: str = Form(...),
     chromadbcollectionname: str = Form(...),
-    correctiontype: str = Form(...)
+    correctiontype: str = Form(...),
+    ragmode: str = Form(GRADING_RAG_MODE)  # "per_question" or "single"
 ):
-    base64_images = [
-        base64.b64encode(await img.read()).decode('utf-8')
-        for img in images
-    ]
-    # Synchronous in-process OCR using the actual OCR ML function
-    ocr_results = await run_ocr_sequential_internal(base64_images, process_image)
-    merged_answers = merge_ocr_results(ocr_results)
-    qp_doc = get_question_paper(questionpaperdocfromfiretore)
-    if not qp_doc:
-        raise HTTPException(404, f"No question paper found with ID: {questionpaperdocfromfiretore}")
-    total, details = correct_answers_single_rag(
-        merged_answers, qp_doc, chromadbcollectionname, correctiontype=correctiontype
-    )
-    resp = {
-        "totalmarks": total,
-        "eachquestion_marks": details,
+    raw_images = [await img.read() for img in images]
+    try:
+        return await grade_answersheet(
+            raw_images, studentid, questionpaperdocfromfiretore, subject,
+            assignmentid, classgrade, chromadbcollectionname, correctiontype, ragmode
+        )
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+
+@app.post("/grading_jobs", status_code=202)
+async def submit_grading_job(
+    images: List[UploadFile] = File(...),
+    studentid: str = Form(...),
+    questionpaperdocfromfiretore: str = Form(...),
+    subject: str = Form(...),
+    assignmentid: str = Form(...),
+    classgrade: str = Form(...),
+    chromadbcollectionname: str = Form(...),
+    correctiontype: str = Form(...),
+    ragmode: str = Form(GRADING_RAG_MODE),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Queues an answer sheet for grading by grading_worker.py and returns a job id
+    straight away. Re-sending the same Idempotency-Key returns the original job.
+    """
+    raw_images = [await img.read() for img in images]
+    payload = {
         "studentid": studentid,
         "questionpaperdocfromfiretore": questionpaperdocfromfiretore,
         "subject": subject,
-        "assignmentid": assignmentid
-        ,"classgrade": classgrade
+        "assignmentid": assignmentid,
+        "classgrade": classgrade,
+        "chromadbcollectionname": chromadbcollectionname,
+        "correctiontype": correctiontype,
+        "ragmode": ragmode,
+    }
+    job, created = await asyncio.to_thread(grading_queue.submit, payload, raw_images, idempotency_key)
+    return {"job_id": job["job_id"], "status": job["status"], "created": created}
+
+@app.get("/grading_jobs/{job_id}")
+async def get_grading_job(job_id: str):
+    job = await asyncio.to_thread(grading_queue.get, job_id)
+    if job is None:
+        raise HTTPException(404, f"No grading job with ID: {job_id}")
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
     }
-    # process_assessment_response(resp)
-    # student_performance_resp= {"totalmarks": total,
-        # "studentid": studentid,
-        # "questionpaperdocfromfiretore": questionpaperdocfromfiretore,
-        # "subject": subject,
-        # "assignmentid": assignmentid
-        # ,"classgrade": classgrade,
-        # "createdtimestamp": firestore.SERVER_TIMESTAMP,}
-    # student_performance(student_performance_resp)
-
-    store_studentmarks(resp)
-    return resp
+
+@app.post("/correct_answersheets_bulk")
+async def correct_answersheets_bulk(
+    images: List[UploadFile] = File(...),
+    studentids: List[str] = Form(...),  # one per image, in page order
+    questionpaperdocfromfiretore: str = Form(...),
+    subject: str = Form(...),
+    assignmentid: str = Form(...),
+    classgrade: str = Form(...),
+    chromadbcollectionname: str = Form(...),
+    correctiontype: str = Form(...)
+):
+    """
+    Grades a whole class for one assignment in the background.
+    Returns a job id; poll /correct_answersheets_bulk/{job_id} for per-student progress.
+    """
+    if len(studentids) != len(images):
+        raise HTTPException(400, f"Got {len(images)} images but {len(studentids)} studentids; send one studentid per image")
+    students = {}
+    for sid, img in zip(studentids, images):
+        students.setdefault(sid, []).append(await img.read())
+    job = start_job(BulkGradingJob(
+        students, questionpaperdocfromfiretore, subject, assignmentid,
+        classgrade, chromadbcollectionname, correctiontype
+    ))
+    return {"job_id": job.job_id, "students": len(students)}
+
+@app.get("/correct_answersheets_bulk/{job_id}")
+async def correct_answersheets_bulk_status(job_id: str):
+    job = get_bulk_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"No bulk grading job with ID: {job_id}")
+    return job.to_dict()
+
+@app.get("/marks_writer/stats")
+async def marks_writer_stats():
+    return marks_writer.stats()
+
+@app.get("/clients/stats")
+async def clients_stats():
+    return clients.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage and per-request latency histograms plus component gauges (Prometheus text format)."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/list_chromadb_collections")
 def list_chromadb_collections():
-    client = chromadb.PersistentClient(path="./chroma_db")
-
-    collections = client.list_collections()
+    collections = clients.chroma.list_collections()
     try:
         collection_names = [col.name for col in collections]
     except AttributeError:
@@ -150,27 +281,33 @@ def list_chromadb_collections():
     return {"collections": collection_names}
 
 @app.get("/list_questionpapers")
-def list_questionpapers():
-    client = firestore.Client()
-    docs = client.collection("questionpaper").stream()
-    papers = [doc.id for doc in docs]
-    return {"questionpapers": papers}
+def list_questionpapers(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="page size; omit for every paper"),
+    start_after: Optional[str] = None
+):
+    """
+    Every question paper id, or one page of them when `limit` is given. A
+    partial page carries next_start_after; pass it back as start_after.
+    """
+    papers, next_start_after = list_question_paper_ids(limit=limit, start_after=start_after)
+    return {"questionpapers": papers, "next_start_after": next_start_after}
 
 # API endpoint
 @app.post("/ocr")
 async def execute_ocr(request: OcrRequest):
     decoded_bytes = base64.b64decode(request.base64)
     result = await process_image(decoded_bytes)
-    return JSONResponse(content=result)
+    # The continuation key only means something when pages are merged
+    return JSONResponse(content=page_answers(result))
 @app.post("/create_ppt", response_model=ChatResponse)
 async def create_ppt(req: ChatRequest):
-    print("[main] /create_ppt")
+    log.info("/create_ppt")
     emb  = get_embedding(req.prompt)
     pf   = extract_page_filter(req.prompt)
     hits = query_chroma(req.collection_name, emb, page_filter=pf)
     context = "\n\n".join(f"(Page {h['metadata']['page_no']}): {h['text']}" for h in hits)
     ans     = query_gemini_ppt(req.prompt, context)
-    print("[main] Returning answer + context")
+    log.info("Returning answer + context")
     return {
         "answer": ans,
         "context_with_pages": [
@@ -184,22 +321,40 @@ async def upload_leaderboard_vector():
     firestore_docs = fetch_firestore_collection("student_leaderboard")
     
     if not firestore_docs:
-        print("No documents found in Firestore collection. Exiting.")
+        log.warning("No documents found in Firestore collection")
         return
     
     # Upload to ChromaDB
     success = upload_to_chroma(firestore_docs)
     
     if success:
-        print("✅ Migration completed successfully!")
+        log.info("Leaderboard migration to ChromaDB completed")
     else:
-        print("❌ Migration failed!")
+        log.warning("Leaderboard migration to ChromaDB failed")
         return {"message": "Migration failed!"}
     return {"message": "Upload process completed."}
 
+chat_sessions = ChatSessionStore()
+metrics.register_collector("chat_sessions", chat_sessions.stats)
+
 @app.post("/chat_with_leaderboard")
 async def chat_with_leaderboard(req: LeaderboardChatRequest):
-    resp = {"answer": await interactive_chat(req.prompt)}
+    """
+    Multi-turn when session_id is sent back: follow-ups ("and her science
+    marks?") resolve against the students the conversation is about.
+    """
+    session = chat_sessions.get(req.session_id)
+    async with session.lock:
+        # Ranking / score / comparison questions are answered straight from the table;
+        # only open-ended ones go through retrieval + Gemini
+        routed = await asyncio.to_thread(leaderboard_router.answer, session.resolve(req.prompt))
+        if routed is not None:
+            log.info(f"Leaderboard chat routed as '{routed.intent}'")
+            session.remember(leaderboard_router.table().records(routed.student_ids), focus=routed.student_ids)
+            await asyncio.to_thread(session.add_turn, req.prompt, routed.answer, summarize_conversation)
+            return {"answer": routed.answer, "session_id": session.session_id}
+        answer = await interactive_chat(req.prompt, session)
+    resp = {"answer": answer, "session_id": session.session_id}
     return resp
 
 
@@ -217,69 +372,38 @@ AWS_CONFIG = {
     'region_name': 'us-east-1'
 }
 
-# Google Cloud Storage client
-storage_client = storage.Client()
+# One pooled Rekognition client for the app's lifetime (started in lifespan)
+rekognition = RekognitionPool(AWS_CONFIG)
+
+# Google Cloud Storage client (shared, built on first use)
+storage_client = clients.storage_client
 BUCKET_NAME = "studentimages1" 
 
-async def download_single_blob_async(blob):
-    """Async download of a single blob"""
-    try:
-        student_name = os.path.splitext(blob.name)[0]
-        # Run the blocking download in thread pool
-        loop = asyncio.get_event_loop()
-        image_bytes = await loop.run_in_executor(
-            None, 
-            blob.download_as_bytes
-        )
-        print(f"   • downloaded {blob.name} → {student_name}")
-        return student_name, image_bytes
-    except Exception as e:
-        print(f"   ⚠️  Error downloading {blob.name}: {e}")
-        return None, None
+# Reference photos are cached locally; only new or re-uploaded ones are downloaded
+student_photos = StudentPhotoCache(
+    clients.LazyClient(f"bucket:{BUCKET_NAME}", lambda: storage_client.bucket(BUCKET_NAME))
+)
+
+# Component stats exported as gauges on /metrics
+metrics.register_collector("student_photos", student_photos.stats)
+metrics.register_collector("marks_writer", marks_writer.stats)
+if ocr_cache is not None:
+    metrics.register_collector("ocr_cache", ocr_cache.stats)
+
+# "search" attendance: reference faces indexed once into a Rekognition collection
+face_search = FaceSearchAttendance(rekognition)
+# "local" attendance: offline ONNX detection + embeddings (models load on first use)
+local_faces = LocalFaceAttendance()
+FACE_ENGINES = {"compare": CompareFacesAttendance(rekognition), "search": face_search, "local": local_faces}
 
 async def get_student_images_from_bucket_async() -> dict:
     """
-    Async version: Download all student images from GCS bucket concurrently
+    {student_name: image bytes} for every reference photo in the GCS bucket,
+    served from the local photo cache after a metadata-only listing.
     """
     try:
-        print("📥  Fetching student list from GCS bucket …")
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-        # Get list of blobs (this is still sync, but fast)
-        blobs = list(bucket.list_blobs())
-        image_blobs = [
-            blob for blob in blobs 
-            if blob.name.lower().endswith((".jpg", ".jpeg", ".png"))
-        ]
-        
-        if not image_blobs:
-            print("   No image files found in bucket")
-            return {}
-        
-        print(f"📁  Found {len(image_blobs)} images, downloading concurrently …")
-        
-        # Download all images concurrently
-        download_tasks = [
-            download_single_blob_async(blob) 
-            for blob in image_blobs
-        ]
-        
-        # Wait for all downloads to complete
-        results = await asyncio.gather(*download_tasks, return_exceptions=True)
-        
-        # Filter out failed downloads and create student dict
-        student_images = {}
-        successful_downloads = 0
-        
-        for result in results:
-            if isinstance(result, tuple) and result[0] and result[1]:
-                student_name, image_bytes = result
-                student_images[student_name] = image_bytes
-                successful_downloads += 1
-            elif isinstance(result, Exception):
-                print(f"   ⚠️  Download exception: {result}")
-        
-        print(f"✅  Successfully downloaded {successful_downloads}/{len(image_blobs)} images\n")
+        student_images = await student_photos.get_all()
+        log.info(f"{len(student_images)} student photos ready {student_photos.stats()}")
         return student_images
 
     except Exception as e:
@@ -290,36 +414,31 @@ async def check_student(group_img: bytes,
                         student_img: bytes,
                         threshold: int = 80) -> tuple:
     """
-    Async call to Rekognition → returns (name, "present"/"absent")
+    Async call to Rekognition → returns (name, "present"/"absent").
+    Runs on the shared client; at most REKOGNITION_CONCURRENCY are in flight.
     """
-    print(f"🔍  Comparing {student_name} …")
-    session = aioboto3.Session()
-    async with session.client("rekognition", **AWS_CONFIG) as rek:
-        try:
-            result = await rek.compare_faces(
-                SourceImage = {"Bytes": student_img},
-                TargetImage = {"Bytes": group_img},
-                SimilarityThreshold = threshold
-            )
-            status = "present" if result["FaceMatches"] else "absent"
-            print(f"   → {student_name}: {status}")
-            return student_name, status
-        except Exception as e:
-            print(f"   ⚠️  {student_name}: error → {e}")
-            return student_name, "absent"
+    try:
+        result = await rekognition.compare_faces(student_img, group_img, threshold)
+        status = "present" if result["FaceMatches"] else "absent"
+        log.debug(f"{student_name}: {status}")
+        return student_name, status
+    except Exception as e:
+        log.warning(f"{student_name}: error → {e}")
+        return student_name, "absent"
 
 # ─── API endpoint ───────────────────────────────────────────────────────────────
 @app.post("/attendance")
-async def mark_attendance(targetimage: UploadFile = File(...)):
+async def mark_attendance(targetimage: UploadFile = File(...), mode: str = Form(ATTENDANCE_MODE)):
     """
     Upload a group photo; returns {"alice": "present", "bob": "absent", …}
-    Now with fully async bucket fetching!
+    mode="compare": one CompareFaces per enrolled student.
+    mode="search": one DetectFaces + one SearchFacesByImage per detected face,
+    against the student face collection (re-indexed only for changed photos).
+    mode="local": offline CPU embeddings, one cosine-similarity pass per photo.
     """
-    print("\n===== New /attendance request =====")
-    
+    if mode not in FACE_ENGINES:
+        raise HTTPException(status_code=400, detail="mode must be 'compare', 'search' or 'local'")
     # Start group image read and bucket fetch concurrently
-    print("🚀  Starting concurrent operations: group image read + bucket fetch")
-    
     group_read_task = targetimage.read()
     bucket_fetch_task = get_student_images_from_bucket_async()
     
@@ -329,12 +448,24 @@ async def mark_attendance(targetimage: UploadFile = File(...)):
         bucket_fetch_task
     )
     
-    print(f"👥  Group image: {targetimage.filename} ({len(group_bytes)//1024} KB)")
+    log.info(f"Group image: {targetimage.filename} ({len(group_bytes)//1024} KB)")
     
     if not students:
         raise HTTPException(status_code=404, detail="No student images in bucket")
 
-    print(f"🎯  Starting face recognition for {len(students)} students …")
+    if mode != "compare":
+        engine = FACE_ENGINES[mode]
+        log.info(f"Matching detected faces against {len(students)} students ({mode})")
+        try:
+            await engine.sync(students, await student_photos.versions())
+            attendance = await engine.attendance(group_bytes, students)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Face {mode} error: {e}")
+        log.info("Attendance done", extra={"mode": mode, "present": sum(s == "present" for s in attendance.values()),
+                                           "students": len(attendance)})
+        return attendance
+
+    log.info(f"Starting face recognition for {len(students)} students")
     
     # Kick off concurrent Rekognition calls
     recognition_tasks = [
@@ -344,30 +475,172 @@ async def mark_attendance(targetimage: UploadFile = File(...)):
     results = await asyncio.gather(*recognition_tasks)
 
     attendance = dict(results)
-    print(f"📊  Final attendance: {attendance}\n")
+    log.info("Attendance done", extra={"mode": mode, "present": sum(s == "present" for s in attendance.values()),
+                                       "students": len(attendance)})
     return attendance
 
+@app.post("/attendance/session")
+async def attendance_session(
+    targetimages: List[UploadFile] = File(...),
+    classgrade: str = Form(...),
+    section: Optional[str] = Form(None),
+    date: Optional[str] = Form(None),  # YYYY-MM-DD, defaults to today
+    mode: str = Form(ATTENDANCE_MODE),
+    persist: bool = Form(True),
+):
+    """
+    Several group photos of one class (e.g. one per row of a large classroom).
+    Reference photos are fetched and synced once, all photos are matched
+    concurrently, and a student is present if found in any photo (with their
+    best similarity). Only students of classgrade (and section, if given) on the
+    leaderboard are enrolled. The result is stored per class and date unless
+    persist=false.
+    """
+    if mode not in FACE_ENGINES:
+        raise HTTPException(status_code=400, detail="mode must be 'compare', 'search' or 'local'")
+    try:
+        session_date = date_type.fromisoformat(date).isoformat() if date else date_type.today().isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    log.info(f"Attendance session: {classgrade} {section or ''} {session_date}, {len(targetimages)} photos")
+
+    photos, students, roster = await asyncio.gather(
+        asyncio.gather(*(image.read() for image in targetimages)),
+        get_student_images_from_bucket_async(),
+        asyncio.to_thread(_leaderboard_docs),
+    )
+    if not students:
+        raise HTTPException(status_code=404, detail="No student images in bucket")
+    enrolled = class_photos(students, roster, classgrade, section)
+    if not enrolled:
+        raise HTTPException(status_code=404, detail=f"No student photos for {classgrade} {section or ''}".strip())
+    versions = await student_photos.versions()  # reuses the listing get_all just made
+
+    engine = FACE_ENGINES[mode]
+    try:
+        # The collection / gallery holds every student; matching is limited to this class
+        await engine.sync(students, versions)
+        per_photo = await asyncio.gather(*(engine.match(photo, enrolled) for photo in photos))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Face {mode} error: {e}")
+    records = merge_matches(per_photo, enrolled.keys())
+
+    session_id = None
+    if persist:
+        meta = {"mode": mode, "photo_count": len(photos), "photos": [image.filename for image in targetimages]}
+        try:
+            session_id = await asyncio.to_thread(
+                store_attendance_session, classgrade, session_date, records, section, meta
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error storing attendance: {e}")
+
+    present = sum(1 for r in records.values() if r["status"] == "present")
+    log.info(f"Session attendance: {present}/{len(records)} present across {len(photos)} photos")
+    return {
+        "session_id": session_id,
+        "classgrade": classgrade,
+        "section": section,
+        "date": session_date,
+        "photos": len(photos),
+        "present_count": present,
+        "attendance": {name: r["status"] for name, r in records.items()},
+        "students": records,
+    }
+
 @app.get("/students")
 async def list_students():
     """Get list of all students in the bucket"""
     try:
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blobs = bucket.list_blobs()
-        
-        students = []
-        for blob in blobs:
-            if blob.name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                student_name = os.path.splitext(blob.name)[0]
-                students.append(student_name)
-        
+        students = await student_photos.list_names()
         return {"students": students, "total": len(students)}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing students: {str(e)}") 
     
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "sahayak-d88d3-2e1f13a7b2bc.json"    
-db = firestore.Client()
+db = clients.firestore_db
+leaderboard_cache = LeaderboardCache(db)
+
+def _leaderboard_docs():
+    if leaderboard_cache.ready:
+        return leaderboard_cache.all()
+    with metrics.timed("firestore_read", "student_leaderboard"):
+        return [doc.to_dict() for doc in db.collection('student_leaderboard').stream()]
+
+# Rebuilt whenever the snapshot cache publishes a new version (or every minute without it)
+leaderboard_router = LeaderboardRouter(
+    _leaderboard_docs,
+    version=lambda: leaderboard_cache.etag if leaderboard_cache.ready else None
+)
+
 @app.get("/leaderboard")
-async def get_leaderboard():
-    students = db.collection('student_leaderboard').order_by('rank').stream()
-    return [student.to_dict() for student in students]
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="page size; omit for the whole leaderboard"),
+    start_after: Optional[int] = Query(None, description="rank of the last student on the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated fields to return, e.g. student_name,percentage")
+):
+    """
+    The leaderboard ordered by rank: every student, or one page when `limit`
+    is given. A page that may be followed by more carries the next cursor in
+    the X-Next-Start-After header.
+    Served from the snapshot-listener cache when it is live, with ETag /
+    If-None-Match support; falls back to a Firestore query otherwise.
+    """
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+    if leaderboard_cache.ready:
+        etag = leaderboard_cache.etag
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in {tag.strip() for tag in if_none_match.split(",")} or if_none_match.strip() == "*":
+            return Response(status_code=304, headers={"ETag": etag})
+        students, next_start_after = leaderboard_cache.page(limit, start_after, selected)
+        response.headers["ETag"] = etag
+        if next_start_after is not None:
+            response.headers["X-Next-Start-After"] = str(next_start_after)
+        return students
+
+    query = db.collection('student_leaderboard').order_by('rank')
+    if selected:
+        query = query.select(sorted(set(selected) | {"rank"}))
+    if start_after is not None:
+        query = query.start_after({"rank": start_after})
+    if limit is not None:
+        query = query.limit(limit)
+    with metrics.timed("firestore_read", "student_leaderboard"):
+        students = [student.to_dict() for student in query.stream()]
+    if limit is not None and len(students) == limit:
+        response.headers["X-Next-Start-After"] = str(students[-1]["rank"])
+    return students
+
+@app.get("/leaderboard/analytics")
+async def get_leaderboard_analytics(
+    class_name: Optional[str] = Query(None, description="e.g. 10th Standard; omit for the whole school"),
+    section: Optional[str] = Query(None, description="requires class_name"),
+    metric: Optional[str] = Query(None, description="e.g. maths_marks or all_subject_marks; omit for all")
+):
+    """
+    Precomputed stats (mean, median, percentiles, pass rate, histogram, top-N)
+    for a section, a class or everyone. Reads one materialized view doc,
+    kept current on every marks update; student docs are never scanned.
+    """
+    if section and not class_name:
+        raise HTTPException(status_code=400, detail="section requires class_name")
+    with metrics.timed("firestore_read", ANALYTICS_COLLECTION):
+        doc = db.collection(ANALYTICS_COLLECTION).document(analytics_view_id(class_name, section)).get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="No analytics for that class/section")
+    view = doc.to_dict()
+    if metric:
+        if metric not in view["metrics"]:
+            raise HTTPException(status_code=400, detail=f"Unknown metric '{metric}'")
+        view["metrics"] = {metric: view["metrics"][metric]}
+    return view
+
+@app.get("/leaderboard/analytics/views")
+async def list_leaderboard_analytics_views():
+    """Every available analytics view (class, section, student count)."""
+    query = db.collection(ANALYTICS_COLLECTION).select(["class", "section", "student_count", "updated_at"])
+    with metrics.timed("firestore_read", ANALYTICS_COLLECTION):
+        return [{"view_id": doc.id, **doc.to_dict()} for doc in query.stream()]
@@ -0,0 +1,260 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from firestore11 import store_studentmarks_batch
+from config import (
+    MARKS_FLUSH_BATCH_SIZE, MARKS_FLUSH_INTERVAL_S, MARKS_QUEUE_MAX, MARKS_FLUSH_RETRIES, MARKS_DEAD_LETTER_PATH,
+)
+from app_logging import get_logger
+
+log = get_logger("marks_writer")
+
+
+class MarksDeadLetter:
+    """
+    SQLite store for results that could not be written after every retry, so
+    they survive a restart and can be replayed instead of being lost.
+    The file is only created when the first result is dead-lettered.
+    """
+
+    def __init__(self, path: str = MARKS_DEAD_LETTER_PATH):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with sqlite3.connect(self.path, timeout=30) as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS marks_dead_letter ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                    " studentid TEXT,"
+                    " response TEXT NOT NULL,"
+                    " error TEXT,"
+                    " created_at REAL NOT NULL)"
+                )
+            self._ready = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, items: List[dict], error: str):
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO marks_dead_letter (studentid, response, error, created_at) VALUES (?, ?, ?, ?)",
+                    [(r.get("studentid"), json.dumps(r, default=str), error, now) for r in items],
+                )
+        finally:
+            conn.close()
+
+    def pending(self, limit: int) -> List[tuple]:
+        """Oldest dead-lettered results as (id, response) pairs."""
+        if not os.path.exists(self.path):
+            return []
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, response FROM marks_dead_letter ORDER BY id LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [(row_id, json.loads(response)) for row_id, response in rows]
+
+    def remove(self, ids: List[int]):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM marks_dead_letter WHERE id = ?", [(i,) for i in ids])
+        finally:
+            conn.close()
+
+    def count(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM marks_dead_letter").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class MarksWriteBehind:
+    """
+    Write-behind buffer for student marks. enqueue() returns immediately; a
+    background thread commits buffered results with batched writes whenever
+    max_batch results are waiting or max_delay_s has passed since the first one.
+    Results that still fail after `retries` attempts go to the dead-letter store;
+    once stop() has been called, enqueue() writes synchronously instead.
+    """
+
+    def __init__(self, max_batch: int = MARKS_FLUSH_BATCH_SIZE, max_delay_s: float = MARKS_FLUSH_INTERVAL_S,
+                 max_queue: int = MARKS_QUEUE_MAX, retries: int = MARKS_FLUSH_RETRIES,
+                 dead_letter: Optional[MarksDeadLetter] = None):
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self.retries = retries
+        self.dead_letter = dead_letter or MarksDeadLetter()
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # metrics
+        self.enqueued_total = 0
+        self.written_total = 0
+        self.dropped_total = 0
+        self.dead_lettered_total = 0
+        self.flushes_total = 0
+        self.last_flush_latency_s = 0.0
+        self.max_flush_latency_s = 0.0
+        self._flush_latency_sum = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="marks-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, response: dict):
+        """
+        Buffers a correction response; blocks only if MARKS_QUEUE_MAX results are already waiting.
+        After stop() the response is written before returning.
+        """
+        self.enqueued_total += 1
+        if self._stop.is_set():
+            self._write([dict(response)])
+            return
+        self._ensure_started()
+        self._queue.put(dict(response))
+        self._after_put()
+
+    def try_enqueue(self, response: dict) -> bool:
+        """
+        Buffers a correction response without blocking; False if MARKS_QUEUE_MAX results
+        are waiting or the writer has been stopped (use enqueue() off the event loop then).
+        """
+        if self._stop.is_set():
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(dict(response))
+        except queue.Full:
+            return False
+        self.enqueued_total += 1
+        self._after_put()
+        return True
+
+    def _after_put(self):
+        # stop() may have run its final flush between the _stop check and the put;
+        # nothing else would drain the queue then, so write it here.
+        if self._stop.is_set():
+            self.flush()
+
+    def _drain(self, first: dict) -> List[dict]:
+        items = [first]
+        deadline = time.monotonic() + self.max_delay_s
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items: List[dict]):
+        with self._flush_lock:
+            error = None
+            for attempt in range(1, self.retries + 1):
+                t0 = time.perf_counter()
+                try:
+                    store_studentmarks_batch(items)
+                except Exception as e:
+                    error = str(e)
+                    log.warning(f"Flush of {len(items)} failed (attempt {attempt}/{self.retries}): {e}")
+                    if attempt < self.retries:
+                        time.sleep(min(2 ** attempt, 30))
+                    continue
+                latency = time.perf_counter() - t0
+                self.flushes_total += 1
+                self.written_total += len(items)
+                self.last_flush_latency_s = latency
+                self.max_flush_latency_s = max(self.max_flush_latency_s, latency)
+                self._flush_latency_sum += latency
+                return
+            studentids = [r.get('studentid') for r in items]
+            try:
+                self.dead_letter.add(items, error)
+            except Exception as e:
+                self.dropped_total += len(items)
+                log.error(f"Dropping {len(items)} results after {self.retries} failed flushes "
+                          f"(dead-letter store unavailable: {e}): {studentids}")
+                return
+            self.dead_lettered_total += len(items)
+            log.error(f"Dead-lettered {len(items)} results after {self.retries} failed flushes: {studentids}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self):
+        """Synchronously writes everything currently buffered."""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(items), self.max_batch):
+            self._write(items[i:i + self.max_batch])
+
+    def replay_dead_letters(self) -> int:
+        """Retries dead-lettered results once each; returns how many were written."""
+        replayed = 0
+        while True:
+            rows = self.dead_letter.pending(self.max_batch)
+            if not rows:
+                return replayed
+            try:
+                store_studentmarks_batch([response for _, response in rows])
+            except Exception as e:
+                log.warning(f"Replay of {len(rows)} dead-lettered results failed: {e}")
+                return replayed
+            self.dead_letter.remove([row_id for row_id, _ in rows])
+            self.written_total += len(rows)
+            replayed += len(rows)
+
+    def stop(self, timeout: float = 30.0):
+        """Shutdown hook: stops the background thread and flushes what is left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        log.info(f"Stopped ({self.written_total} written, {self.dead_lettered_total} dead-lettered, "
+                 f"{self.dropped_total} dropped)")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued_total": self.enqueued_total,
+            "written_total": self.written_total,
+            "dropped_total": self.dropped_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "flushes_total": self.flushes_total,
+            "last_flush_latency_s": round(self.last_flush_latency_s, 4),
+            "max_flush_latency_s": round(self.max_flush_latency_s, 4),
+            "avg_flush_latency_s": round(self._flush_latency_sum / self.flushes_total, 4) if self.flushes_total else 0.0,
+        }
+
+
+marks_writer = MarksWriteBehind()
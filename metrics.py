@@ -0,0 +1,200 @@
+"""
+Per-stage latency histograms, exported in the Prometheus text format on /metrics.
+
+Hot paths wrap their external calls in `with metrics.timed(stage, collection):`.
+Observations are labeled with the stage, the endpoint of the request they ran
+under (a context variable set by the HTTP middleware in main.py; "background"
+outside requests) and a collection (Chroma/Firestore collection, model name or
+Rekognition operation). Stats of in-process components (OCR cache, marks writer,
+...) are exported as gauges through register_collector().
+
+The registry is per process: grading_worker.py processes serve their own
+/metrics with serve() (GRADING_WORKER_METRICS_PORT) and are scraped separately.
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app_logging import get_logger
+
+# embed | chroma_query | llm_generate | ocr | firestore_read | firestore_write | rekognition
+STAGES = ("embed", "chroma_query", "llm_generate", "ocr", "firestore_read", "firestore_write", "rekognition")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+current_endpoint: contextvars.ContextVar = contextvars.ContextVar("endpoint", default="background")
+
+log = get_logger("metrics")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values; observe() is a dict lookup and a few adds."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float] = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> [bucket counts..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {int(count)}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, inf)} {int(series[-2])}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {int(series[-2])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}" for labels, value in items]
+        return lines
+
+
+stage_seconds = Histogram("app_stage_duration_seconds", "Latency of one external call by stage.",
+                          ("stage", "endpoint", "collection"))
+stage_errors = Counter("app_stage_errors_total", "Stage calls that raised.", ("stage", "endpoint", "collection"))
+request_seconds = Histogram("app_request_duration_seconds", "HTTP request latency.", ("endpoint", "method", "status"))
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(prefix: str, stats: Callable[[], dict]):
+    """Exports the numeric values of stats() as gauges app_<prefix>_<key> on every scrape."""
+    _collectors[prefix] = stats
+
+
+@contextmanager
+def timed(stage: str, collection: str = ""):
+    """Times the block into app_stage_duration_seconds{stage, endpoint, collection}."""
+    endpoint = current_endpoint.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage, endpoint, collection or "")
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        stage_seconds.observe(elapsed, stage, endpoint, collection or "")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("stage", extra={"stage": stage, "endpoint": endpoint, "collection": collection,
+                                      "duration_ms": round(elapsed * 1000, 2)})
+
+
+def in_context(fn: Callable) -> Callable:
+    """
+    fn bound to the caller's context, for thread pools that don't copy it
+    (run_in_executor, ThreadPoolExecutor.map), so stages keep their endpoint.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
+
+
+def route_template(app, scope) -> str:
+    """The matched route's path template (/bulk_grading/{job_id}), keeping label cardinality bounded."""
+    from starlette.routing import Match
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+def _gauges() -> List[str]:
+    lines = []
+    for prefix, stats in sorted(_collectors.items()):
+        try:
+            values = stats()
+        except Exception as e:
+            log.warning(f"Stats collector {prefix} failed: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)) or (isinstance(value, float) and math.isnan(value)):
+                continue
+            name = f"app_{prefix}_{key}"
+            lines += [f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+    return lines
+
+
+def render() -> str:
+    lines = stage_seconds.render() + stage_errors.render() + request_seconds.render() + _gauges()
+    return "\n".join(lines) + "\n"
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves render() on GET /metrics from a daemon thread (for processes without the API app)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    log.info(f"Serving /metrics on port {server.server_port}")
+    return server
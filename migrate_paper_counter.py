@@ -0,0 +1,18 @@
+"""
+One-off migration: seed the question paper id counter from existing 'paper-N' ids.
+
+    python migrate_paper_counter.py
+
+Run it once before deploying the counter-based id allocation (store_question_paper
+also seeds lazily on first use). Re-running is harmless; the counter never decreases.
+"""
+from firestore11 import client, seed_doc_id_counter
+
+
+def main():
+    last = seed_doc_id_counter("paper", client.collection("questionpaper"))
+    print(f"Next question paper id will be paper-{last + 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ class ChatRequest(BaseModel):
 
 class LeaderboardChatRequest(BaseModel):
     prompt: str
+    session_id: Optional[str] = None  # reuse to continue a conversation
 
 class ChatResponse(BaseModel):
     answer: str
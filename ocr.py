@@ -1,63 +1,79 @@
+import asyncio
 import base64
-import re
+from concurrent.futures import ThreadPoolExecutor
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import vision
 from google.cloud.vision_v1 import AnnotateImageResponse
 from google.oauth2 import service_account
 from models import OcrRequest
+from config import OCR_MAX_WORKERS, VISION_API_ENDPOINT, OCR_CACHE_ENABLED
+from ocr_cache import OcrCache
+import clients
+import metrics
+from app_logging import get_logger
+import ocr_layout
 
-# Auth
-credentials = service_account.Credentials.from_service_account_file(
-    "visionJson.json",
-    scopes=["https://www.googleapis.com/auth/cloud-vision"]
-)
+LANGUAGE_HINTS = ["en-t-i0-handwrit"]
 
-client = vision.ImageAnnotatorClient(credentials=credentials)
+log = get_logger("ocr")
+
+def _make_client() -> vision.ImageAnnotatorClient:
+    if VISION_API_ENDPOINT:
+        # Local/fake Vision server: plain REST, no auth
+        log.info(f"Using Vision endpoint: {VISION_API_ENDPOINT}")
+        return vision.ImageAnnotatorClient(
+            credentials=AnonymousCredentials(),
+            transport="rest",
+            client_options={"api_endpoint": VISION_API_ENDPOINT},
+        )
+    # Auth
+    credentials = service_account.Credentials.from_service_account_file(
+        "visionJson.json",
+        scopes=["https://www.googleapis.com/auth/cloud-vision"]
+    )
+    return vision.ImageAnnotatorClient(credentials=credentials)
+
+# Built on first OCR call, so a missing visionJson.json only fails OCR requests
+client = clients.lazy_client("vision", _make_client, lambda c: c.transport.close())
+
+# document_text_detection is a blocking round trip; run it off the event loop
+# on a bounded pool so multi-page sheets overlap without unbounded fan-out.
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS, thread_name_prefix="ocr")
+
+# Re-submitted pages (retries, a changed correctiontype) skip Vision entirely
+ocr_cache = OcrCache() if OCR_CACHE_ENABLED else None
 
 # Text extraction utility
 async def extract_answers(ocr_text: str) -> dict:
-    lines = ocr_text.split('\n')
-    answers = {}
-    current_q = None
-    current_answer = []
-
-    question_pattern = re.compile(r'^(?:Q(?:uestion)?\.?\s*)?(\d+)[\.\)]?\s*')
-
-    for line in lines:
-        q_match = question_pattern.match(line.strip())
-        if q_match:
-            if current_q is not None:
-                answers[current_q] = ' '.join(current_answer).strip()
-                current_answer = []
-            current_q = q_match.group(1)
-            line = question_pattern.sub('', line).strip()
-            if line:
-                current_answer.append(line)
-        else:
-            if current_q and line.strip():
-                current_answer.append(line.strip())
-    
-    if current_q:
-        answers[current_q] = ' '.join(current_answer).strip()
-    return answers
+    return ocr_layout.extract_answers(ocr_text)
+
+def _detect_document_text(byte_array: bytes) -> AnnotateImageResponse:
+    image = vision.Image(content=byte_array)
+    with metrics.timed("ocr", "document_text_detection"):
+        return client.document_text_detection(
+            image=image,
+            image_context={"language_hints": LANGUAGE_HINTS}
+        )
 
 # OCR logic
 async def process_image(byte_array: bytes) -> dict:
-    image = vision.Image(content=byte_array)
-    response: AnnotateImageResponse = client.document_text_detection(
-        image=image,
-        image_context={"language_hints": ["en-t-i0-handwrit"]}
+    cache_key = None
+    if ocr_cache is not None:
+        cache_key = OcrCache.make_key(byte_array, LANGUAGE_HINTS)
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            log.info(f"Cache hit {cache_key[:12]} (hit rate {ocr_cache.stats()['hit_rate']:.0%})")
+            return cached
+
+    loop = asyncio.get_running_loop()
+    response: AnnotateImageResponse = await loop.run_in_executor(
+        _ocr_executor, metrics.in_context(_detect_document_text), byte_array
     )
 
-    annotation = response.full_text_annotation
-    full_text = ""
-    for page in annotation.pages:
-        for block in page.blocks:
-            for paragraph in block.paragraphs:
-                paragraph_text = ''
-                for word in paragraph.words:
-                    word_text = ''.join([symbol.text for symbol in word.symbols])
-                    paragraph_text += word_text + ' '
-                full_text += "\n" + paragraph_text
-
-    return await extract_answers(full_text)
+    full_text = ocr_layout.annotation_to_text(response.full_text_annotation)
+    answers = await extract_answers(full_text)
+    # Never cache a failed call as an empty page
+    if cache_key is not None and not response.error.message:
+        ocr_cache.put(cache_key, answers)
+    return answers
 
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from config import OCR_CACHE_PATH, OCR_CACHE_MAX_ENTRIES
+from app_logging import get_logger
+
+log = get_logger("ocr_cache")
+
+# Bump whenever the shape of process_image's result changes so old entries miss.
+OCR_CACHE_SCHEMA = 2
+
+class OcrCache:
+    """
+    Disk-backed OCR result cache keyed by sha256(image bytes + language hints).
+    Stored in SQLite; least-recently-used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, path: str = OCR_CACHE_PATH, max_entries: int = OCR_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_lru ON ocr_cache(last_access)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        log.info(f"Opened {path} ({self._count} entries, max {max_entries})")
+
+    @staticmethod
+    def make_key(byte_array: bytes, language_hints: List[str]) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{OCR_CACHE_SCHEMA}|{','.join(language_hints)}|".encode())
+        h.update(byte_array)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        payload = json.dumps(result)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO ocr_cache (key, result, last_access) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            if cur.rowcount == 1:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Other worker processes share the file, so re-count before trimming
+        self._count = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        overflow = self._count - self.max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM ocr_cache WHERE key IN "
+            "(SELECT key FROM ocr_cache ORDER BY last_access ASC LIMIT ?)",
+            (overflow,),
+        )
+        self._count -= overflow
+        log.info(f"Evicted {overflow} least-recently-used entries")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+        }
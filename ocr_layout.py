@@ -0,0 +1,79 @@
+import re
+from typing import Dict, List
+
+from app_logging import get_logger
+
+log = get_logger("ocr_layout")
+
+question_pattern = re.compile(r'^(?:Q(?:uestion)?\.?\s*)?(\d+)[\.\)]?\s*')
+
+# Key for text that appears on a page before its first question marker: it is
+# the tail of the answer that was being written at the end of the previous page.
+CONTINUATION_KEY = "_continuation"
+
+def annotation_to_text(annotation) -> str:
+    """
+    Single pass over Vision's page/block/paragraph/word structure.
+    One line per paragraph, built with list joins.
+    """
+    lines = []
+    for page in annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                lines.append(" ".join([
+                    "".join([symbol.text for symbol in word.symbols]) for word in paragraph.words
+                ]))
+    return "\n".join(lines)
+
+def extract_answers(ocr_text: str) -> Dict[str, str]:
+    """
+    Splits one page of OCR text into {question_no: answer}. Text before the first
+    question marker goes under CONTINUATION_KEY. The last key is always the
+    question still open at the bottom of the page.
+    """
+    parts: Dict[str, List[str]] = {}
+    current_q = CONTINUATION_KEY
+
+    for raw_line in ocr_text.split('\n'):
+        line = raw_line.strip()
+        if not line:
+            continue
+        q_match = question_pattern.match(line)
+        if q_match:
+            current_q = q_match.group(1)
+            # A question revisited later on the page moves to the end so that
+            # "last key" stays "currently open question"
+            parts[current_q] = parts.pop(current_q, [])
+            line = question_pattern.sub('', line).strip()
+        if line:
+            parts.setdefault(current_q, []).append(line)
+        elif current_q != CONTINUATION_KEY:
+            parts.setdefault(current_q, [])
+
+    return {q: ' '.join(lines) for q, lines in parts.items()}
+
+def merge_page_answers(results: List[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Merges per-page answers in page order. Continuation text is appended to the
+    question open at the end of the previous page, and a question that shows up
+    on several pages is concatenated rather than overwritten.
+    """
+    merged: Dict[str, List[str]] = {}
+    current_q = None
+    for page_no, result in enumerate(results, 1):
+        for qno, text in result.items():
+            if qno == CONTINUATION_KEY:
+                if current_q is None:
+                    log.info(f"Page {page_no}: dropping text before the first question")
+                elif text:
+                    merged[current_q].append(text)
+                continue
+            merged.setdefault(qno, [])
+            if text:
+                merged[qno].append(text)
+            current_q = qno
+    return {q: ' '.join(texts) for q, texts in merged.items()}
+
+def page_answers(result: Dict[str, str]) -> Dict[str, str]:
+    """One page on its own (the /ocr endpoint): text before the first question is dropped."""
+    return {q: text for q, text in result.items() if q != CONTINUATION_KEY}
@@ -1,19 +1,24 @@
 import re
 import json
 from typing import List, Dict, Any, Optional
-from google import genai
+import clients
+from app_logging import get_logger
 from google.genai import types
-from config import GENERATION_MODEL
+from config import (
+    GENERATION_MODEL, GRADING_CONTEXT_PER_QUESTION,
+    GRADING_PRECOMPUTE_CONTEXT, GRADING_PRECOMPUTE_RUBRIC
+)
 from search_engine import get_embedding, query_chroma
 from uuid import uuid4
 from firestore11 import store_question_paper
+from ansheetcorrection import rag_search_per_question
 
 
-print("[questionpaper] Configuring Gemini client...")
-client = genai.Client()
+client = clients.genai_client()  # shared, built on first use
+log = get_logger("questionpaper")
 
 def extract_question_requirements(prompt: str) -> Dict[str, Any]:
-    print(f"[questionpaper] Parsing prompt: {prompt}")
+    log.info(f"Parsing prompt: {prompt}")
     requirements = {
         "total_marks": 20,
         "page_range": None,
@@ -47,7 +52,7 @@ def extract_question_requirements(prompt: str) -> Dict[str, Any]:
         else:
             requirements["mark_distribution"] = [2, 3, 5, 10, 15]
 
-    print(f"[questionpaper] Extracted requirements: {requirements}")
+    log.info(f"Extracted requirements: {requirements}")
     return requirements
 
 def create_mark_allocation(total_marks: int, mark_types: List[int]) -> List[Dict[str, int]]:
@@ -71,7 +76,7 @@ def create_mark_allocation(total_marks: int, mark_types: List[int]) -> List[Dict
                 "count": num_questions
             })
             remaining_marks -= (mark_value * num_questions)
-    print(f"[questionpaper] Mark allocation: {allocation}")
+    log.info(f"Mark allocation: {allocation}")
     return allocation
 
 def extract_json_from_response(response_text: str) -> List[Dict[str, Any]]:
@@ -95,12 +100,12 @@ def extract_json_from_response(response_text: str) -> List[Dict[str, Any]]:
     try:
         return json.loads(json_str)
     except Exception as e:
-        print(f"[questionpaper] Error decoding JSON: {e}")
+        log.error(f"Error decoding JSON: {e}")
         return []
 
 def generate_questions_for_content(content: str, requirements: Dict[str, Any],
                                  mark_allocation: List[Dict[str, int]]) -> List[Dict[str, Any]]:
-    print("[questionpaper] Generating questions with Gemini...")
+    log.info("Generating questions with Gemini...")
 
     difficulty_map = {
         "easy": "simple, straightforward questions that test basic understanding",
@@ -153,14 +158,14 @@ Return only the JSON array, no other text.
         response_text = resp.text.strip()
         questions = extract_json_from_response(response_text)
         if questions:
-            print(f"[questionpaper] Generated {len(questions)} questions")
+            log.info(f"Generated {len(questions)} questions")
             return questions
 
     except Exception as e:
-        print(f"[questionpaper] Error generating questions: {e}")
+        log.error(f"Error generating questions: {e}")
 
     # Fallback
-    print("[questionpaper] Using fallback questions.")
+    log.warning("Using fallback questions.")
     fallback_questions = []
     question_num = 1
     for alloc in mark_allocation:
@@ -174,9 +179,43 @@ Return only the JSON array, no other text.
             question_num += 1
     return fallback_questions
 
+def attach_rubric_points(questions: List[Dict[str, Any]], question_contexts: Dict[str, List[str]]):
+    """Asks Gemini for marking points per question (one call) and stores them as q["rubric"]."""
+    log.info("Generating rubric points with Gemini...")
+    blocks = []
+    for q in questions:
+        qno = str(q["question_no"])
+        context = "\n".join(question_contexts.get(qno, []))
+        blocks.append(f"Question {qno} [{q.get('marks', 0)} marks]: {q.get('question', '')}\nContext:\n{context}")
+
+    system_prompt = """You are an expert examiner writing a marking scheme.
+For each question list the key points a full-marks answer must contain, roughly one point per mark.
+Return ONLY a valid JSON array with this exact structure:
+[
+    {"question_no": 1, "points": ["point one", "point two"]}
+]
+"""
+    try:
+        resp = client.models.generate_content(
+            model=GENERATION_MODEL,
+            config=types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                temperature=0.0
+            ),
+            contents="\n\n".join(blocks)
+        )
+        rubric = {str(r.get("question_no")): r.get("points", []) for r in extract_json_from_response(resp.text.strip())}
+    except Exception as e:
+        log.error(f"Error generating rubric points: {e}")
+        return
+    for q in questions:
+        points = rubric.get(str(q["question_no"]))
+        if points:
+            q["rubric"] = [str(p) for p in points]
+
 def generate_question_paper(collection_name: str, user_prompt: str,
                             paper_type: str = "medium") -> Dict[str, Any]:
-    print(f"[questionpaper] Generating paper for: {user_prompt}")
+    log.info(f"Generating paper for: {user_prompt}")
 
     requirements = extract_question_requirements(user_prompt)
     requirements["paper_type"] = paper_type
@@ -210,6 +249,21 @@ def generate_question_paper(collection_name: str, user_prompt: str,
     for i, q in enumerate(questions, 1):
         q["question_no"] = i
 
+    # Grading reuses these instead of searching the collection for every sheet
+    grading_context = None
+    if GRADING_PRECOMPUTE_CONTEXT:
+        try:
+            question_contexts = rag_search_per_question(questions, collection_name)
+            grading_context = {
+                "collection_name": collection_name,
+                "top_k": GRADING_CONTEXT_PER_QUESTION,
+                "questions": question_contexts,
+            }
+            if GRADING_PRECOMPUTE_RUBRIC:
+                attach_rubric_points(questions, question_contexts)
+        except Exception as e:
+            log.warning(f"Could not precompute grading context: {e}")
+
     question_paper_id = str(uuid4())
 
     question_paper = {
@@ -236,6 +290,8 @@ def generate_question_paper(collection_name: str, user_prompt: str,
         "question_paper": question_paper,
         "sources": sources
     }
+    if grading_context:
+        response["grading_context"] = grading_context
     store_question_paper(response)
 
     return response
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Optional
+
+import aioboto3
+from aiobotocore.config import AioConfig
+
+import metrics
+from app_logging import get_logger
+from config import (
+    REKOGNITION_ENDPOINT_URL, REKOGNITION_MAX_POOL_CONNECTIONS,
+    REKOGNITION_CONCURRENCY, REKOGNITION_MAX_ATTEMPTS
+)
+
+log = get_logger("rekognition")
+
+
+class RekognitionPool:
+    """
+    One app-lifetime Rekognition client (one HTTPS connection pool of
+    max_pool_connections) shared by every request, with at most `concurrency`
+    calls in flight. start()/stop() are called from the FastAPI lifespan; the
+    first call starts it lazily if that didn't happen (scripts, workers).
+    """
+
+    def __init__(self, aws_config: dict, endpoint_url: Optional[str] = REKOGNITION_ENDPOINT_URL,
+                 max_pool_connections: int = REKOGNITION_MAX_POOL_CONNECTIONS,
+                 concurrency: int = REKOGNITION_CONCURRENCY, max_attempts: int = REKOGNITION_MAX_ATTEMPTS):
+        self.aws_config = aws_config
+        self.endpoint_url = endpoint_url
+        self.max_pool_connections = max_pool_connections
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.client = None
+        self._client_cm = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self.client is not None:
+                return
+            config = AioConfig(
+                max_pool_connections=self.max_pool_connections,
+                retries={"max_attempts": self.max_attempts, "mode": "adaptive"},
+            )
+            self._client_cm = aioboto3.Session().client(
+                "rekognition", config=config, endpoint_url=self.endpoint_url, **self.aws_config
+            )
+            self.client = await self._client_cm.__aenter__()
+            self._sem = asyncio.Semaphore(self.concurrency)
+            log.info(f"Client ready (pool={self.max_pool_connections}, concurrency={self.concurrency})")
+
+    async def stop(self):
+        if self._client_cm is not None:
+            await self._client_cm.__aexit__(None, None, None)
+        self.client = self._client_cm = self._sem = None
+
+    async def call(self, operation: str, **kwargs) -> dict:
+        """Runs one Rekognition API call under the concurrency limit."""
+        if self.client is None:
+            await self.start()
+        async with self._sem:
+            with metrics.timed("rekognition", operation):
+                return await getattr(self.client, operation)(**kwargs)
+
+    async def compare_faces(self, source_bytes: bytes, target_bytes: bytes, threshold: float = 80) -> dict:
+        return await self.call(
+            "compare_faces",
+            SourceImage={"Bytes": source_bytes},
+            TargetImage={"Bytes": target_bytes},
+            SimilarityThreshold=threshold,
+        )
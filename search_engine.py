@@ -1,106 +1,97 @@
 import re
-from google import genai
+import clients
+import metrics
+from app_logging import get_logger
 from google.genai import types
 from config import GEMINI_API_KEY, GENERATION_MODEL, EMBEDDING_MODEL, TOP_K
 from vector_store import get_or_create_collection
 
-print("[search_engine] Configuring Gemini client…")
-client = genai.Client()  # reads GEMINI_API_KEY from env
+client = clients.genai_client()  # shared, built on first use
+log = get_logger("search_engine")
 
 def get_embedding(text: str) -> list[float]:
-    print("[search_engine] Generating embedding…")
-    resp = client.models.embed_content(
-        model=EMBEDDING_MODEL,
-        contents=text,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-    )
+    log.info("Generating embedding…")
+    with metrics.timed("embed", EMBEDDING_MODEL):
+        resp = client.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=text,
+            config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
+        )
     return resp.embeddings[0].values
 
+def get_embeddings(texts: list[str], batch_size: int = 100) -> list[list[float]]:
+    """Embeds many query texts with one embed_content call per batch_size texts."""
+    log.info(f"Generating {len(texts)} embeddings (batched)…")
+    embeddings = []
+    for i in range(0, len(texts), batch_size):
+        with metrics.timed("embed", EMBEDDING_MODEL):
+            resp = client.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=texts[i:i + batch_size],
+                config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
+            )
+        embeddings.extend(emb.values for emb in resp.embeddings)
+    return embeddings
+
 def extract_page_filter(prompt: str):
     m = re.search(r"page\s*(\d+)\s*(?:to|-)\s*(\d+)", prompt, re.IGNORECASE)
     if m:
         start, end = int(m.group(1)), int(m.group(2))
-        print(f"[search_engine] Page filter: {start}-{end}")
+        log.info(f"Page filter: {start}-{end}")
         return (start, end)
-    print("[search_engine] No page filter found")
+    log.info("No page filter found")
     return None
 
 def query_chroma(collection_name: str, query_embedding: list[float], page_filter=None, n_results=None):
     col = get_or_create_collection(collection_name)
-    num_results = n_results if n_results is not None else 100
-    where = {"page_no": {"$gte": page_filter[0]}} if page_filter else None
-    results = col.query(
-        query_embeddings=[query_embedding],
-        n_results=1000,
-        where=where
-    )
-    hits = [
-        {"metadata": md, "text": txt}
-        for md, txt in zip(results["metadatas"][0], results["documents"][0])
-    ]
-    if page_filter:
-        lower, upper = page_filter
-        hits = [hit for hit in hits if lower <= hit["metadata"].get("page_no", 0) <= upper]
-    return hits
-
-    print(f"[search_engine] Querying Chroma '{collection_name}'")
-    col = get_or_create_collection(collection_name)
-    num_results = n_results if n_results is not None else TOP_K
-
-    # Only one operator
     where = {"page_no": {"$gte": page_filter[0]}} if page_filter else None
-
-    results = col.query(
-        query_embeddings=[query_embedding],
-        n_results=1000,
-        where=where
-    )
+    # The page filter is only half applied by `where`, so over-fetch and trim below.
+    # Without one, an explicit n_results is honoured instead of pulling 1000 hits.
+    fetch = 1000 if (page_filter or n_results is None) else n_results
+    with metrics.timed("chroma_query", collection_name):
+        results = col.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch,
+            where=where
+        )
     hits = [
         {"metadata": md, "text": txt}
         for md, txt in zip(results["metadatas"][0], results["documents"][0])
     ]
-
-    # Final filtering
     if page_filter:
         lower, upper = page_filter
         hits = [hit for hit in hits if lower <= hit["metadata"].get("page_no", 0) <= upper]
+    return hits if n_results is None else hits[:n_results]
 
-    print(f"[search_engine] Got {len(hits)} hits after filtering")
-    return hits
-
-    print(f"[search_engine] Querying Chroma '{collection_name}'")
+def query_chroma_multi(collection_name: str, query_embeddings: list[list[float]], n_results: int = 3) -> list[list[dict]]:
+    """One Chroma query for several vectors; returns a hit list per query vector, in order."""
+    log.info(f"Multi-query Chroma '{collection_name}' ({len(query_embeddings)} vectors, k={n_results})")
     col = get_or_create_collection(collection_name)
-    where = {"page_no": {"$gte": page_filter[0], "$lte": page_filter[1]}} if page_filter else None
-    
-    # Use custom n_results or default TOP_K
-    num_results = n_results if n_results is not None else TOP_K
-    
-    results = col.query(
-        query_embeddings=[query_embedding],
-        n_results=num_results,
-        where=where
-    )
-    hits = [
-        {"metadata": md, "text": txt}
-        for md, txt in zip(results["metadatas"][0], results["documents"][0])
+    with metrics.timed("chroma_query", collection_name):
+        results = col.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results
+        )
+    return [
+        [{"metadata": md, "text": txt} for md, txt in zip(mds, docs)]
+        for mds, docs in zip(results["metadatas"], results["documents"])
     ]
-    print(f"[search_engine] Got {len(hits)} hits")
-    return hits
 
 def query_gemini(prompt: str, context: str) -> str:
-    print("[search_engine] Generating answer with Gemini…")
+    log.info("Generating answer with Gemini…")
     cfg = types.GenerateContentConfig(system_instruction="You are a helpful tutor.")
     combined = f"Context:\n{context}\n\nQuestion:\n{prompt}"
-    resp = client.models.generate_content(
-        model=GENERATION_MODEL,
-        config=cfg,
-        contents=combined
-    )
-    print("[search_engine] Answer received")
+    with metrics.timed("llm_generate", GENERATION_MODEL):
+        resp = client.models.generate_content(
+            model=GENERATION_MODEL,
+            config=cfg,
+            contents=combined
+        )
+    log.info("Answer received")
     return resp.text
 
 def query_gemini_ppt(prompt: str, context: str) -> str:
-    print("[search_engine] Generating answer with Gemini…")
+    log.info("Generating presentation with Gemini…")
     
     system_prompt = """You are a specialized PowerPoint presentation generator designed to create comprehensive, educational presentations from textbook topics. Your role is to transform textbook content into engaging, visually structured slides that enhance learning and comprehension.
 
@@ -187,10 +178,11 @@ When ready to generate a presentation, confirm the textbook topic, target audien
 
     cfg = types.GenerateContentConfig(system_instruction=system_prompt)
     combined = f"Context:\n{context}\n\nQuestion:\n{prompt}"
-    resp = client.models.generate_content(
-        model=GENERATION_MODEL,
-        config=cfg,
-        contents=combined
-    )
-    print("[search_engine] Answer received")
+    with metrics.timed("llm_generate", GENERATION_MODEL):
+        resp = client.models.generate_content(
+            model=GENERATION_MODEL,
+            config=cfg,
+            contents=combined
+        )
+    log.info("Answer received")
     return resp.text
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    STUDENT_PHOTO_CACHE_DIR, STUDENT_PHOTO_MEMORY_MB,
+    STUDENT_PHOTO_LIST_TTL_S, STUDENT_PHOTO_DOWNLOAD_CONCURRENCY
+)
+from app_logging import get_logger
+
+log = get_logger("student_photos")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class StudentPhotoCache:
+    """
+    Local copy of the student reference photos in a GCS bucket.
+
+    A metadata-only listing (name + generation) decides what changed. Photos are
+    stored on disk under <hash(name)>-<generation>, so an unchanged blob is never
+    downloaded again and a re-uploaded one is (new generation, new file). Recently
+    used bytes also stay in a size-bounded in-memory LRU.
+    """
+
+    def __init__(self, bucket, cache_dir: str = STUDENT_PHOTO_CACHE_DIR,
+                 memory_mb: float = STUDENT_PHOTO_MEMORY_MB, list_ttl_s: float = STUDENT_PHOTO_LIST_TTL_S,
+                 download_concurrency: int = STUDENT_PHOTO_DOWNLOAD_CONCURRENCY):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.memory_budget = int(memory_mb * 1024 * 1024)
+        self.list_ttl_s = list_ttl_s
+        self.download_concurrency = download_concurrency
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()  # file key -> bytes
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._listing: Optional[Tuple[float, List[Tuple[str, int]]]] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.downloads = 0
+
+    @staticmethod
+    def student_name(blob_name: str) -> str:
+        return os.path.splitext(blob_name)[0]
+
+    @staticmethod
+    def _file_key(blob_name: str, generation: int) -> str:
+        return f"{hashlib.sha256(blob_name.encode('utf-8')).hexdigest()[:32]}-{generation}"
+
+    def _list(self) -> List[Tuple[str, int]]:
+        """(blob name, generation) of every image; reused for list_ttl_s."""
+        now = time.monotonic()
+        if self._listing is not None and now - self._listing[0] < self.list_ttl_s:
+            return self._listing[1]
+        blobs = self.bucket.list_blobs(fields="items(name,generation),nextPageToken")
+        listing = [
+            (blob.name, int(blob.generation)) for blob in blobs
+            if blob.name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        self._listing = (now, listing)
+        return listing
+
+    async def list_names(self) -> List[str]:
+        return [self.student_name(name) for name, _ in await asyncio.to_thread(self._list)]
+
+    async def versions(self) -> Dict[str, str]:
+        """{student_name: generation}; changes whenever a photo is re-uploaded."""
+        return {self.student_name(name): str(gen) for name, gen in await asyncio.to_thread(self._list)}
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _from_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return data
+
+    def _load(self, blob_name: str, generation: int) -> bytes:
+        """Disk, else download this exact generation and store it (replacing older generations)."""
+        key = self._file_key(blob_name, generation)
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with self._lock:
+                self.disk_hits += 1
+            return data
+        except FileNotFoundError:
+            pass
+
+        data = self.bucket.blob(blob_name, generation=generation).download_as_bytes()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        prefix = key.rsplit("-", 1)[0] + "-"
+        for old in os.listdir(self.cache_dir):
+            if old.startswith(prefix) and old != key and not old.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, old))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self.downloads += 1
+        log.debug(f"Downloaded {blob_name} (generation {generation})")
+        return data
+
+    def _prune(self, listing: List[Tuple[str, int]]):
+        """Drops cached copies of photos no longer in the bucket (or superseded)."""
+        keep = {self._file_key(name, gen) for name, gen in listing}
+        with self._lock:
+            for key in [k for k in self._memory if k not in keep]:
+                self._memory_bytes -= len(self._memory.pop(key))
+        for entry in os.listdir(self.cache_dir):
+            if entry not in keep and not entry.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry))
+                except FileNotFoundError:
+                    pass
+
+    async def get_all(self) -> Dict[str, bytes]:
+        """{student_name: image bytes} for every photo in the bucket."""
+        listing = await asyncio.to_thread(self._list)
+        photos: Dict[str, bytes] = {}
+        missing = []
+        for blob_name, generation in listing:
+            data = self._from_memory(self._file_key(blob_name, generation))
+            if data is not None:
+                photos[self.student_name(blob_name)] = data
+            else:
+                missing.append((blob_name, generation))
+
+        if missing:
+            sem = asyncio.Semaphore(self.download_concurrency)
+
+            async def load(blob_name: str, generation: int):
+                async with sem:
+                    try:
+                        data = await asyncio.to_thread(self._load, blob_name, generation)
+                    except Exception as e:
+                        log.warning(f"Error loading {blob_name}: {e}")
+                        return
+                self._remember(self._file_key(blob_name, generation), data)
+                photos[self.student_name(blob_name)] = data
+
+            await asyncio.gather(*(load(name, gen) for name, gen in missing))
+            await asyncio.to_thread(self._prune, listing)
+        return photos
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "downloads": self.downloads,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules live at the repository root; tests never talk to real Google/AWS services.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "demo")
+os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:1")
+os.environ.setdefault("STORAGE_EMULATOR_HOST", "http://localhost:1")
+os.environ.setdefault("OCR_CACHE_ENABLED", "0")
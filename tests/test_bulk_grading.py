@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import bulk_grading
+
+
+@pytest.fixture
+def graded(monkeypatch):
+    """bulk_grading with OCR/grading stubbed out; returns the list of stored batches."""
+    stored = []
+
+    async def ocr(pages, process_image, preprocess_func=None):
+        return [{"1": "answer"} for _ in pages]
+
+    monkeypatch.setattr(bulk_grading, "run_ocr_concurrent_internal", ocr)
+    monkeypatch.setattr(bulk_grading, "merge_ocr_results", lambda results: results[0])
+    monkeypatch.setattr(bulk_grading, "correct_answers_single_rag", lambda *a, **k: ("5/10", []))
+    monkeypatch.setattr(bulk_grading, "get_question_paper",
+                        lambda doc_id: {"question_paper": {"questions": []}, "grading_context": {}})
+    monkeypatch.setattr(bulk_grading, "rag_search_per_question", lambda questions, collection: {})
+    monkeypatch.setattr(bulk_grading, "BULK_WRITE_BATCH_SIZE", 2)
+    monkeypatch.setattr(bulk_grading, "_jobs", {})
+    return stored
+
+
+def _job(n):
+    return bulk_grading.BulkGradingJob({f"s{i}": [b"page"] for i in range(n)}, "qp1", "maths",
+                                       "a1", "10th", "textbook", "medium")
+
+
+def test_failed_batch_is_retried_on_next_flush(graded, monkeypatch):
+    calls = []
+
+    def store(batch):
+        calls.append([r["studentid"] for r in batch])
+        if len(calls) == 1:
+            raise RuntimeError("deadline exceeded")
+        graded.extend(batch)
+
+    monkeypatch.setattr(bulk_grading, "store_studentmarks_batch", store)
+    job = _job(5)
+    asyncio.run(job.run())
+
+    assert job.status == "completed"
+    assert sorted(r["studentid"] for r in graded) == [f"s{i}" for i in range(5)]
+    assert all(p["status"] == "stored" for p in job.progress.values())
+
+
+def test_final_flush_failure_marks_students_failed(graded, monkeypatch):
+    def store(batch):
+        raise RuntimeError("permission denied")
+
+    monkeypatch.setattr(bulk_grading, "store_studentmarks_batch", store)
+    job = _job(3)
+    asyncio.run(job.run())
+
+    assert job.status == "completed"
+    assert {p["status"] for p in job.progress.values()} == {"failed"}
+    assert "storing marks failed" in job.progress["s0"]["error"]
+
+
+def test_finished_jobs_expire(graded, monkeypatch):
+    monkeypatch.setattr(bulk_grading, "store_studentmarks_batch", graded.extend)
+
+    async def run():
+        job = bulk_grading.start_job(_job(1))
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert bulk_grading.get_job(job.job_id) is job
+    job.finished_at -= bulk_grading.BULK_JOB_TTL_S + 1
+    assert bulk_grading.get_job(job.job_id) is None
+
+
+def test_context_cache_is_bounded(graded, monkeypatch):
+    monkeypatch.setattr(bulk_grading, "_context_cache", bulk_grading.OrderedDict())
+    monkeypatch.setattr(bulk_grading, "BULK_CONTEXT_CACHE_SIZE", 2)
+    for paper in ("p1", "p2", "p3"):
+        job = _job(1)
+        job.questionpaperdocfromfiretore = paper
+        asyncio.run(job._question_contexts({"question_paper": {"questions": []}}))
+    assert [key[0] for key in bulk_grading._context_cache] == ["p2", "p3"]
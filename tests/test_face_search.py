@@ -0,0 +1,193 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from face_search import CompareFacesAttendance, FaceSearchAttendance, crop_faces
+from fake_rekognition import FakeRekognitionServer, RekognitionError, make_face, make_group
+from rekognition_client import RekognitionPool
+
+AWS_CONFIG = {"aws_access_key_id": "test", "aws_secret_access_key": "test", "region_name": "us-east-1"}
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = FakeRekognitionServer(latency=0).start()
+    yield server
+    server.stop()
+
+
+def _blank() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(out, format="PNG")
+    return out.getvalue()
+
+
+def _run(server, body):
+    """Runs body(pool) on a fresh RekognitionPool against the fake server."""
+    async def main():
+        pool = RekognitionPool(AWS_CONFIG, endpoint_url=server.endpoint_url, concurrency=8)
+        await pool.start()
+        try:
+            return await body(pool)
+        finally:
+            await pool.stop()
+
+    return asyncio.run(main())
+
+
+def test_compare_engine_keeps_concurrent_classes_apart(server):
+    class_a = {f"a{i}": make_face(i) for i in range(3)}
+    class_b = {f"b{i}": make_face(10 + i) for i in range(3)}
+    group_a, group_b = make_group([0, 1]), make_group([10, 12])
+
+    async def body(pool):
+        engine = CompareFacesAttendance(pool)
+        await asyncio.gather(engine.sync(class_a, {}), engine.sync(class_b, {}))
+        return await asyncio.gather(engine.attendance(group_a, class_a), engine.attendance(group_b, class_b))
+
+    a, b = _run(server, body)
+    assert a == {"a0": "present", "a1": "present", "a2": "absent"}
+    assert b == {"b0": "present", "b1": "absent", "b2": "present"}
+
+
+def test_class_photos_keeps_only_the_class_roster():
+    from face_search import class_photos
+
+    photos = {"Asha": b"1", "ravi": b"2", "S003": b"3", "Meena": b"4", "unknown": b"5"}
+    roster = [
+        {"student_name": "asha", "student_id": "S001", "class": "10th Standard", "section": "A"},
+        {"student_name": "Ravi", "student_id": "S002", "class": "10th Standard", "section": "B"},
+        {"student_name": "Kiran", "student_id": "S003", "class": "10th Standard", "section": "A"},
+        {"student_name": "Meena", "student_id": "S004", "class": "9th Standard", "section": "A"},
+    ]
+    assert set(class_photos(photos, roster, "10th")) == {"Asha", "ravi", "S003"}
+    assert set(class_photos(photos, roster, "10th Standard", "a")) == {"Asha", "S003"}
+    assert class_photos(photos, roster, "1") == {}
+
+
+def _collection_size(server, collection_id):
+    return len(server.collections.get(collection_id, {}))
+
+
+def test_sync_indexes_new_deletes_stale_and_skips_unchanged(server):
+    refs = {f"s{i}": make_face(i) for i in range(4)}
+
+    async def body(pool):
+        search = FaceSearchAttendance(pool, collection_id="sync")
+        first = await search.sync(refs, {name: "1" for name in refs})
+
+        server.reset_counters()
+        unchanged = await search.sync(refs, {name: "1" for name in refs})
+        calls = server.requests
+
+        # s0 re-uploaded, s3 removed
+        photos = {name: img for name, img in refs.items() if name != "s3"}
+        changed = await search.sync(photos, {"s0": "2", "s1": "1", "s2": "1"})
+        return first, unchanged, calls, changed
+
+    first, unchanged, calls, changed = _run(server, body)
+    assert first == {"indexed": 4, "deleted": 0, "unchanged": 0, "failed": 0, "unusable": 0}
+    assert unchanged == {"indexed": 0, "deleted": 0, "unchanged": 4} and calls == 0
+    assert changed == {"indexed": 1, "deleted": 2, "unchanged": 2, "failed": 0, "unusable": 0}
+    assert _collection_size(server, "sync") == 3
+
+
+def test_failed_index_is_retried_on_next_sync(server, monkeypatch):
+    refs = {f"s{i}": make_face(i) for i in range(3)}
+    versions = {name: "1" for name in refs}
+    index_faces = server.index_faces
+    failures = []
+
+    def flaky_index(body):
+        if body["ExternalImageId"].startswith("s1.") and not failures:
+            failures.append(body["ExternalImageId"])
+            raise RekognitionError("AccessDeniedException", "transient")
+        return index_faces(body)
+
+    monkeypatch.setattr(server, "index_faces", flaky_index)
+
+    async def body(pool):
+        search = FaceSearchAttendance(pool, collection_id="retry")
+        first = await search.sync(refs, versions)
+        second = await search.sync(refs, versions)
+        third = await search.sync(refs, versions)
+        return first, second, third, await search.attendance(make_group([1]), refs)
+
+    first, second, third, attendance = _run(server, body)
+    assert first["failed"] == 1 and first["indexed"] == 2
+    assert second == {"indexed": 1, "deleted": 0, "unchanged": 2, "failed": 0, "unusable": 0}
+    assert third["indexed"] == 0
+    assert attendance == {"s0": "absent", "s1": "present", "s2": "absent"}
+
+
+def test_photo_without_a_face_is_not_reindexed_every_sync(server, monkeypatch):
+    refs = {"s0": make_face(0), "s1": _blank(), "s2": make_face(2)}
+    versions = {name: "1" for name in refs}
+    calls = []
+    index_faces, list_faces = server.index_faces, server.list_faces
+    monkeypatch.setattr(server, "index_faces", lambda body: calls.append("index") or index_faces(body))
+    monkeypatch.setattr(server, "list_faces", lambda body: calls.append("list") or list_faces(body))
+
+    async def body(pool):
+        search = FaceSearchAttendance(pool, collection_id="unusable")
+        first = await search.sync(refs, versions)
+        calls.clear()
+        second = await search.sync(refs, versions)
+        second_calls = list(calls)
+        return first, second, second_calls, await search.sync(refs, {**versions, "s1": "2"})
+
+    first, second, second_calls, reupload = _run(server, body)
+    assert first == {"indexed": 2, "deleted": 0, "unchanged": 0, "failed": 0, "unusable": 1}
+    assert second["unchanged"] == 3 and second_calls == []
+    assert reupload["unusable"] == 1 and reupload["indexed"] == 0
+
+
+def test_attendance_against_fake_rekognition(server):
+    refs = {f"s{i}": make_face(i) for i in range(8)}
+    group = make_group([0, 3, 5, 7])
+
+    async def body(pool):
+        search = FaceSearchAttendance(pool, collection_id="attendance")
+        await search.sync(refs, {name: "1" for name in refs})
+        by_search = await search.attendance(group, refs)
+        by_compare = await CompareFacesAttendance(pool).attendance(group, refs)
+        # Only the students asked about are reported
+        subset = await search.attendance(group, {name: refs[name] for name in ("s0", "s1")})
+        return by_search, by_compare, subset
+
+    by_search, by_compare, subset = _run(server, body)
+    assert {n for n, status in by_search.items() if status == "present"} == {"s0", "s3", "s5", "s7"}
+    assert by_search == by_compare
+    assert subset == {"s0": "present", "s1": "absent"}
+
+
+def test_crop_faces_clamps_to_the_image():
+    out = io.BytesIO()
+    Image.new("RGB", (100, 80), "white").save(out, format="PNG")
+    boxes = [
+        {"Left": -0.05, "Top": -0.1, "Width": 0.3, "Height": 0.3},   # off the top-left corner
+        {"Left": 0.85, "Top": 0.8, "Width": 0.2, "Height": 0.25},    # off the bottom-right corner
+        {"Left": 0.4, "Top": 0.4, "Width": 0.2, "Height": 0.2},      # inside, padded by the margin
+        {"Left": 1.2, "Top": 0.5, "Width": 0.1, "Height": 0.1},      # entirely outside: skipped
+    ]
+    sizes = [Image.open(io.BytesIO(c)).size for c in crop_faces(out.getvalue(), boxes, margin=0.25)]
+    assert sizes == [(32, 22), (20, 21), (30, 24)]
+
+
+def test_crop_faces_follows_exif_orientation():
+    # Upright the photo is 100x80 with a red "face" in the top-left corner; the
+    # camera stored it rotated and recorded Orientation=6 (rotate 90° CW to view).
+    upright = Image.new("RGB", (100, 80), "white")
+    upright.paste((255, 0, 0), (0, 0, 30, 20))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    out = io.BytesIO()
+    upright.rotate(90, expand=True).save(out, format="JPEG", quality=95, exif=exif)
+
+    [crop] = crop_faces(out.getvalue(), [{"Left": 0.0, "Top": 0.0, "Width": 0.3, "Height": 0.25}], margin=0)
+    face = Image.open(io.BytesIO(crop)).convert("RGB")
+    assert face.size == (30, 20)
+    r, g, b = face.resize((1, 1), Image.BOX).getpixel((0, 0))
+    assert r > 200 and g < 60 and b < 60
@@ -0,0 +1,38 @@
+import pytest
+
+import firestore11
+from inmemory_firestore import InMemoryFirestore
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = InMemoryFirestore()
+    monkeypatch.setattr(firestore11, "client", db)
+    return db
+
+
+def _students(names, status="present"):
+    return {n: {"status": status, "similarity": 99.0, "photos": [0]} for n in names}
+
+
+def _stored(db, doc_id):
+    ref = db.collection("attendance").document(doc_id).collection("students")
+    return {doc.id: doc.to_dict() for doc in ref.stream()}
+
+
+def test_session_is_written_in_batches(db):
+    names = [f"student{i:04d}" for i in range(1200)]
+    doc_id = firestore11.store_attendance_session("10th", "2025-07-21", _students(names), "A")
+    assert doc_id == "10th__A__2025-07-21"
+    summary = db.collection("attendance").document(doc_id).get().to_dict()
+    assert summary["total"] == 1200 and summary["present_count"] == 1200
+    assert len(_stored(db, doc_id)) == 1200
+
+
+def test_rerun_replaces_the_previous_students(db):
+    firestore11.store_attendance_session("10th", "2025-07-21", _students(["asha", "ravi", "kiran"]))
+    doc_id = firestore11.store_attendance_session("10th", "2025-07-21", _students(["asha", "meena"], "absent"))
+    stored = _stored(db, doc_id)
+    assert set(stored) == {"asha", "meena"}
+    assert stored["asha"]["status"] == "absent"
+    assert db.collection("attendance").document(doc_id).get().to_dict()["total"] == 2
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from grading_queue import GradingQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return GradingQueue(path=str(tmp_path / "jobs.db"), spool_dir=str(tmp_path / "spool"),
+                        lease_s=60, max_attempts=2)
+
+
+def _expire_lease(queue, job_id):
+    conn = sqlite3.connect(queue.path)
+    conn.execute("UPDATE grading_jobs SET lease_expires_at = 0 WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_submit_is_idempotent(queue):
+    job, created = queue.submit({"a": 1}, [b"page"], idempotency_key="k1")
+    again, created_again = queue.submit({"a": 1}, [b"page"], idempotency_key="k1")
+    assert created and not created_again
+    assert again["job_id"] == job["job_id"]
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(queue):
+    job, _ = queue.submit({}, [b"page"])
+    assert queue.claim("w1")["attempts"] == 1
+    _expire_lease(queue, job["job_id"])
+    assert queue.claim("w2")["attempts"] == 2
+    _expire_lease(queue, job["job_id"])
+
+    assert queue.claim("w3") is None
+    failed = queue.get(job["job_id"])
+    assert failed["status"] == "failed"
+    assert "lease expired" in failed["error"]
+
+
+def test_stale_worker_cannot_complete_or_fail_a_taken_over_job(queue):
+    job, _ = queue.submit({}, [b"page"])
+    queue.claim("w1")
+    _expire_lease(queue, job["job_id"])
+    queue.claim("w2")
+
+    assert not queue.renew(job["job_id"], "w1")
+    assert not queue.complete(job["job_id"], "w1", {"totalmarks": "1/10"})
+    assert not queue.fail(job["job_id"], "w1", "boom")
+    assert queue.get(job["job_id"])["status"] == "running"
+
+    assert queue.complete(job["job_id"], "w2", {"totalmarks": "9/10"})
+    done = queue.get(job["job_id"])
+    assert done["status"] == "done"
+    assert done["result"] == {"totalmarks": "9/10"}
+
+
+def test_fail_requeues_while_attempts_remain(queue):
+    job, _ = queue.submit({}, [b"page"])
+    queue.claim("w1")
+    assert queue.fail(job["job_id"], "w1", "transient")
+    assert queue.get(job["job_id"])["status"] == "queued"
+
+    queue.claim("w1")
+    assert queue.fail(job["job_id"], "w1", "transient again")
+    assert queue.get(job["job_id"])["status"] == "failed"
+
+
+def test_fail_without_retry_is_final(queue):
+    job, _ = queue.submit({}, [b"page"])
+    queue.claim("w1")
+    assert queue.fail(job["job_id"], "w1", "bad input", retry=False)
+    assert queue.get(job["job_id"])["status"] == "failed"
+    assert queue.claim("w1") is None
+
+
+def test_heartbeat_cancels_job_when_lease_is_lost(monkeypatch):
+    import asyncio
+    import grading_worker
+
+    class LostLease:
+        def renew(self, job_id, worker):
+            return False
+
+    monkeypatch.setattr(grading_worker, "GRADING_JOB_LEASE_S", 0)
+
+    async def run():
+        async def job():
+            asyncio.create_task(grading_worker._heartbeat(LostLease(), "j1", "w1", asyncio.current_task()))
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(job())
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
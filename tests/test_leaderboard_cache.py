@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from leaderboard_cache import LeaderboardCache
+
+
+def _loaded(n):
+    cache = LeaderboardCache(db=None)
+    changes = [
+        SimpleNamespace(type=SimpleNamespace(name="ADDED"),
+                        document=SimpleNamespace(id=f"s{rank}", to_dict=lambda rank=rank: {"rank": rank}))
+        for rank in range(1, n + 1)
+    ]
+    cache._on_snapshot(None, changes, None)
+    return cache
+
+
+def test_page_without_limit_returns_everything():
+    students, next_start_after = _loaded(250).page(None)
+    assert [s["rank"] for s in students] == list(range(1, 251))
+    assert next_start_after is None
+
+
+def test_pages_carry_the_next_cursor():
+    cache = _loaded(5)
+    first, cursor = cache.page(2)
+    rest, last = cache.page(None, start_after=cursor)
+    assert [s["rank"] for s in first] == [1, 2] and cursor == 2
+    assert [s["rank"] for s in rest] == [3, 4, 5] and last is None
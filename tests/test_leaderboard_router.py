@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from leaderboard_router import LeaderboardTable, route, SUBJECT_FIELDS
+
+FIRST = ["Priya", "Rahul", "Ananya", "Kiran", "Meera", "Rohan", "Sneha", "Vikram", "Divya", "Nikhil"]
+LAST = ["Sharma", "Verma", "Rao", "Patel", "Gowda", "Iyer", "Nair", "Reddy", "Shetty", "Kulkarni"]
+
+
+def _students(n=200, seed=7):
+    rng = random.Random(seed)
+    names = [f"{f} {l}" for l in LAST for f in FIRST][:n - 2] + ["Arjun Rao", "Arjun Patel"]
+    docs = []
+    for i, name in enumerate(names):
+        marks = {f: rng.randint(20, 100) for f in SUBJECT_FIELDS}
+        docs.append({
+            "student_id": f"S{i:03d}", "student_name": name,
+            "class": rng.choice(["9th", "10th"]), "section": rng.choice("AB"),
+            "percentage": round(sum(marks.values()) / len(marks), 2),
+            "feedbacks": ["Keep it up"], **marks,
+        })
+    for rank, d in enumerate(sorted(docs, key=lambda d: -d["percentage"]), 1):
+        d["rank"] = rank
+    return docs
+
+
+@pytest.fixture(scope="module")
+def table():
+    return LeaderboardTable(_students())
+
+
+# question -> expected intent (None: not answerable from the table, falls through to the LLM)
+CASES = [
+    ("Who is ranked 1st?", "rank"),
+    ("Who is in 3rd place?", "rank"),
+    ("Who came last?", "rank"),
+    ("Who is rank 12 in maths?", "rank"),
+    ("Top 5 in maths", "top"),
+    ("Show me the top five students in science", "top"),
+    ("Who is the topper?", "top"),
+    ("Who is the top scorer in English?", "top"),
+    ("Who scored the highest in Kannada?", "top"),
+    ("Lowest 3 in social studies in section B", "top"),
+    ("What is the average maths score in 10th standard?", "average"),
+    ("How many students scored above 80 in science?", "count"),
+    ("How many failed maths?", "count"),
+    ("How much did Priya Sharma score in Kannada?", "score"),
+    ("What is the rank of Rahul Verma?", "student"),
+    ("Compare Priya Sharma and Rahul Verma", "compare"),
+    ("Feedback for Meera Rao", "feedback"),
+    ("What did Arjun score?", "ambiguous"),
+    # ordinary questions that only look like ranking queries
+    ("Who is in 10th standard section A?", None),
+    ("How is Arjun doing in maths compared to last term?", None),
+    ("What is the top reason students fail maths?", None),
+    ("What are the best ways to study science?", None),
+    ("Which subject is the hardest for most students?", None),
+    ("Tell me something encouraging for the class", None),
+]
+
+
+@pytest.mark.parametrize("question,intent", CASES)
+def test_route_intent(table, question, intent):
+    routed = route(question, table)
+    assert (routed.intent if routed else None) == intent, routed and routed.answer
+
+
+def test_rank_and_top_answers(table):
+    assert route("Who is ranked 1st?", table).student_ids == [str(table.student_id[0])]
+    top = route("Top 3 in maths", table)
+    maths = [table.columns["maths_marks"][table.student_id.tolist().index(s)] for s in top.student_ids]
+    assert len(top.student_ids) == 3 and maths == sorted(maths, reverse=True)
+    assert maths[0] == table.columns["maths_marks"].max()
+
+
+def test_pass_count_uses_the_analytics_pass_mark(table, monkeypatch):
+    import leaderboard_router
+
+    monkeypatch.setattr(leaderboard_router, "ANALYTICS_PASS_PERCENT", 50.0)
+    routed = route("How many passed maths?", table)
+    expected = int((table.columns["maths_marks"] >= 50).sum())
+    assert routed.answer.startswith(f"{expected} of {table.n} students passed")
+    assert "(pass mark 50)" in routed.answer
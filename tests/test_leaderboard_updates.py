@@ -0,0 +1,47 @@
+import pytest
+
+import leaderboard
+from inmemory_firestore import InMemoryFirestore
+from leaderboard_analytics import AnalyticsIndex
+
+
+@pytest.fixture
+def board(monkeypatch):
+    monkeypatch.setattr(leaderboard, "db", InMemoryFirestore())
+    students = leaderboard.create_student_leaderboard(20, seed=7)
+    yield students
+    leaderboard._rank_index = leaderboard._analytics_index = None
+
+
+def test_failed_commit_drops_the_in_memory_indexes(board, monkeypatch):
+    student = board[0]
+    before = leaderboard.get_rank_index().ranks()
+
+    def fail(self):
+        raise RuntimeError("deadline exceeded")
+
+    with monkeypatch.context() as m:
+        m.setattr("inmemory_firestore.WriteBatch.commit", fail)
+        with pytest.raises(RuntimeError):
+            leaderboard.update_student_marks(student["student_id"], "maths_marks", 0)
+
+    assert leaderboard._rank_index is None and leaderboard._analytics_index is None
+    stored = leaderboard.db.collection("student_leaderboard").document(student["student_id"]).get().to_dict()
+    assert stored["maths_marks"] == student["maths_marks"]
+    assert leaderboard.get_rank_index().ranks() == before
+
+
+@pytest.mark.parametrize("marks", [-5, 101, 42.5, "90"])
+def test_out_of_range_marks_are_rejected_before_any_write(board, marks):
+    student = board[0]
+    with pytest.raises(ValueError):
+        leaderboard.update_student_marks(student["student_id"], "maths_marks", marks)
+    stored = leaderboard.db.collection("student_leaderboard").document(student["student_id"]).get().to_dict()
+    assert stored["maths_marks"] == student["maths_marks"]
+
+
+def test_analytics_clamps_stored_marks_to_the_histogram():
+    index = AnalyticsIndex()
+    index.apply({"student_id": "s1", "class": "10th", "section": "A", "maths_marks": -3, "all_subject_marks": 612})
+    maths = index.view()["metrics"]["maths_marks"]
+    assert maths["min"] == 0 and index.view()["metrics"]["all_subject_marks"]["max"] == 500
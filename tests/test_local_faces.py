@@ -0,0 +1,75 @@
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from bench_local_faces import ColorEmbedder, SquareDetector
+from fake_rekognition import make_face, make_group
+from local_faces import FaceGallery, LocalFaceAttendance
+
+
+def _blank() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(out, format="PNG")
+    return out.getvalue()
+
+
+def _engine(path=None):
+    return LocalFaceAttendance(SquareDetector(), ColorEmbedder(), gallery_path=path)
+
+
+def test_attendance_matches_the_faces_in_the_photo():
+    refs = {f"s{i}": make_face(i) for i in range(6)}
+    engine = _engine()
+
+    async def run():
+        await engine.sync(refs, {name: "1" for name in refs})
+        return await engine.attendance(make_group([1, 4]), refs)
+
+    result = asyncio.run(run())
+    assert {name for name, status in result.items() if status == "present"} == {"s1", "s4"}
+
+
+def test_replace_keeps_the_old_version_of_rows_not_refreshed():
+    gallery = FaceGallery(None)
+    gallery.replace({"a": "1", "b": "1"}, {"a": np.ones(4, np.float32), "b": np.ones(4, np.float32)})
+    gallery.replace({"a": "2", "b": "1"}, {})
+    assert dict(zip(gallery.names, gallery.versions)) == {"a": "1", "b": "1"}
+    assert gallery.stale({"a": "2", "b": "1"}) == ["a"]
+
+
+def test_reupload_without_a_face_keeps_old_embedding_and_stays_stale(tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    refs = {"a": make_face(0), "b": make_face(1)}
+
+    async def run():
+        engine = _engine(path)
+        await engine.sync(refs, {"a": "1", "b": "1"})
+        stats = await engine.sync({"a": _blank(), "b": refs["b"]}, {"a": "2", "b": "1"})
+        return engine, stats
+
+    engine, stats = asyncio.run(run())
+    assert stats["failed"] == 1
+    # The old face still matches, and a restart retries the new photo
+    assert asyncio.run(engine.match(make_group([0]), refs)).keys() == {"a"}
+    assert _engine(path).gallery.stale({"a": "2", "b": "1"}) == ["a"]
+
+
+def test_matches_reads_one_snapshot():
+    gallery = FaceGallery(None)
+    gallery.replace({"a": "1"}, {"a": np.array([1, 0], np.float32)})
+    names, versions, matrix = gallery._rows
+    gallery.replace({"a": "1", "b": "1"}, {"b": np.array([0, 1], np.float32)})
+    assert gallery._rows[0] is not names and len(names) == len(matrix) == 1
+    assert gallery.matches(np.array([[0, 1]], np.float32), 0.9) == {"b": 1.0}
+
+
+def test_faces_are_detected_on_the_upright_photo():
+    # Stored 80x100 with Orientation=6, i.e. a 100x80 photo taken in portrait.
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    out = io.BytesIO()
+    Image.new("RGB", (80, 100), "white").save(out, format="JPEG", exif=exif)
+    img, _ = _engine()._faces(out.getvalue())
+    assert img.size == (100, 80)
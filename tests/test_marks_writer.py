@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import grading_pipeline
+import marks_writer as marks_writer_module
+from marks_writer import MarksDeadLetter, MarksWriteBehind
+
+
+def test_try_enqueue_does_not_block_when_full(monkeypatch):
+    writer = MarksWriteBehind(max_queue=1)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)  # nothing drains the queue
+    assert writer.try_enqueue({"studentid": "s1"})
+    assert not writer.try_enqueue({"studentid": "s2"})
+    assert writer.enqueued_total == 1
+
+
+def test_full_queue_does_not_stall_the_event_loop(monkeypatch):
+    release = threading.Event()
+    written = []
+
+    def slow_store(items):
+        release.wait(5)
+        written.extend(items)
+
+    monkeypatch.setattr(marks_writer_module, "store_studentmarks_batch", slow_store)
+    writer = MarksWriteBehind(max_batch=1, max_delay_s=0, max_queue=1)
+    monkeypatch.setattr(grading_pipeline, "marks_writer", writer)
+    monkeypatch.setattr(grading_pipeline, "run_ocr_concurrent_internal",
+                        lambda pages, *a, **k: asyncio.sleep(0, [{"1": "a"}]))
+    monkeypatch.setattr(grading_pipeline, "merge_ocr_results", lambda results: results[0])
+    monkeypatch.setattr(grading_pipeline, "get_question_paper", lambda doc_id: {"question_paper": {}})
+    monkeypatch.setattr(grading_pipeline, "correct_answers_single_rag", lambda *a, **k: ("1/1", []))
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        # One result is being written, one fills the queue, the third has to wait for room
+        grades = [asyncio.create_task(grading_pipeline.grade_answersheet(
+            [b"page"], studentid=f"s{i}", questionpaperdocfromfiretore="qp", subject="maths",
+            assignmentid="a1", classgrade="10th", chromadbcollectionname="textbook",
+            correctiontype="medium", write_behind=True))
+            for i in range(3)]
+        await asyncio.sleep(0.3)
+        assert ticks >= 10  # the loop kept running while enqueue waited
+        release.set()
+        await asyncio.gather(*grades)
+        tick_task.cancel()
+
+    asyncio.run(run())
+    writer.stop()
+    assert sorted(r["studentid"] for r in written) == ["s0", "s1", "s2"]
+
+
+def test_enqueue_after_stop_is_written_not_lost(monkeypatch, tmp_path):
+    written = []
+    monkeypatch.setattr(marks_writer_module, "store_studentmarks_batch", written.extend)
+    writer = MarksWriteBehind(dead_letter=MarksDeadLetter(str(tmp_path / "dead.sqlite3")))
+    writer.stop()
+    assert not writer.try_enqueue({"studentid": "s1"})
+    writer.enqueue({"studentid": "s1"})
+    assert [r["studentid"] for r in written] == ["s1"]
+
+
+def test_failed_results_are_dead_lettered_and_replayed(monkeypatch, tmp_path):
+    def broken(items):
+        raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(marks_writer_module, "store_studentmarks_batch", broken)
+    writer = MarksWriteBehind(retries=2, dead_letter=MarksDeadLetter(str(tmp_path / "dead.sqlite3")))
+    monkeypatch.setattr(marks_writer_module.time, "sleep", lambda s: None)
+    writer._write([{"studentid": "s1"}, {"studentid": "s2"}])
+    assert writer.dead_lettered_total == 2 and writer.dropped_total == 0
+    assert writer.dead_letter.count() == 2
+
+    written = []
+    monkeypatch.setattr(marks_writer_module, "store_studentmarks_batch", written.extend)
+    assert writer.replay_dead_letters() == 2
+    assert [r["studentid"] for r in written] == ["s1", "s2"]
+    assert writer.dead_letter.count() == 0
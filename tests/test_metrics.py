@@ -0,0 +1,54 @@
+import asyncio
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+def _count(text, stage, endpoint, collection):
+    line = f'app_stage_duration_seconds_count{{stage="{stage}",endpoint="{endpoint}",collection="{collection}"}}'
+    return next((int(l.split()[-1]) for l in text.splitlines() if l.startswith(line + " ")), 0)
+
+
+def test_timed_labels_the_current_endpoint_across_executors():
+    def work():
+        with metrics.timed("firestore_read", "t_jobs"):
+            pass
+
+    async def handler():
+        token = metrics.current_endpoint.set("/t/{job_id}")
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, metrics.in_context(work))
+        finally:
+            metrics.current_endpoint.reset(token)
+
+    before = _count(metrics.render(), "firestore_read", "/t/{job_id}", "t_jobs")
+    asyncio.run(handler())
+    assert _count(metrics.render(), "firestore_read", "/t/{job_id}", "t_jobs") == before + 1
+
+
+def test_errors_are_counted_and_reraised():
+    with pytest.raises(ValueError):
+        with metrics.timed("llm_generate", "t_errors"):
+            raise ValueError("boom")
+    assert 'app_stage_errors_total{stage="llm_generate",endpoint="background",collection="t_errors"} 1' \
+        in metrics.render()
+
+
+def test_collectors_export_numeric_gauges_only():
+    metrics.register_collector("t_demo", lambda: {"depth": 3, "rate": 0.25, "name": "x", "ready": True})
+    text = metrics.render()
+    assert "app_t_demo_depth 3" in text and "app_t_demo_rate 0.25" in text and "app_t_demo_ready 1" in text
+    assert "app_t_demo_name" not in text
+
+
+def test_serve_exposes_the_registry():
+    server = metrics.serve(0, "127.0.0.1")
+    try:
+        with metrics.timed("ocr", "t_serve"):
+            pass
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode()
+    finally:
+        server.shutdown()
+    assert _count(body, "ocr", "background", "t_serve") == 1
@@ -0,0 +1,19 @@
+from ocr_layout import CONTINUATION_KEY, extract_answers, merge_page_answers, page_answers
+
+
+def test_single_page_drops_continuation_text():
+    page = extract_answers("Name: Asha Roll 12\n1. Photosynthesis makes food\n2) Water boils at 100")
+    assert page[CONTINUATION_KEY] == "Name: Asha Roll 12"
+    assert page_answers(page) == {"1": "Photosynthesis makes food", "2": "Water boils at 100"}
+
+
+def test_continuation_is_appended_to_the_open_question():
+    pages = [
+        extract_answers("1. Plants need light\n2. The heart pumps"),
+        extract_answers("blood around the body\n3. Newton's first law"),
+    ]
+    assert merge_page_answers(pages) == {
+        "1": "Plants need light",
+        "2": "The heart pumps blood around the body",
+        "3": "Newton's first law",
+    }
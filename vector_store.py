@@ -1,28 +1,17 @@
-import os
-import chromadb
-from chromadb import PersistentClient
-from chromadb.config import Settings
-from chromadb.errors import NotFoundError
 from config import CHROMA_DB_DIR, EMBEDDING_MODEL
-from google import genai
 from google.genai import types
 from itertools import islice
+import clients
+import metrics
+from app_logging import get_logger
 
-# 1) Ensure the directory exists
-os.makedirs(CHROMA_DB_DIR, exist_ok=True)
-print(f"[vector_store] Ensured dir exists: {CHROMA_DB_DIR}")
-
-# 2) Initialize PersistentClient
-print("[vector_store] Initializing PersistentClient…")
-client = PersistentClient(
-    CHROMA_DB_DIR,
-    settings=Settings(anonymized_telemetry=False)
-)
-
-print("[vector_store] Initializing Gemini client…")
-genai_client = genai.Client()
+# Shared, built on first use (see clients.py)
+client = clients.chroma
+genai_client = clients.genai_client()
+log = get_logger("vector_store")
 
 def get_or_create_collection(name: str, reset: bool = False):
+    from chromadb.errors import NotFoundError  # chromadb is slow to import; only needed once used
     exists = True
     try:
         client.get_collection(name)
@@ -30,15 +19,15 @@ def get_or_create_collection(name: str, reset: bool = False):
         exists = False
 
     if reset and exists:
-        print(f"[vector_store] Resetting existing collection '{name}'")
+        log.info(f"Resetting existing collection '{name}'")
         client.delete_collection(name)
         exists = False
 
     if not exists:
-        print(f"[vector_store] Creating collection '{name}'")
+        log.info(f"Creating collection '{name}'")
         return client.create_collection(name)
     else:
-        print(f"[vector_store] Using existing collection '{name}'")
+        log.info(f"Using existing collection '{name}'")
         return client.get_collection(name)
 
 def batch_embed(texts: list[str], batch_size: int = 100) -> list[list[float]]:
@@ -54,15 +43,16 @@ def batch_embed(texts: list[str], batch_size: int = 100) -> list[list[float]]:
         if not batch:
             break
         batch_num += 1
-        print(f"[vector_store] Embedding batch #{batch_num} (size={len(batch)})")
-        resp = genai_client.models.embed_content(
-            model=EMBEDDING_MODEL,
-            contents=batch,
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
-        )
+        log.debug(f"Embedding batch #{batch_num} (size={len(batch)})")
+        with metrics.timed("embed", EMBEDDING_MODEL):
+            resp = genai_client.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=batch,
+                config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
+            )
         all_embeddings.extend(emb.values for emb in resp.embeddings)
 
-    print(f"[vector_store] Total embeddings generated: {len(all_embeddings)}")
+    log.info(f"Total embeddings generated: {len(all_embeddings)}")
     return all_embeddings
 
 def store_documents(collection_name: str, docs: list[dict]):
@@ -70,7 +60,7 @@ def store_documents(collection_name: str, docs: list[dict]):
     Stores (and resets) a collection with the provided docs.
     Each doc: {"id": str, "metadata": {"page_no": int, "text": str}}
     """
-    print(f"[vector_store] Storing {len(docs)} docs into '{collection_name}'")
+    log.info(f"Storing {len(docs)} docs into '{collection_name}'")
 
     texts     = [d["metadata"]["text"] for d in docs]
     ids       = [d["id"]               for d in docs]
@@ -89,4 +79,4 @@ def store_documents(collection_name: str, docs: list[dict]):
         documents=texts,
         embeddings=embeddings
     )
-    print(f"[vector_store] Added {len(docs)} docs to '{collection_name}' — check {CHROMA_DB_DIR}")
+    log.info(f"Added {len(docs)} docs to '{collection_name}' — check {CHROMA_DB_DIR}")